@@ -1,25 +1,47 @@
-import uuid
+import operator
+import threading
+import collections
 import collections.abc
+import concurrent.futures
+from collections import OrderedDict
+import itertools
 from itertools import groupby
-from typing import Union, Optional, Dict, Tuple
+from typing import Union, Optional, Dict, Tuple, NamedTuple
 import datetime
+import math
+import tempfile
+from pathlib import Path
 
 import numpy
 import xarray
+import dask
 from dask import array as da
+from dask.utils import parse_bytes
+from dask.array.core import normalize_chunks
+from dask.base import tokenize
+from dask.highlevelgraph import HighLevelGraph
+try:
+    from dask.highlevelgraph import Layer, MaterializedLayer
+except ImportError:  # older dask, graph layers are plain dictionaries
+    Layer = collections.abc.Mapping
+    MaterializedLayer = None
 
 from datacube.config import LocalConfig
 from datacube.storage import reproject_and_fuse, BandInfo
+from datacube.storage._load import reproject_and_fuse_bands, select_overlapping, _dataset_footprint
+from datacube.storage._read import SnapPolicy, rdr_block_shape, rdr_geobox, plan_paste
+from datacube.storage._lazy import maybe_lazy_datasource, has_indexed_grid
 from datacube.utils import ignore_exceptions_if
 from datacube.utils import geometry
 from datacube.utils.dates import normalise_dt
-from datacube.utils.geometry import intersects, GeoBox
+from datacube.utils.geometry import intersects, roi_shape, roi_is_empty, GeoBox
 from datacube.utils.geometry.gbox import GeoboxTiles
 from datacube.model.utils import xr_apply
 
 from .query import Query, query_group_by, query_geopolygon
 from ..index import index_connect
 from ..drivers import new_datasource
+from ..drivers.readers import choose_datasource
 
 
 class TerminateCurrentLoad(Exception):
@@ -140,6 +162,8 @@ class Datacube(object):
     def load(self, product=None, measurements=None, output_crs=None, resolution=None, resampling=None,
              skip_broken_datasets=False,
              dask_chunks=None, like=None, fuse_func=None, align=None, datasets=None, progress_cbk=None,
+             max_workers=None, executor=None, snap_tolerance=None, source_order=None,
+             lazy_open=None, dask_multiband=False, memmap_dir=None, out=None,
              **query):
         """
         Load data as an ``xarray`` object.  Each measurement will be a data variable in the :class:`xarray.Dataset`.
@@ -251,6 +275,8 @@ class Datacube(object):
         :param dict dask_chunks:
             If the data should be lazily loaded using :class:`dask.array.Array`,
             specify the chunking size in each output dimension.
+            Use ``'auto'`` for spatial dimensions to align chunks with source file blocks,
+            see :meth:`load_data`.
 
             See the documentation on using `xarray with dask <http://xarray.pydata.org/en/stable/dask.html>`_
             for more information.
@@ -282,19 +308,284 @@ class Datacube(object):
             if supplied will be called for every file read with `files_processed_so_far, total_files`. This is
             only applicable to non-lazy loads, ignored when using dask.
 
+        :param int max_workers:
+            Optional. Number of threads to use for non-lazy loads, each thread loads one
+            (time, measurement) slice at a time. Ignored when using dask.
+
+        :param concurrent.futures.Executor executor:
+            Optional. Thread pool to use for non-lazy loads instead of creating one with
+            ``max_workers`` threads. Ignored when using dask.
+
+        :param float snap_tolerance:
+            Optional. Sources that are offset from the output pixel grid by no more than this
+            fraction of a pixel are pasted as if they were aligned with it, instead of being
+            resampled. Defaults to ``snap_tolerance`` from the ``load`` section of the product
+            definition, if any. See :meth:`load_data`.
+
+        :param source_order:
+            Optional. Order in which datasets of the same time slice are read, see :func:`sort_sources`.
+            Defaults to ``source_order`` from the ``load`` section of the product definition, if any.
+
+        :param bool lazy_open:
+            Optional. Plan reads using raster metadata recorded in the index and only open files
+            when pixels are needed, see :meth:`load_data`. Defaults to ``lazy_open`` from the
+            ``load`` section of the product definition, if any.
+
+        :param bool dask_multiband:
+            Optional. When loading with dask, read all measurements of a chunk in one task,
+            see :meth:`load_data`.
+
+        :param memmap_dir:
+            Optional. Directory for temporary files backing the output of non-lazy loads that
+            don't fit in memory, see :meth:`load_data`.
+
+        :param out:
+            Optional. Existing :class:`xarray.Dataset` (or dictionary of arrays) to load data into
+            instead of allocating new arrays, for example the result of a previous load of the same
+            region. See :meth:`load_data`.
+
         :return: Requested data in a :class:`xarray.Dataset`
         :rtype: :class:`xarray.Dataset`
         """
+        prepared = self._prepare_load(product=product, measurements=measurements, output_crs=output_crs,
+                                      resolution=resolution, like=like, align=align, datasets=datasets,
+                                      snap_tolerance=snap_tolerance, source_order=source_order,
+                                      lazy_open=lazy_open, query=query)
+        if prepared is None:
+            return xarray.Dataset()
+
+        grouped, geobox, measurement_dicts, load_hints = prepared
+
+        result = self.load_data(grouped, geobox,
+                                measurement_dicts,
+                                resampling=resampling,
+                                fuse_func=fuse_func,
+                                dask_chunks=dask_chunks,
+                                skip_broken_datasets=skip_broken_datasets,
+                                progress_cbk=progress_cbk,
+                                max_workers=max_workers,
+                                executor=executor,
+                                dask_multiband=dask_multiband,
+                                memmap_dir=memmap_dir,
+                                out=out,
+                                **load_hints)
+
+        return result
+
+    def load_iter(self, product=None, measurements=None, output_crs=None, resolution=None, resampling=None,
+                  skip_broken_datasets=False, like=None, fuse_func=None, align=None, datasets=None,
+                  max_workers=None, snap_tolerance=None, source_order=None, lazy_open=None,
+                  prefetch=1,
+                  **query):
+        """
+        Load data one group of datasets (usually one time slice) at a time.
+
+        Datasets are found and grouped as in :meth:`load`, but instead of a single :class:`xarray.Dataset`
+        holding everything this returns an iterator that yields an :class:`xarray.Dataset` for every group,
+        with the grouping dimension (``time``) of length 1. While the caller processes one slice,
+        the next ``prefetch`` slices are loaded in background threads, so the iterator never holds
+        more than ``prefetch + 1`` slices in memory.
+
+        Search and output geometry are computed when this method is called, data is loaded as the
+        iterator is consumed. Stopping iteration early cancels slices that are not being loaded yet.
+        Errors raised while loading a slice are raised when that slice is reached.
+
+        See :meth:`load` for the other parameters.
+
+        :param int prefetch:
+            Number of slices to load ahead of the one being processed, ``0`` loads every slice only
+            once it is requested.
+
+        :param int max_workers:
+            Load measurements of one slice in parallel using that many threads.
+
+        :return: Iterator of :class:`xarray.Dataset`, one per group
+        """
+        if prefetch < 0:
+            raise ValueError('prefetch should be non-negative')
+
+        prepared = self._prepare_load(product=product, measurements=measurements, output_crs=output_crs,
+                                      resolution=resolution, like=like, align=align, datasets=datasets,
+                                      snap_tolerance=snap_tolerance, source_order=source_order,
+                                      lazy_open=lazy_open, query=query)
+        if prepared is None:
+            return iter(())
+
+        grouped, geobox, measurement_dicts, load_hints = prepared
+
+        def load_slice(sources):
+            return self.load_data(sources, geobox,
+                                  measurement_dicts,
+                                  resampling=resampling,
+                                  fuse_func=fuse_func,
+                                  skip_broken_datasets=skip_broken_datasets,
+                                  max_workers=max_workers,
+                                  **load_hints)
+
+        dim = grouped.dims[0]
+        return _prefetch_map(load_slice,
+                             (grouped.isel({dim: slice(i, i+1)}) for i in range(grouped.shape[0])),
+                             prefetch)
+
+    def load_to_store(self, path, product=None, measurements=None, output_crs=None, resolution=None,
+                      resampling=None, skip_broken_datasets=False, like=None, fuse_func=None, align=None,
+                      datasets=None, chunks=None, resume=False, prefetch=1, progress_cbk=None,
+                      max_workers=None, snap_tolerance=None, source_order=None, lazy_open=None,
+                      variable_params=None, global_attributes=None,
+                      **query):
+        """
+        Load data straight into a chunked NetCDF file on disk.
+
+        Datasets are found and grouped as in :meth:`load`, but instead of allocating the whole output
+        in memory it is loaded and written one chunk (one time slice of one spatial tile) at a time,
+        so outputs larger than memory can be produced. Chunks that no dataset overlaps are not
+        written, they read back as ``nodata`` (NetCDF fill value).
+
+        Written chunks are recorded in a ``.progress`` file next to the output, it is removed once
+        all chunks were written. An interrupted load can be continued with ``resume=True``.
+
+        See :meth:`load` for the other parameters.
+
+        :param path: Output file
+        :param dict chunks:
+            Spatial chunk sizes, as for ``dask_chunks`` in :meth:`load`. Defaults to ``'auto'`` for
+            both spatial dimensions, see :func:`plan_dask_chunks`. Non-spatial dimensions always use
+            chunk size of 1.
+        :param bool resume:
+            Skip chunks already written to ``path`` by a previous call with the same arguments,
+            instead of failing if output exists.
+        :param int prefetch:
+            Number of chunks to load ahead in background threads while the current one is written.
+        :param progress_cbk: Int, Int -> None
+            if supplied will be called after every chunk with ``chunks_done, total_chunks``
+        :param dict variable_params:
+            Per measurement parameters for creating NetCDF variables, e.g. ``{'red': {'zlib': True}}``
+        :param dict global_attributes: Global attributes of the output file
+        :return: Path to the output
+        :rtype: pathlib.Path
+        """
+        from datacube.drivers.netcdf import NetCDFChunkWriter, Variable, netcdf_writer
+
+        prepared = self._prepare_load(product=product, measurements=measurements, output_crs=output_crs,
+                                      resolution=resolution, like=like, align=align, datasets=datasets,
+                                      snap_tolerance=snap_tolerance, source_order=source_order,
+                                      lazy_open=lazy_open, query=query)
+        if prepared is None:
+            raise ValueError('No datasets to load')
+
+        grouped, geobox, measurement_dicts, load_hints = prepared
+        measurement_dicts = list(measurement_dicts.values())
+
+        plan = plan_dask_chunks(grouped, geobox, measurement_dicts, chunks)
+        if any(plan.chunks[str(dim)] != 1 for dim in grouped.dims):
+            raise ValueError('Only spatial dimensions can be chunked')
+        grid_chunks = tuple(plan.chunks[str(dim)] for dim in geobox.dimensions)
+        gbt = GeoboxTiles(geobox, grid_chunks)
+
+        dims = grouped.dims + geobox.dimensions
+        coords = OrderedDict(grouped.coords)
+        coords.update(geobox.xr_coords())
+        variables = OrderedDict((m.name, Variable(numpy.dtype(m.dtype), m.nodata, dims, m.units))
+                                for m in measurement_dicts)
+        variable_params = {m.name: dict(chunksizes=(1,) * grouped.ndim + grid_chunks,
+                                        **(variable_params or {}).get(m.name, {}))
+                           for m in measurement_dicts}
+
+        out = NetCDFChunkWriter(path, geobox.crs, coords, variables, variable_params,
+                                global_attributes=global_attributes, resume=resume)
+        if out.complete:
+            return Path(path)
+
+        if out.created:
+            for m in measurement_dicts:
+                if 'flags_definition' in m:
+                    netcdf_writer.write_flag_definition(out.nco[m.name], m.flags_definition)
+
+        n_total = grouped.size * int(numpy.prod(gbt.shape))
+        todo = [index + idx
+                for index in numpy.ndindex(grouped.shape)
+                for idx in numpy.ndindex(*gbt.shape)
+                if index + idx not in out.done]
+        n_done = n_total - len(todo)
+
+        def load_chunk(key):
+            index, idx = key[:grouped.ndim], key[grouped.ndim:]
+            sub_gbox = gbt[idx]
+            if not select_overlapping(grouped.values[index], sub_gbox)[0]:
+                return key, None
+            sources = grouped.isel({dim: slice(i, i+1) for dim, i in zip(grouped.dims, index)})
+            return key, self.load_data(sources, sub_gbox, measurement_dicts,
+                                       resampling=resampling,
+                                       fuse_func=fuse_func,
+                                       skip_broken_datasets=skip_broken_datasets,
+                                       max_workers=max_workers,
+                                       **load_hints)
+
+        try:
+            for key, data in _prefetch_map(load_chunk, todo, prefetch):
+                index, idx = key[:grouped.ndim], key[grouped.ndim:]
+                roi = index + gbt.roi(idx)
+                pix = {} if data is None else {m.name: data[m.name].values.reshape(gbt.chunk_shape(idx))
+                                               for m in measurement_dicts}
+                out.write(key, roi, pix)
+
+                n_done += 1
+                if progress_cbk is not None:
+                    progress_cbk(n_done, n_total)
+        except BaseException:
+            out.close(complete=False)
+            raise
+
+        out.close()
+        return Path(path)
+
+    def plan_load(self, product=None, measurements=None, output_crs=None, resolution=None, resampling=None,
+                  dask_chunks=None, like=None, align=None, datasets=None, snap_tolerance=None,
+                  source_order=None, lazy_open=None,
+                  **query):
+        """
+        Estimate the cost of a :meth:`load` without reading any pixels.
+
+        Datasets are found and grouped and output geometry is computed exactly as in :meth:`load`,
+        then every source is checked against the output using only the information in the index,
+        see :func:`plan_load_data`. Useful for rejecting or splitting oversized requests before
+        loading them.
+
+        Accepts the same parameters as :meth:`load`, those that don't change what is read are not
+        needed.
+
+        :return: :class:`LoadPlan`, or ``None`` when there are no datasets to load
+        """
+        prepared = self._prepare_load(product=product, measurements=measurements, output_crs=output_crs,
+                                      resolution=resolution, like=like, align=align, datasets=datasets,
+                                      snap_tolerance=snap_tolerance, source_order=source_order,
+                                      lazy_open=lazy_open, query=query)
+        if prepared is None:
+            return None
+
+        grouped, geobox, measurement_dicts, load_hints = prepared
+        return plan_load_data(grouped, geobox, measurement_dicts,
+                              resampling=resampling,
+                              dask_chunks=dask_chunks,
+                              snap_tolerance=load_hints['snap_tolerance'])
+
+    def _prepare_load(self, product, measurements, output_crs, resolution, like, align, datasets,
+                      snap_tolerance, source_order, lazy_open, query):
+        """ Find and group datasets, compute output geometry and settings common to all load methods.
+
+        :returns: ``(grouped_datasets, geobox, measurement_dicts, load_data_settings)``,
+                  or ``None`` when there are no datasets to load
+        """
         if product is None and datasets is None:
             raise ValueError("Must specify a product or supply datasets")
 
         if datasets is None:
-            datasets = self.find_datasets(product=product, like=like, ensure_location=True, **query)
+            datasets = self.find_datasets(product=product, like=like, ensure_location=True, partial=True, **query)
         elif isinstance(datasets, collections.abc.Iterator):
             datasets = list(datasets)
 
         if len(datasets) == 0:
-            return xarray.Dataset()
+            return None
 
         ds, *_ = datasets
         datacube_product = ds.type
@@ -308,15 +599,17 @@ class Datacube(object):
 
         measurement_dicts = datacube_product.lookup_measurements(measurements)
 
-        result = self.load_data(grouped, geobox,
-                                measurement_dicts,
-                                resampling=resampling,
-                                fuse_func=fuse_func,
-                                dask_chunks=dask_chunks,
-                                skip_broken_datasets=skip_broken_datasets,
-                                progress_cbk=progress_cbk)
+        load_hints = datacube_product.load_hints()
+        if snap_tolerance is None:
+            snap_tolerance = load_hints.get('snap_tolerance', None)
+        if source_order is None:
+            source_order = load_hints.get('source_order', None)
+        if lazy_open is None:
+            lazy_open = load_hints.get('lazy_open', False)
 
-        return result
+        return grouped, geobox, measurement_dicts, dict(snap_tolerance=snap_tolerance,
+                                                        source_order=source_order,
+                                                        lazy_open=lazy_open)
 
     def find_datasets(self, **search_terms):
         """
@@ -330,13 +623,15 @@ class Datacube(object):
         """
         return list(self.find_datasets_lazy(**search_terms))
 
-    def find_datasets_lazy(self, limit=None, ensure_location=False, **kwargs):
+    def find_datasets_lazy(self, limit=None, ensure_location=False, partial=False, **kwargs):
         """
         Find datasets matching query.
 
         :param kwargs: see :class:`datacube.api.query.Query`
         :param ensure_location: only return datasets that have locations
         :param limit: if provided, limit the maximum number of datasets returned
+        :param partial: only fetch the parts of dataset documents needed for loading data,
+                        see :meth:`.DatasetResource.search`
         :return: iterator of datasets
         :rtype: __generator[:class:`datacube.model.Dataset`]
 
@@ -347,6 +642,8 @@ class Datacube(object):
             raise ValueError("must specify a product")
 
         datasets = self.index.datasets.search(limit=limit,
+                                              partial=partial,
+                                              geopolygon=query.geopolygon,
                                               **query.search_terms)
 
         if query.geopolygon is not None:
@@ -471,7 +768,11 @@ class Datacube(object):
 
     @staticmethod
     def _dask_load(sources, geobox, measurements, dask_chunks,
-                   skip_broken_datasets=False):
+                   skip_broken_datasets=False,
+                   source_order=None,
+                   multiband=False):
+        if dask_chunks == 'auto' or any(dask_chunks.get(dim, None) == 'auto' for dim in geobox.dimensions):
+            dask_chunks = plan_dask_chunks(sources, geobox, measurements, dask_chunks).chunks
         needed_irr_chunks, grid_chunks = _calculate_chunk_sizes(sources, geobox, dask_chunks)
         gbt = GeoboxTiles(geobox, grid_chunks)
         dsk = {}
@@ -482,58 +783,164 @@ class Datacube(object):
                 dsk[_tokenize_dataset(ds)] = ds
                 for idx in gbt.tiles(ds.extent):
                     out.setdefault(idx, []).append(ds)
+
+            if source_order is not None:
+                out = {idx: sort_sources(dss, source_order, gbt[idx])
+                       for idx, dss in out.items()}
             return out
 
         chunked_srcs = xr_apply(sources,
                                 lambda _, dss: chunk_datasets(dss, gbt),
                                 dtype=object)
 
-        def data_func(measurement):
-            return _make_dask_array(chunked_srcs, dsk, gbt,
-                                    measurement,
-                                    chunks=needed_irr_chunks+grid_chunks,
-                                    skip_broken_datasets=skip_broken_datasets)
+        chunks = needed_irr_chunks + grid_chunks
+        token = _tokenize_dask_load(sources, geobox, chunks,
+                                    skip_broken_datasets=skip_broken_datasets,
+                                    source_order=source_order)
+        arrays = _make_dask_arrays(chunked_srcs, dsk, gbt,
+                                   measurements,
+                                   chunks=chunks,
+                                   token=token,
+                                   skip_broken_datasets=skip_broken_datasets,
+                                   multiband=multiband)
 
-        return Datacube.create_storage(sources.coords, geobox, measurements, data_func)
+        return Datacube.create_storage(sources.coords, geobox, measurements, lambda m: arrays[m.name])
 
     @staticmethod
     def _xr_load(sources, geobox, measurements,
                  skip_broken_datasets=False,
-                 progress_cbk=None):
+                 progress_cbk=None,
+                 executor=None,
+                 source_order=None,
+                 memmap_dir=None,
+                 out=None):
+        abort = threading.Event()
+        lock = threading.Lock()
 
         def mk_cbk(cbk):
             if cbk is None:
                 return None
             n = 0
-            n_total = sum(len(x) for x in sources.values.ravel())*len(measurements)
+            n_total = sum(len(x) for x in sources.values.ravel())*len(measurements)*len(blocks)
 
             def _cbk(*ignored):
                 nonlocal n
-                n += 1
-                return cbk(n, n_total)
+                with lock:
+                    if abort.is_set():
+                        # load was terminated from another thread
+                        raise TerminateCurrentLoad()
+                    n += 1
+                    try:
+                        return cbk(n, n_total)
+                    except (TerminateCurrentLoad, KeyboardInterrupt):
+                        abort.set()
+                        raise
             return _cbk
 
-        data = Datacube.create_storage(sources.coords, geobox, measurements)
+        if out is not None:
+            # every slice is overwritten by fusing, so output is not cleared first
+            out_arrays = _output_arrays(out, sources.shape + geobox.shape, measurements)
+            data = Datacube.create_storage(sources.coords, geobox, measurements,
+                                           lambda m: out_arrays[m.name])
+            blocks = [((slice(None), slice(None)), geobox)]
+        elif memmap_dir is None:
+            data = Datacube.create_storage(sources.coords, geobox, measurements)
+            blocks = [((slice(None), slice(None)), geobox)]
+        else:
+            # output lives in scratch files and is loaded one spatial block at a time,
+            # so that only a block worth of output pages is being worked on
+            shape = sources.shape + geobox.shape
+            data = Datacube.create_storage(sources.coords, geobox, measurements,
+                                           lambda m: _memmap_array(memmap_dir, shape, m))
+            plan = plan_dask_chunks(sources, geobox, measurements)
+            gbt = GeoboxTiles(geobox, tuple(plan.chunks[str(dim)] for dim in geobox.dimensions))
+            blocks = [(gbt.roi(idx), gbt[idx]) for idx in numpy.ndindex(*gbt.shape)]
+
         _cbk = mk_cbk(progress_cbk)
 
-        for index, datasets in numpy.ndenumerate(sources.values):
-            for m in measurements:
-                t_slice = data[m.name].values[index]
+        # Every (time, measurement) slice writes to a separate region of the
+        # output, so slices can be loaded concurrently. Measurements stored in
+        # the same file are loaded together to avoid re-opening it.
+        dst_arrays = {m.name: data[m.name].values for m in measurements}
+
+        def all_slices():
+            for roi, block_gbox in blocks:
+                for index, datasets in numpy.ndenumerate(sources.values):
+                    # datasets whose footprint misses the output are never opened
+                    datasets, skipped = select_overlapping(datasets, block_gbox)
+                    if source_order is not None:
+                        datasets = sort_sources(datasets, source_order, block_gbox)
+                    for mm in _group_by_file(datasets, measurements):
+                        yield index + roi, block_gbox, datasets, mm, len(skipped)
+
+        def fuse_slice(dst_roi, block_gbox, datasets, mm, n_skipped=0):
+            if _cbk is not None:
+                # skipped datasets still count towards progress
+                for _ in range(n_skipped*len(mm)):
+                    _cbk()
+
+            if len(mm) == 1:
+                m, = mm
+                _fuse_measurement(dst_arrays[m.name][dst_roi], datasets, block_gbox, m,
+                                  skip_broken_datasets=skip_broken_datasets,
+                                  progress_cbk=_cbk)
+            else:
+                _fuse_measurements([dst_arrays[m.name][dst_roi] for m in mm], datasets, block_gbox, mm,
+                                   skip_broken_datasets=skip_broken_datasets,
+                                   progress_cbk=_cbk)
 
+        if executor is None:
+            for args in all_slices():
                 try:
-                    _fuse_measurement(t_slice, datasets, geobox, m,
-                                      skip_broken_datasets=skip_broken_datasets,
-                                      progress_cbk=_cbk)
+                    fuse_slice(*args)
                 except (TerminateCurrentLoad, KeyboardInterrupt):
                     data.attrs['dc_partial_load'] = True
                     return data
 
+            return data
+
+        def load_slice(*args):
+            if abort.is_set():
+                return
+
+            try:
+                fuse_slice(*args)
+            except (TerminateCurrentLoad, KeyboardInterrupt):
+                abort.set()
+
+        futures = [executor.submit(load_slice, *args) for args in all_slices()]
+        try:
+            for fut in futures:
+                fut.result()
+        except KeyboardInterrupt:
+            abort.set()
+        except Exception:
+            abort.set()
+            raise
+        finally:
+            if abort.is_set():
+                # don't start any more slices, but wait for those already running
+                for fut in futures:
+                    fut.cancel()
+                concurrent.futures.wait(futures)
+
+        if abort.is_set():
+            data.attrs['dc_partial_load'] = True
+
         return data
 
     @staticmethod
     def load_data(sources, geobox, measurements, resampling=None,
                   fuse_func=None, dask_chunks=None, skip_broken_datasets=False,
                   progress_cbk=None,
+                  max_workers=None,
+                  executor=None,
+                  snap_tolerance=None,
+                  source_order=None,
+                  lazy_open=False,
+                  dask_multiband=False,
+                  memmap_dir=None,
+                  out=None,
                   **extra):
         """
         Load data from :meth:`group_datasets` into an :class:`xarray.Dataset`.
@@ -567,26 +974,106 @@ class Datacube(object):
             Unspecified dimensions will be auto-guessed, currently this means use chunk size of 1 for non-spatial
             dimensions and use whole dimension (no chunking unless specified) for spatial dimensions.
 
+            Spatial dimensions set to ``'auto'`` (or ``dask_chunks='auto'``) get chunks that are a whole
+            number of source file blocks across and hold about ``array.chunk-size`` bytes (dask config
+            setting), see :func:`plan_dask_chunks`.
+
             See the documentation on using `xarray with dask <http://xarray.pydata.org/en/stable/dask.html>`_
             for more information.
 
         :param progress_cbk: Int, Int -> None
             if supplied will be called for every file read with `files_processed_so_far, total_files`. This is
+            only applicable to non-lazy loads, ignored when using dask. When loading with
+            multiple threads it is called from worker threads, but never concurrently.
+
+        :param int max_workers:
+            Load (time, measurement) slices in parallel using a pool of that many threads,
             only applicable to non-lazy loads, ignored when using dask.
 
+        :param concurrent.futures.Executor executor:
+            Use this thread pool for loading slices in parallel instead of creating a new
+            one, only applicable to non-lazy loads, ignored when using dask.
+
+        :param float snap_tolerance:
+            Paste sources that are offset from the output pixel grid by up to that fraction
+            of an output pixel (0 to 0.5) instead of resampling them. For non-lazy loads
+            ``dc_snapped`` attribute is set on the result when this was applied to any source.
+
+        :param source_order:
+            Order in which datasets of the same time slice are read and fused, see :func:`sort_sources`.
+            With the default fuser the first valid pixel wins and remaining datasets are not read once
+            there are no missing pixels left, so putting the most useful datasets first saves reads.
+            For lazy loads datasets are ordered separately for every chunk.
+
+        :param bool lazy_open:
+            Use shape, transform and CRS of the band recorded in the index (EO3 ``grids``), together
+            with nodata and data type from the product definition, instead of reading them from the
+            file. Files are then only opened once pixels are needed, sources that turn out to not
+            overlap with the output are never opened. This saves a round trip per dataset when
+            reading from remote storage, but relies on the index being accurate. Measurements stored
+            in the same file as other loaded measurements are still opened up-front.
+
+        :param bool dask_multiband:
+            Only applicable to lazy loads. Read all measurements of a chunk with a single task,
+            measurements stored in the same file then share the file reads. Computing just one of the
+            measurements still reads all of them.
+
+        :param memmap_dir:
+            Only applicable to non-lazy loads. Store output in temporary files in this directory
+            using :class:`numpy.memmap` instead of in memory, for loads larger than available RAM.
+            Output is then loaded one spatial block at a time, with block shape picked as for
+            ``dask_chunks='auto'``, so that only a block worth of output is being worked on.
+            Files are removed as soon as they are created, disk space is released once the
+            result is garbage collected.
+
+        :param out:
+            Only applicable to non-lazy loads. Fill arrays of an existing :class:`xarray.Dataset`, or a
+            dictionary from measurement name to :class:`numpy.ndarray`, instead of allocating new ones.
+            Arrays must have the shape and data type of the output. Returned dataset uses these
+            arrays for its data variables. Useful when loading the same geobox repeatedly. Arrays are
+            not cleared first, on a partial load regions not yet loaded keep their previous contents.
+
         :rtype: xarray.Dataset
 
         .. seealso:: :meth:`find_datasets` :meth:`group_datasets`
         """
-        measurements = per_band_load_data_settings(measurements, resampling=resampling, fuse_func=fuse_func)
+        snap = None if snap_tolerance is None else SnapPolicy(snap_tolerance)
+        measurements = per_band_load_data_settings(measurements, resampling=resampling, fuse_func=fuse_func,
+                                                   snap=snap, lazy_open=lazy_open)
+
+        if out is not None and memmap_dir is not None:
+            raise ValueError('Only one of out and memmap_dir can be used')
 
         if dask_chunks is not None:
+            if out is not None:
+                raise ValueError('Output arrays can not be supplied for lazy loads')
             return Datacube._dask_load(sources, geobox, measurements, dask_chunks,
-                                       skip_broken_datasets=skip_broken_datasets)
+                                       skip_broken_datasets=skip_broken_datasets,
+                                       source_order=source_order,
+                                       multiband=dask_multiband)
+
+        if executor is None and max_workers is not None and max_workers > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                data = Datacube._xr_load(sources, geobox, measurements,
+                                         skip_broken_datasets=skip_broken_datasets,
+                                         progress_cbk=progress_cbk,
+                                         executor=executor,
+                                         source_order=source_order,
+                                         memmap_dir=memmap_dir,
+                                         out=out)
         else:
-            return Datacube._xr_load(sources, geobox, measurements,
+            data = Datacube._xr_load(sources, geobox, measurements,
                                      skip_broken_datasets=skip_broken_datasets,
-                                     progress_cbk=progress_cbk)
+                                     progress_cbk=progress_cbk,
+                                     executor=executor,
+                                     source_order=source_order,
+                                     memmap_dir=memmap_dir,
+                                     out=out)
+
+        if snap is not None and snap.applied:
+            data.attrs['dc_snapped'] = True
+
+        return data
 
     def __str__(self):
         return "Datacube<index={!r}>".format(self.index)
@@ -607,7 +1094,7 @@ class Datacube(object):
         self.close()
 
 
-def per_band_load_data_settings(measurements, resampling=None, fuse_func=None):
+def per_band_load_data_settings(measurements, resampling=None, fuse_func=None, snap=None, lazy_open=False):
     def with_resampling(m, resampling, default=None):
         m = m.copy()
         m['resampling_method'] = resampling.get(m.name, default)
@@ -618,6 +1105,16 @@ def per_band_load_data_settings(measurements, resampling=None, fuse_func=None):
         m['fuser'] = fuser.get(m.name, default)
         return m
 
+    def with_snap(m, snap):
+        m = m.copy()
+        m['snap'] = snap
+        return m
+
+    def with_lazy_open(m):
+        m = m.copy()
+        m['lazy_open'] = True
+        return m
+
     if isinstance(resampling, str):
         resampling = {'*': resampling}
 
@@ -635,9 +1132,96 @@ def per_band_load_data_settings(measurements, resampling=None, fuse_func=None):
         measurements = [with_fuser(m, fuse_func, default=fuse_func.get('*'))
                         for m in measurements]
 
+    if snap is not None:
+        measurements = [with_snap(m, snap) for m in measurements]
+
+    if lazy_open:
+        measurements = [with_lazy_open(m) for m in measurements]
+
     return measurements
 
 
+def _output_arrays(out, shape, measurements):
+    """ Check that caller supplied output has an array of the right shape and type for every measurement.
+
+    :param out: :class:`xarray.Dataset` or a dictionary from measurement name to :class:`numpy.ndarray`
+    :returns: Dictionary from measurement name to :class:`numpy.ndarray`
+    """
+    arrays = {}
+    for m in measurements:
+        if m.name not in out:
+            raise ValueError('Output is missing measurement {}'.format(m.name))
+
+        a = out[m.name]
+        if isinstance(a, xarray.DataArray):
+            a = a.data
+        if not isinstance(a, numpy.ndarray):
+            raise ValueError('Output for {} is not a numpy array'.format(m.name))
+        if a.shape != shape or a.dtype != numpy.dtype(m.dtype):
+            raise ValueError('Output for {} should be {}{}, got {}{}'.format(
+                m.name, numpy.dtype(m.dtype).name, shape, a.dtype.name, a.shape))
+        if not a.flags.writeable:
+            raise ValueError('Output for {} is read-only'.format(m.name))
+        arrays[m.name] = a
+
+    return arrays
+
+
+def _memmap_array(directory, shape, measurement):
+    """ Allocate output array backed by an anonymous temporary file in ``directory``, filled with nodata.
+
+    File is removed as soon as it is mapped, disk space is released once the array is garbage collected.
+    """
+    dtype = numpy.dtype(measurement.dtype)
+    if int(numpy.prod(shape)) == 0:
+        return numpy.empty(shape, dtype=dtype)
+
+    with tempfile.TemporaryFile(prefix='dc_load_', dir=str(directory)) as f:
+        data = numpy.memmap(f, dtype=dtype, mode='w+', shape=shape)
+
+    # new file is all zeros, otherwise fill one slice at a time to not hold all of it in memory
+    if measurement.nodata != 0:
+        for i in range(shape[0]):
+            data[i] = measurement.nodata
+
+    return data
+
+
+def _prefetch_map(func, items, prefetch):
+    """ Lazily apply ``func`` to every item, computing up to ``prefetch`` results ahead in background threads.
+    """
+    if prefetch == 0:
+        for item in items:
+            yield func(item)
+        return
+
+    items = iter(items)
+    futures = collections.deque()  # type: collections.deque
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=prefetch) as pool:
+        def submit():
+            item = next(items, _DONE)
+            if item is not _DONE:
+                futures.append(pool.submit(func, item))
+
+        try:
+            for _ in range(prefetch):
+                submit()
+
+            while futures:
+                result = futures.popleft().result()
+                # keep `prefetch` results in flight while the caller holds this one
+                submit()
+                yield result
+                result = None
+        finally:
+            for fut in futures:
+                fut.cancel()
+
+
+_DONE = object()
+
+
 def output_geobox(like=None, output_crs=None, resolution=None, align=None,
                   grid_spec=None, datasets=None, geopolygon=None, **query):
     """ Configure output geobox from user provided output specs. """
@@ -685,12 +1269,87 @@ def select_datasets_inside_polygon(datasets, polygon):
             yield dataset
 
 
+def sort_sources(datasets, order, geobox=None):
+    """
+    Order datasets of a single time slice, most useful first.
+
+    :param datasets: Datasets to order, sorting is stable so datasets that compare
+                     equal keep their original order
+    :param order:
+        - ``None`` keep original order
+        - ``'coverage'`` datasets covering larger part of ``geobox`` first
+        - name of a metadata search field, for example ``'cloud_cover'``, smallest
+          value first, prefix with ``'-'`` for largest first. Datasets without a
+          value for the field go last
+        - function from dataset to a sort key
+    :param GeoBox geobox: Region being loaded, needed for ``'coverage'`` order
+    :return: list of datasets
+    """
+    datasets = list(datasets)
+    if order is None or len(datasets) < 2:
+        return datasets
+
+    if callable(order):
+        return sorted(datasets, key=order)
+
+    if not isinstance(order, str):
+        raise ValueError('Unsupported source order: {!r}'.format(order))
+
+    if order == 'coverage':
+        if geobox is None:
+            raise ValueError("Need a geobox to order sources by 'coverage'")
+        region = geobox.extent
+
+        def coverage(ds):
+            if ds.extent is None:
+                return 0
+            return ds.extent.to_crs(region.crs).intersection(region).area
+
+        return sorted(datasets, key=coverage, reverse=True)
+
+    reverse = order.startswith('-')
+    field = order.lstrip('-')
+
+    def field_value(ds):
+        try:
+            return getattr(ds.metadata, field)
+        except (AttributeError, KeyError):
+            return None
+
+    values = [field_value(ds) for ds in datasets]
+    have = [(v, ds) for v, ds in zip(values, datasets) if v is not None]
+    missing = [ds for v, ds in zip(values, datasets) if v is None]
+
+    have = sorted(have, key=lambda v_ds: v_ds[0], reverse=reverse)
+    return [ds for _, ds in have] + missing
+
+
 def fuse_lazy(datasets, geobox, measurement, skip_broken_datasets=False, prepend_dims=0):
-    prepend_shape = (1,) * prepend_dims
-    data = numpy.full(geobox.shape, measurement.nodata, dtype=measurement.dtype)
-    _fuse_measurement(data, datasets, geobox, measurement,
-                      skip_broken_datasets=skip_broken_datasets)
-    return data.reshape(prepend_shape + geobox.shape)
+    return fuse_lazy_block([datasets], geobox, measurement,
+                           skip_broken_datasets=skip_broken_datasets,
+                           block_shape=(1,) * prepend_dims)
+
+
+def fuse_lazy_block(slices, geobox, measurement, skip_broken_datasets=False, block_shape=(1,)):
+    """ Load a block of several slices of one measurement into a single array.
+
+    :param slices: Datasets to fuse for every slice of the block, in C order, empty slices
+                   are filled with nodata
+    :param block_shape: Shape of the non-spatial dimensions of the block
+    :returns: Array of shape ``block_shape + geobox.shape``
+    """
+    # output is handed over to dask so it can't come from a buffer pool,
+    # it is filled with nodata by reproject_and_fuse
+    data = numpy.empty(tuple(block_shape) + geobox.shape, dtype=measurement.dtype)
+
+    for dest, datasets in zip(data.reshape((-1,) + geobox.shape), slices):
+        if datasets:
+            _fuse_measurement(dest, datasets, geobox, measurement,
+                              skip_broken_datasets=skip_broken_datasets)
+        else:
+            dest.fill(measurement.nodata)
+
+    return data
 
 
 def _fuse_measurement(dest, datasets, geobox, measurement,
@@ -700,7 +1359,10 @@ def _fuse_measurement(dest, datasets, geobox, measurement,
     for ds in datasets:
         src = None
         with ignore_exceptions_if(skip_broken_datasets):
-            src = new_datasource(BandInfo(ds, measurement.name))
+            band = BandInfo(ds, measurement.name)
+            src = new_datasource(band)
+            if src is not None and measurement.get('lazy_open', False):
+                src = maybe_lazy_datasource(src, band)
 
         if src is None:
             if not skip_broken_datasets:
@@ -715,7 +1377,63 @@ def _fuse_measurement(dest, datasets, geobox, measurement,
                        resampling=measurement.get('resampling_method', 'nearest'),
                        fuse_func=measurement.get('fuser', None),
                        skip_broken_datasets=skip_broken_datasets,
-                       progress_cbk=progress_cbk)
+                       progress_cbk=progress_cbk,
+                       snap=measurement.get('snap', None))
+
+
+def _fuse_measurements(dests, datasets, geobox, measurements,
+                       skip_broken_datasets=False,
+                       progress_cbk=None):
+    """ Like :func:`_fuse_measurement` but for several measurements stored in the same files.
+    """
+    srcs = []
+    for ds in datasets:
+        band_srcs = None
+        with ignore_exceptions_if(skip_broken_datasets):
+            band_srcs = [new_datasource(BandInfo(ds, m.name)) for m in measurements]
+
+        if band_srcs is None or any(src is None for src in band_srcs):
+            if not skip_broken_datasets:
+                raise ValueError(f"Failed to load dataset: {ds.id}")
+        else:
+            srcs.append(band_srcs)
+
+    reproject_and_fuse_bands(srcs,
+                             dests,
+                             geobox,
+                             [dest.dtype.type(m.nodata) for dest, m in zip(dests, measurements)],
+                             resampling=[m.get('resampling_method', 'nearest') for m in measurements],
+                             fuse_func=[m.get('fuser', None) for m in measurements],
+                             skip_broken_datasets=skip_broken_datasets,
+                             progress_cbk=progress_cbk,
+                             snap=measurements[0].get('snap', None))
+
+
+def _group_by_file(datasets, measurements):
+    """ Partition measurements into groups that are stored in the same file for every dataset.
+
+    Only measurements read with the default rasterio data source are grouped, everything
+    else ends up in a group of its own.
+    """
+    from datacube.storage._rio import RasterDatasetDataSource
+
+    def file_key(ds, m):
+        try:
+            band = BandInfo(ds, m.name)
+            if choose_datasource(band) is not RasterDatasetDataSource:
+                return None
+            return RasterDatasetDataSource(band).filename
+        except Exception:  # pylint: disable=broad-except
+            return None
+
+    groups = OrderedDict()  # type: Dict[Tuple, list]
+    for m in measurements:
+        key = tuple(file_key(ds, m) for ds in datasets)
+        if len(key) == 0 or None in key:
+            key = ('', m.name)
+        groups.setdefault(key, []).append(m)
+
+    return list(groups.values())
 
 
 def get_bounds(datasets, crs):
@@ -753,71 +1471,416 @@ def _calculate_chunk_sizes(sources: xarray.DataArray,
     return irr_chunks, grid_chunks
 
 
+# Chunking picked by :func:`plan_dask_chunks`: chunk size for every output dimension, shape of
+# internal blocks of the sampled source file in source and in output pixels (None if unknown)
+# and size of one chunk of the largest measurement type in bytes
+ChunkPlan = NamedTuple('ChunkPlan', [('chunks', Dict[str, int]),
+                                     ('source_block', Optional[Tuple[int, int]]),
+                                     ('output_block', Optional[Tuple[float, float]]),
+                                     ('chunk_bytes', int)])
+
+
+def plan_dask_chunks(sources: xarray.DataArray,
+                     geobox: GeoBox,
+                     measurements,
+                     dask_chunks: Optional[Dict[str, Union[str, int]]] = None,
+                     chunk_bytes: Optional[Union[int, str]] = None) -> ChunkPlan:
+    """ Resolve ``'auto'`` spatial chunk sizes for a lazy load.
+
+    Spatial chunks are made a whole number of source blocks (internal tiles of the files,
+    converted to output pixels) across, so that every source block is decoded by as few
+    tasks as possible, and as large as fits into ``chunk_bytes``, but never smaller than
+    one block. Block shape is found by opening the first dataset of ``sources``, when
+    that fails chunks are only sized to ``chunk_bytes``. Non-spatial ``'auto'`` dimensions
+    get chunk size of 1.
+
+    :param sources: Grouped datasets, as passed to :meth:`Datacube.load_data`
+    :param measurements: Measurements to be loaded (list or dict), only used to find data type and block shape
+    :param dask_chunks: As for :meth:`Datacube.load_data`, defaults to ``'auto'`` for both spatial dimensions
+    :param chunk_bytes: Target chunk size in bytes, defaults to ``array.chunk-size`` from dask config
+    """
+    if isinstance(measurements, dict):
+        measurements = list(measurements.values())
+    if dask_chunks is None or dask_chunks == 'auto':
+        dask_chunks = {dim: 'auto' for dim in geobox.dimensions}
+    if chunk_bytes is None:
+        chunk_bytes = dask.config.get('array.chunk-size')
+    if isinstance(chunk_bytes, str):
+        chunk_bytes = parse_bytes(chunk_bytes)
+
+    irr_chunks, grid_chunks = _calculate_chunk_sizes(sources, geobox, dask_chunks)
+    is_auto = [dask_chunks.get(dim, None) == 'auto' for dim in geobox.dimensions]
+
+    itemsize = max(numpy.dtype(m.dtype).itemsize for m in measurements)
+    max_pixels = max(1, chunk_bytes // (itemsize * int(numpy.prod(irr_chunks))))
+
+    source_block, output_block = _sample_block_shape(sources, geobox, measurements)
+    if any(is_auto):
+        step = (1, 1) if output_block is None else tuple(max(1, int(round(b))) for b in output_block)
+        grid_chunks = _fit_grid_chunks(geobox.shape,
+                                       tuple(None if auto else c for auto, c in zip(is_auto, grid_chunks)),
+                                       step, max_pixels)
+
+    chunks = dict(zip((str(dim) for dim in sources.dims + geobox.dimensions), irr_chunks + grid_chunks))
+    return ChunkPlan(chunks, source_block, output_block,
+                     itemsize * int(numpy.prod(irr_chunks + grid_chunks)))
+
+
+def _sample_block_shape(sources, geobox, measurements):
+    """ Find shape of internal blocks of the first source file, both in source and output pixels.
+    """
+    ds = next((dss[0] for dss in sources.values.ravel() if len(dss) > 0), None)
+    if ds is None or len(measurements) == 0:
+        return None, None
+
+    try:
+        with new_datasource(BandInfo(ds, measurements[0].name)).open() as rdr:
+            block = rdr_block_shape(rdr)
+            src_gbox = rdr_geobox(rdr)
+    except Exception:  # pylint: disable=broad-except
+        return None, None
+
+    if block is None:
+        return None, None
+
+    if src_gbox.crs == geobox.crs:
+        src_res = tuple(abs(r) for r in src_gbox.resolution)
+    else:
+        bbox = src_gbox.extent.to_crs(geobox.crs).boundingbox
+        src_res = (bbox.height/src_gbox.height, bbox.width/src_gbox.width)
+
+    dst_res = tuple(abs(r) for r in geobox.resolution)
+    return block, tuple(b*s/d for b, s, d in zip(block, src_res, dst_res))
+
+
+def _fit_grid_chunks(shape, chunks, step, max_pixels):
+    """ Pick missing (``None``) spatial chunk sizes as multiples of ``step``
+    that fit into ``max_pixels``, capped at the whole dimension.
+    """
+    (ny, nx), (cy, cx), (sy, sx) = shape, chunks, step
+
+    def fit(n, other, s):
+        return min(n, max(1, max_pixels // (other*s)) * s)
+
+    if cy is None and cx is None:
+        cy = min(ny, max(1, int(math.sqrt(max_pixels/(sy*sx)))) * sy)
+        cx = fit(nx, cy, sx)
+        cy = fit(ny, cx, sy)
+    elif cy is None:
+        cy = fit(ny, cx, sy)
+    elif cx is None:
+        cx = fit(nx, cy, sx)
+
+    return cy, cx
+
+
+LoadPlan = NamedTuple('LoadPlan', [('geobox', GeoBox),
+                                   ('n_datasets', int),
+                                   ('n_files', int),
+                                   ('read_bytes', int),
+                                   ('output_bytes', Dict[str, int]),
+                                   ('n_paste', int),
+                                   ('n_reproject', int),
+                                   ('n_unknown', int),
+                                   ('chunks', Optional[Tuple[Tuple[int, ...], ...]])])
+
+
+def plan_load_data(sources: xarray.DataArray,
+                   geobox: GeoBox,
+                   measurements,
+                   resampling=None,
+                   dask_chunks: Optional[Dict[str, Union[str, int]]] = None,
+                   snap_tolerance: Optional[float] = None) -> LoadPlan:
+    """ Estimate the cost of :meth:`Datacube.load_data` without reading any pixels.
+
+    Datasets whose footprint misses the output are dropped as they would be by the load.
+    For every remaining (dataset, measurement) pair the read is planned from the pixel grid
+    recorded in the index: sources that can be pasted are counted in ``n_paste``, those
+    that need resampling in ``n_reproject``, and ``read_bytes`` adds up the size of the
+    source region covering the output. Sources without an indexed grid are counted in
+    ``n_unknown``, for those the read is assumed to be the same size as the part of the
+    output covered by their footprint.
+
+    Estimates are upper bounds: reading stops early once the output is full, decimated
+    reads might use overviews, and sources are not opened to check that they exist.
+
+    - ``n_datasets``: number of (group, dataset) pairs that overlap the output
+    - ``n_files``: number of distinct files that would be opened
+    - ``output_bytes``: size of the output array of every measurement
+    - ``chunks``: chunk shapes of the output dask arrays when ``dask_chunks`` is supplied,
+      ``'auto'`` chunks are resolved by :func:`plan_dask_chunks`, which opens one file for that
+
+    :param sources: Grouped datasets, as passed to :meth:`Datacube.load_data`
+    :param measurements: Measurements to be loaded (list or dict)
+    :param resampling: As for :meth:`Datacube.load_data`
+    :param dask_chunks: As for :meth:`Datacube.load_data`
+    :param snap_tolerance: As for :meth:`Datacube.load_data`
+    """
+    snap = None if snap_tolerance is None else SnapPolicy(snap_tolerance)
+    measurements = per_band_load_data_settings(measurements, resampling=resampling, snap=snap)
+
+    n_pixels = sources.size * geobox.height * geobox.width
+    output_bytes = OrderedDict((m.name, n_pixels * numpy.dtype(m.dtype).itemsize) for m in measurements)
+
+    n_datasets = 0
+    files = set()
+    read_bytes = 0
+    counts = collections.Counter()  # type: Dict[Optional[str], int]
+    for datasets in sources.values.ravel():
+        datasets, _ = select_overlapping(datasets, geobox)
+        n_datasets += len(datasets)
+        for ds in datasets:
+            for m in measurements:
+                band = BandInfo(ds, m.name)
+                kind, nbytes = _plan_band_read(band, ds, geobox, m)
+                if kind is None:
+                    continue
+                files.add(band.uri)
+                counts[kind] += 1
+                read_bytes += nbytes
+
+    chunks = None
+    if dask_chunks is not None:
+        if dask_chunks == 'auto' or any(dask_chunks.get(dim, None) == 'auto' for dim in geobox.dimensions):
+            dask_chunks = plan_dask_chunks(sources, geobox, measurements, dask_chunks).chunks
+        irr_chunks, grid_chunks = _calculate_chunk_sizes(sources, geobox, dask_chunks)
+        chunks = normalize_chunks(irr_chunks + grid_chunks, sources.shape + geobox.shape)
+
+    return LoadPlan(geobox, n_datasets, len(files), read_bytes, output_bytes,
+                    counts['paste'], counts['reproject'], counts['unknown'], chunks)
+
+
+def _plan_band_read(band, ds, geobox, measurement):
+    """ Classify read of one band into ``geobox`` and estimate its size in bytes.
+
+    :returns: ``(kind, nbytes)``, where ``kind`` is one of ``'paste'``, ``'reproject'``,
+              ``'unknown'``, or ``None`` when band has no pixels inside ``geobox``
+    """
+    itemsize = numpy.dtype(band.dtype).itemsize
+
+    if has_indexed_grid(band):
+        h, w = band.grid_shape
+        src_gbox = GeoBox(w, h, band.grid_transform, band.crs)
+        rr, paste_ok = plan_paste(src_gbox, geobox,
+                                  resampling=measurement.get('resampling_method', 'nearest'),
+                                  snap=measurement.get('snap', None))
+        if roi_is_empty(rr.roi_dst):
+            return None, 0
+        return ('paste' if paste_ok else 'reproject'), int(numpy.prod(roi_shape(rr.roi_src))) * itemsize
+
+    n_pixels = geobox.height * geobox.width
+    footprint = _dataset_footprint(ds, geobox.crs)
+    if footprint is not None:
+        region = geobox.extent
+        n_pixels = int(round(n_pixels * footprint.intersection(region).area / region.area))
+    return 'unknown', n_pixels * itemsize
+
+
 def _tokenize_dataset(dataset):
     return 'dataset-{}'.format(dataset.id.hex)
 
 
-# pylint: disable=too-many-locals
-def _make_dask_array(chunked_srcs,
-                     dsk,
-                     gbt,
-                     measurement,
-                     chunks,
-                     skip_broken_datasets=False):
-    dsk = dsk.copy()  # this contains mapping from dataset id to dataset object
+def _tokenize_dask_load(sources, geobox, chunks, skip_broken_datasets=False, source_order=None):
+    """ Compute token for a lazy load that only depends on what is being loaded.
 
-    token = uuid.uuid4().hex
-    dsk_name = 'dc_load_{name}-{token}'.format(name=measurement.name, token=token)
+    Identical loads get identical dask keys, so that repeated loads can share work.
+    """
+    dataset_ids = [[ds.id.hex for ds in dss] for dss in sources.values.ravel()]
+    return tokenize(sources.shape, dataset_ids,
+                    geobox.shape, tuple(geobox.affine), str(geobox.crs),
+                    chunks, skip_broken_datasets, source_order)
 
-    needed_irr_chunks, grid_chunks = chunks[:-2], chunks[-2:]
-    actual_irr_chunks = (1,) * len(needed_irr_chunks)
 
-    # we can have up to 4 empty chunk shapes: whole, right edge, bottom edge and
-    # bottom right corner
-    #  W R
-    #  B BR
-    empties = {}  # type Dict[Tuple[int,int], str]
+class _LazyChunksLayer(Layer):
+    """ Dask graph layer with one task per chunk of an array, tasks are only generated when requested.
 
-    def _mk_empty(shape: Tuple[int, int]) -> str:
-        name = empties.get(shape, None)
-        if name is not None:
-            return name
+    ``mk_task(idx)`` returns ``(task, dependencies)`` for a given chunk index. ``has_task(idx)``
+    tells whether there is a task for that chunk without building it, defaults to every chunk
+    having one. Keys are ``(name, *idx)``.
 
-        name = 'empty_{}x{}-{token}'.format(*shape, token=token)
-        dsk[name] = (numpy.full, actual_irr_chunks + shape, measurement.nodata, measurement.dtype)
-        empties[shape] = name
+    With dask versions that don't support custom layers this is materialised into a dictionary,
+    see :func:`_graph_layer`.
+    """
 
-        return name
+    def __init__(self, name: str, shape: Tuple[int, ...], mk_task, has_task=None):
+        super().__init__()
+        self._name = name
+        self._shape = shape
+        self._mk_task = mk_task
+        self._has_task = has_task
+        self._len = None  # type: Optional[int]
+
+    def _index(self, key):
+        if not (isinstance(key, tuple) and len(key) == len(self._shape) + 1 and key[0] == self._name):
+            return None
+        idx = key[1:]
+        if not all(isinstance(i, int) and 0 <= i < n for i, n in zip(idx, self._shape)):
+            return None
+        if self._has_task is not None and not self._has_task(idx):
+            return None
+        return idx
+
+    def _lookup(self, key):
+        idx = self._index(key)
+        if idx is None:
+            raise KeyError(key)
+        return self._mk_task(idx)
+
+    def __getitem__(self, key):
+        return self._lookup(key)[0]
+
+    def __contains__(self, key):
+        return self._index(key) is not None
+
+    def get_dependencies(self, key, all_hlg_keys):
+        return set(self._lookup(key)[1])
+
+    def __iter__(self):
+        for idx in numpy.ndindex(*self._shape):
+            if self._has_task is None or self._has_task(idx):
+                yield (self._name, *idx)
+
+    def __len__(self):
+        if self._len is None:
+            self._len = sum(1 for _ in self)
+        return self._len
+
+    def is_materialized(self):
+        return False
+
+    def get_output_keys(self):
+        return self.keys()
+
+
+def _graph_layer(layer):
+    """ Layer as accepted by :class:`dask.highlevelgraph.HighLevelGraph` of the installed dask version.
+    """
+    if MaterializedLayer is None:
+        return dict(layer.items())
+    if isinstance(layer, dict):
+        return MaterializedLayer(layer)
+    return layer
 
-    for irr_index, tiled_dss in numpy.ndenumerate(chunked_srcs.values):
-        key_prefix = (dsk_name, *irr_index)
 
-        # all spatial chunks
-        for idx in numpy.ndindex(gbt.shape):
-            dss = tiled_dss.get(idx, None)
+def fuse_lazy_bands(slices, geobox, measurements, skip_broken_datasets=False, block_shape=(1,)):
+    """ Like :func:`fuse_lazy_block` but for several measurements at once, returns a tuple of arrays.
+    """
+    dests = OrderedDict((m.name, numpy.empty(tuple(block_shape) + geobox.shape, dtype=m.dtype))
+                        for m in measurements)
+    flat = {name: dest.reshape((-1,) + geobox.shape) for name, dest in dests.items()}
 
-            if dss is None:
-                val = _mk_empty(gbt.chunk_shape(idx))
+    for i, datasets in enumerate(slices):
+        if not datasets:
+            for m in measurements:
+                flat[m.name][i].fill(m.nodata)
+            continue
+
+        for mm in _group_by_file(datasets, measurements):
+            if len(mm) == 1:
+                m, = mm
+                _fuse_measurement(flat[m.name][i], datasets, geobox, m,
+                                  skip_broken_datasets=skip_broken_datasets)
             else:
-                val = (fuse_lazy,
-                       [_tokenize_dataset(ds) for ds in dss],
-                       gbt[idx],
-                       measurement,
-                       skip_broken_datasets,
-                       chunked_srcs.ndim)
+                _fuse_measurements([flat[m.name][i] for m in mm], datasets, geobox, mm,
+                                   skip_broken_datasets=skip_broken_datasets)
+
+    return tuple(dests.values())
+
+
+def _make_dask_arrays(chunked_srcs,
+                      dsk,
+                      gbt,
+                      measurements,
+                      chunks,
+                      token,
+                      skip_broken_datasets=False,
+                      multiband=False):
+    """ Build dask arrays for all measurements.
 
-            dsk[key_prefix + idx] = val
+    Tasks are generated lazily from ``chunked_srcs``, dataset objects are stored
+    once in a layer shared by all the arrays. With ``multiband=True`` every chunk
+    that has data is read by a single task that loads all the measurements.
+
+    :param token: Token of the load from :func:`_tokenize_dask_load`, array names are
+                  derived from it and from the per-measurement load settings
+    :returns: Dictionary from measurement name to :class:`dask.array.Array`
+    """
+    bands_token = tokenize(token, measurements)
+    datasets_name = 'dc_load_datasets-{token}'.format(token=token)
+    bands_name = 'dc_load_bands-{token}'.format(token=bands_token)
+
+    irr_chunks, grid_chunks = chunks[:-2], chunks[-2:]
+    n_irr = chunked_srcs.ndim
+    # every task loads a whole block of non-spatial slices, no rechunking needed
+    irr_chunk_shapes = normalize_chunks(irr_chunks, chunked_srcs.shape)
+    shape_in_chunks = tuple(len(c) for c in irr_chunk_shapes) + gbt.shape
+
+    def block_ranges(irr_block):
+        return [range(i*c, min((i+1)*c, n))
+                for i, c, n in zip(irr_block, irr_chunks, chunked_srcs.shape)]
+
+    def has_sources(idx):
+        irr_block, tile_index = idx[:n_irr], idx[n_irr:]
+        return any(tile_index in chunked_srcs.values[irr_index]
+                   for irr_index in itertools.product(*block_ranges(irr_block)))
+
+    def chunk_sources(idx):
+        irr_block, tile_index = idx[:n_irr], idx[n_irr:]
+        ranges = block_ranges(irr_block)
+        slices = [chunked_srcs.values[irr_index].get(tile_index, None)
+                  for irr_index in itertools.product(*ranges)]
+        if all(dss is None for dss in slices):
+            slices = None
+        return tile_index, tuple(len(r) for r in ranges), slices
+
+    def slice_tokens(slices):
+        tokens = [[_tokenize_dataset(ds) for ds in dss] if dss else [] for dss in slices]
+        return tokens, set(itertools.chain.from_iterable(tokens))
+
+    def mk_bands_task(idx):
+        tile_index, block_shape, slices = chunk_sources(idx)
+        tokens, deps = slice_tokens(slices)
+        return (fuse_lazy_bands, tokens, gbt[tile_index], measurements,
+                skip_broken_datasets, block_shape), deps
+
+    def mk_band_task(measurement, band_idx):
+        def mk_task(idx):
+            tile_index, block_shape, slices = chunk_sources(idx)
+            if slices is None:
+                return (numpy.full, block_shape + gbt.chunk_shape(tile_index),
+                        measurement.nodata, measurement.dtype), ()
+            if multiband:
+                key = (bands_name, *idx)
+                return (operator.getitem, key, band_idx), (key,)
+
+            tokens, deps = slice_tokens(slices)
+            return (fuse_lazy_block, tokens, gbt[tile_index], measurement,
+                    skip_broken_datasets, block_shape), deps
+        return mk_task
+
+    layers = {datasets_name: _graph_layer(dsk)}  # mapping from dataset token to dataset object
+    dependencies = {datasets_name: set()}  # type: Dict[str, set]
+    if multiband:
+        layers[bands_name] = _graph_layer(_LazyChunksLayer(bands_name, shape_in_chunks, mk_bands_task,
+                                                           has_task=has_sources))
+        dependencies[bands_name] = {datasets_name}
 
     y_shapes = [grid_chunks[0]]*gbt.shape[0]
     x_shapes = [grid_chunks[1]]*gbt.shape[1]
 
     y_shapes[-1], x_shapes[-1] = gbt.chunk_shape(tuple(n-1 for n in gbt.shape))
 
-    data = da.Array(dsk, dsk_name,
-                    chunks=actual_irr_chunks + (tuple(y_shapes), tuple(x_shapes)),
-                    dtype=measurement.dtype,
-                    shape=(chunked_srcs.shape + gbt.base.shape))
+    out = OrderedDict()
+    for band_idx, measurement in enumerate(measurements):
+        name = 'dc_load_{name}-{token}'.format(name=measurement.name,
+                                               token=tokenize(bands_token if multiband else token, measurement))
+        layer = _graph_layer(_LazyChunksLayer(name, shape_in_chunks, mk_band_task(measurement, band_idx)))
+        graph = HighLevelGraph(dict(layers, **{name: layer}),
+                               dict(dependencies, **{name: {bands_name if multiband else datasets_name}}))
 
-    if needed_irr_chunks != actual_irr_chunks:
-        data = data.rechunk(chunks=chunks)
-    return data
+        out[measurement.name] = da.Array(graph, name,
+                                         chunks=irr_chunk_shapes + (tuple(y_shapes), tuple(x_shapes)),
+                                         dtype=measurement.dtype,
+                                         shape=(chunked_srcs.shape + gbt.base.shape))
+
+    return out
@@ -229,7 +229,7 @@ class GridWorkflow(object):
         query = Query(index=self.index, geopolygon=geopolygon, **indexers)
         if not query.product:
             raise RuntimeError('must specify a product')
-        datasets = self.index.datasets.search_eager(**query.search_terms)
+        datasets = self.index.datasets.search_eager(geopolygon=query.geopolygon, **query.search_terms)
         return datasets, query
 
     @staticmethod
@@ -1,7 +1,7 @@
 """ Defines abstract types for IO drivers.
 """
 from typing import (
-    List, Tuple, Optional, Union, Any, Iterable,
+    List, Tuple, Optional, Union, Any, Iterable, Sequence,
     TYPE_CHECKING
 )
 
@@ -55,10 +55,29 @@ class GeoRasterReader(object, metaclass=ABCMeta):
     def nodata(self) -> Optional[Union[int, float]]:
         ...  # pragma: no cover
 
+    @property
+    def overviews(self) -> Sequence[int]:
+        """ Decimation factors of overview levels available for this band, empty if unknown.
+        """
+        return ()
+
+    @property
+    def block_shape(self) -> Optional[RasterShape]:
+        """ Shape of internal blocks (tiles) the band is stored in, ``None`` if unknown.
+        """
+        return None
+
     @abstractmethod
     def read(self,
              window: Optional[RasterWindow] = None,
-             out_shape: Optional[RasterShape] = None) -> FutureNdarray:
+             out_shape: Optional[RasterShape] = None,
+             out: Optional[np.ndarray] = None) -> FutureNdarray:
+        """ Read pixels, optionally with decimation.
+
+        When ``out`` is supplied pixels are read into it and the future
+        resolves to ``out``, it has to be of ``out_shape`` (or window shape)
+        and of band's dtype, and should not be accessed until read completes.
+        """
         ...  # pragma: no cover
 
 
@@ -4,7 +4,7 @@ from abc import ABCMeta, abstractmethod
 from contextlib import contextmanager
 import numpy as np
 from affine import Affine
-from typing import Tuple, Iterator, Optional, Union
+from typing import Tuple, Iterator, Optional, Union, Sequence
 
 
 RasterShape = Tuple[int, int]                 # pylint: disable=invalid-name
@@ -44,10 +44,28 @@ class GeoRasterReader(object, metaclass=ABCMeta):
     def nodata(self) -> Optional[Union[int, float]]:
         ...  # pragma: no cover
 
+    @property
+    def overviews(self) -> Sequence[int]:
+        """ Decimation factors of overview levels available for this band, empty if unknown.
+        """
+        return ()
+
+    @property
+    def block_shape(self) -> Optional[RasterShape]:
+        """ Shape of internal blocks (tiles) the band is stored in, ``None`` if unknown.
+        """
+        return None
+
     @abstractmethod
     def read(self,
              window: Optional[RasterWindow] = None,
-             out_shape: Optional[RasterShape] = None) -> Optional[np.ndarray]:
+             out_shape: Optional[RasterShape] = None,
+             out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """ Read pixels, optionally with decimation.
+
+        When ``out`` is supplied pixels are read into it and it is returned,
+        it has to be of ``out_shape`` (or window shape) and of band's dtype.
+        """
         ...  # pragma: no cover
 
 
@@ -1,10 +1,11 @@
-from ._write import write_dataset_to_netcdf, create_netcdf_storage_unit
+from ._write import write_dataset_to_netcdf, create_netcdf_storage_unit, NetCDFChunkWriter
 from . import writer as netcdf_writer
 from .writer import Variable
 
 __all__ = (
     'create_netcdf_storage_unit',
     'write_dataset_to_netcdf',
+    'NetCDFChunkWriter',
     'netcdf_writer',
     'Variable',
 )
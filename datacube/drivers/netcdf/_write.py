@@ -1,6 +1,9 @@
 from pathlib import Path
+from typing import Dict, Hashable, Set, Tuple
 import logging
 
+import numpy
+
 from . import writer as netcdf_writer
 from datacube.utils import DatacubeException
 from datacube.storage._hdf5 import HDF5_LOCK
@@ -123,3 +126,102 @@ def write_dataset_to_netcdf(dataset, filename, global_attributes=None, variable_
         nco.close()
     finally:
         HDF5_LOCK.release()
+
+
+class NetCDFChunkWriter(object):
+    """
+    Write a NetCDF file one chunk at a time, so that data larger than memory can be stored.
+
+    Keys of chunks written so far are recorded in a ``<filename>.progress`` file next to the output,
+    which is removed once all chunks were written. With ``resume=True`` an existing output that has
+    a progress file is opened for writing the remaining chunks, see :attr:`done`, and an existing
+    output without one is treated as complete. :attr:`created` tells whether a new file was created.
+
+    Arguments are as for :func:`create_netcdf_storage_unit`, ``variable_params`` should set
+    ``chunksizes`` to match the chunks being written.
+    """
+
+    def __init__(self, filename, crs, coordinates, variables, variable_params=None,
+                 global_attributes=None, netcdfparams=None, resume=False):
+        filename = Path(filename)
+        self._progress_path = filename.with_name(filename.name + '.progress')
+        self._progress = None
+        self.nco = None
+        self.done = set()  # type: Set[Tuple[int, ...]]
+        self.created = False
+
+        if resume and filename.exists():
+            if not self._progress_path.exists():
+                _LOG.info('Storage unit is already complete: %s', filename)
+                self.complete = True
+                return
+
+            with self._progress_path.open('rt') as f:
+                self.done = set(tuple(int(i) for i in line.split()) for line in f if line.strip())
+
+            with HDF5_LOCK:
+                self.nco = netcdf_writer.append_netcdf(str(filename))
+            _check_compatible(self.nco, filename, coordinates, variables)
+        else:
+            # progress file is created first, so that output without one is always complete
+            self._progress_path.parent.mkdir(parents=True, exist_ok=True)
+            self._progress_path.write_text('')
+            try:
+                with HDF5_LOCK:
+                    self.nco = create_netcdf_storage_unit(filename, crs, coordinates, variables,
+                                                          variable_params or {}, global_attributes,
+                                                          netcdfparams)
+            except Exception:
+                # don't leave a progress file next to an output we didn't create
+                self._progress_path.unlink()
+                raise
+            self.created = True
+
+        self.nco.set_auto_maskandscale(False)
+        self._progress = self._progress_path.open('at')
+        self.complete = False
+
+    def write(self, key: Tuple[int, ...], roi: Tuple[slice, ...], data: Dict[Hashable, numpy.ndarray]):
+        """
+        Write one chunk of every variable and record it as done.
+
+        :param key: Chunk index, as recorded in :attr:`done`
+        :param roi: Region of the variables covered by the chunk
+        :param data: Pixels for every variable, of the shape of the ``roi``
+        """
+        if data:
+            with HDF5_LOCK:
+                for name, pix in data.items():
+                    self.nco[name][roi] = netcdf_writer.netcdfy_data(pix)
+                self.nco.sync()
+
+        self._progress.write(' '.join(str(i) for i in key) + '\n')
+        self._progress.flush()
+        self.done.add(tuple(key))
+
+    def close(self, complete: bool = True):
+        """
+        Close the output, once ``complete`` progress file is removed.
+        """
+        if self._progress is not None:
+            self._progress.close()
+            self._progress = None
+
+        if self.nco is not None:
+            with HDF5_LOCK:
+                self.nco.close()
+            self.nco = None
+
+        if complete and not self.complete:
+            self._progress_path.unlink()
+            self.complete = True
+
+
+def _check_compatible(nco, filename, coordinates, variables):
+    for name, coord in coordinates.items():
+        if coord.values.ndim > 0 and (name not in nco.dimensions or len(nco.dimensions[name]) != coord.values.size):
+            raise ValueError('Can not resume writing {}, dimension {} does not match'.format(filename, name))
+
+    for name in variables:
+        if name not in nco.variables:
+            raise ValueError('Can not resume writing {}, variable {} is missing'.format(filename, name))
@@ -14,7 +14,8 @@ import logging
 import uuid  # noqa: F401
 from sqlalchemy import cast
 from sqlalchemy import delete
-from sqlalchemy import select, text, bindparam, and_, or_, func, literal, distinct
+from sqlalchemy import select, text, bindparam, and_, or_, func, literal, literal_column, distinct, union_all
+from sqlalchemy import column
 from sqlalchemy.dialects.postgresql import INTERVAL
 from sqlalchemy.dialects.postgresql import JSONB, insert
 from sqlalchemy.exc import IntegrityError
@@ -28,7 +29,7 @@ from . import _dynamic as dynamic
 from ._fields import parse_fields, Expression, PgField, PgExpression  # noqa: F401
 from ._fields import NativeField, DateDocField, SimpleDocField
 from ._schema import DATASET, DATASET_SOURCE, METADATA_TYPE, DATASET_LOCATION, PRODUCT
-from .sql import escape_pg_identifier
+from .sql import escape_pg_identifier, PGPOLYGON
 
 
 def _dataset_uri_field(table):
@@ -39,7 +40,13 @@ def _dataset_uri_field(table):
 # Need to alias the table, as queries may join the location table for filtering.
 SELECTED_DATASET_LOCATION = DATASET_LOCATION.alias('selected_dataset_location')
 _DATASET_SELECT_FIELDS = (
-    DATASET,
+    DATASET.c.id,
+    DATASET.c.metadata_type_ref,
+    DATASET.c.dataset_type_ref,
+    DATASET.c.metadata,
+    DATASET.c.archived,
+    DATASET.c.added,
+    DATASET.c.added_by,
     # All active URIs, from newest to oldest
     func.array(
         select([
@@ -56,12 +63,47 @@ _DATASET_SELECT_FIELDS = (
     ).label('uris')
 )
 
+
+def _partial_dataset_select_fields(metadata_keys):
+    """
+    Like ``_DATASET_SELECT_FIELDS``, but only the given top-level sections of the metadata document are selected.
+    """
+    metadata_sections = select([
+        func.jsonb_object_agg(column('key'), column('value'), type_=JSONB)
+    ]).select_from(
+        func.jsonb_each(DATASET.c.metadata)
+    ).where(
+        column('key').in_(sorted(metadata_keys))
+    ).as_scalar()
+
+    return tuple(
+        func.coalesce(metadata_sections, literal_column("'{}'::jsonb")).label('metadata')
+        if c is DATASET.c.metadata else c
+        for c in _DATASET_SELECT_FIELDS
+    )
+
+
 PGCODE_UNIQUE_CONSTRAINT = '23505'
 PGCODE_FOREIGN_KEY_VIOLATION = '23503'
 
+# Postgres accepts at most this many bind parameters in a single statement
+MAX_STATEMENT_PARAMS = 65535
+
 _LOG = logging.getLogger(__name__)
 
 
+def _param_chunks(values):
+    """
+    Split rows of a multi-row statement, given as dictionaries of column values, into
+    chunks small enough to stay within ``MAX_STATEMENT_PARAMS``.
+    """
+    if not values:
+        return
+    rows_per_chunk = max(1, MAX_STATEMENT_PARAMS // len(values[0]))
+    for i in range(0, len(values), rows_per_chunk):
+        yield values[i:i + rows_per_chunk]
+
+
 def _split_uri(uri):
     """
     Split the scheme and the remainder of the URI.
@@ -172,8 +214,13 @@ def get_dataset_fields(metadata_type_definition):
 
 
 class PostgresDbAPI(object):
-    def __init__(self, connection):
+    def __init__(self, connection, has_footprint=False):
+        """
+        :param bool has_footprint: The dataset table has the optional footprint column,
+                                   see :meth:`PostgresDb.has_footprint`
+        """
         self._connection = connection
+        self._has_footprint = has_footprint
 
     @property
     def in_transaction(self):
@@ -185,44 +232,101 @@ class PostgresDbAPI(object):
     def execute(self, command):
         return self._connection.execute(command)
 
-    def insert_dataset(self, metadata_doc, dataset_id, product_id):
+    def insert_dataset(self, metadata_doc, dataset_id, product_id, footprint=None):
         """
         Insert dataset if not already indexed.
         :type metadata_doc: dict
         :type dataset_id: str or uuid.UUID
         :type product_id: int
+        :param footprint: lon/lat polygon points for the footprint column, or None if unknown.
+                          Ignored when the database has no footprint column.
         :return: whether it was inserted
         :rtype: bool
         """
         dataset_type_ref = bindparam('dataset_type_ref')
+        columns = ['id', 'dataset_type_ref', 'metadata_type_ref', 'metadata']
+        values = [
+            bindparam('id'), dataset_type_ref,
+            select([
+                PRODUCT.c.metadata_type_ref
+            ]).where(
+                PRODUCT.c.id == dataset_type_ref
+            ).label('metadata_type_ref'),
+            bindparam('metadata', type_=JSONB)
+        ]
+        params = dict(
+            id=dataset_id,
+            dataset_type_ref=product_id,
+            metadata=metadata_doc,
+        )
+        if self._has_footprint:
+            columns.append('footprint')
+            values.append(cast(bindparam('footprint', type_=PGPOLYGON), PGPOLYGON))
+            params['footprint'] = footprint
+
         ret = self._connection.execute(
             insert(DATASET).from_select(
-                ['id', 'dataset_type_ref', 'metadata_type_ref', 'metadata'],
-                select([
-                    bindparam('id'), dataset_type_ref,
-                    select([
-                        PRODUCT.c.metadata_type_ref
-                    ]).where(
-                        PRODUCT.c.id == dataset_type_ref
-                    ).label('metadata_type_ref'),
-                    bindparam('metadata', type_=JSONB)
-                ])
+                columns,
+                select(values)
             ).on_conflict_do_nothing(
                 index_elements=['id']
             ),
-            id=dataset_id,
-            dataset_type_ref=product_id,
-            metadata=metadata_doc
+            **params
         )
         return ret.rowcount > 0
 
-    def update_dataset(self, metadata_doc, dataset_id, product_id):
+    def insert_datasets(self, rows):
+        """
+        Insert many datasets with multi-row statements, skipping those already indexed.
+
+        Rows are split into as few statements as the limit on bind parameters allows.
+
+        :param rows: iterable of ``(metadata_doc, dataset_id, product_id, footprint)``, see :meth:`insert_dataset`
+        :return: ids of the datasets that were inserted
+        :rtype: set[uuid.UUID]
+        """
+        values = []
+        for metadata_doc, dataset_id, product_id, footprint in rows:
+            value = dict(
+                id=dataset_id,
+                dataset_type_ref=product_id,
+                metadata_type_ref=select([
+                    PRODUCT.c.metadata_type_ref
+                ]).where(
+                    PRODUCT.c.id == product_id
+                ).as_scalar(),
+                metadata=metadata_doc
+            )
+            if self._has_footprint:
+                value['footprint'] = footprint
+            values.append(value)
+        inserted = set()
+        for chunk in _param_chunks(values):
+            ret = self._connection.execute(
+                insert(DATASET).values(
+                    chunk
+                ).on_conflict_do_nothing(
+                    index_elements=['id']
+                ).returning(
+                    DATASET.c.id
+                )
+            )
+            inserted.update(r[0] for r in ret)
+        return inserted
+
+    def update_dataset(self, metadata_doc, dataset_id, product_id, footprint=None):
         """
         Update dataset
         :type metadata_doc: dict
         :type dataset_id: str or uuid.UUID
         :type product_id: int
+        :param footprint: lon/lat polygon points for the footprint column, or None if unknown.
+                          Ignored when the database has no footprint column.
         """
+        values = dict(metadata=metadata_doc)
+        if self._has_footprint:
+            values['footprint'] = footprint
+
         res = self._connection.execute(
             DATASET.update().returning(DATASET.c.id).where(
                 and_(
@@ -230,7 +334,7 @@ class PostgresDbAPI(object):
                     DATASET.c.dataset_type_ref == product_id
                 )
             ).values(
-                metadata=metadata_doc
+                **values
             )
         )
         return res.rowcount > 0
@@ -259,6 +363,32 @@ class PostgresDbAPI(object):
 
         return r.rowcount > 0
 
+    def insert_dataset_locations(self, locations):
+        """
+        Add many locations with multi-row statements, skipping those already recorded.
+
+        Locations of the same dataset should be supplied from the oldest to the newest.
+
+        :param locations: iterable of ``(dataset_id, uri)``
+        :return: number of locations added
+        :rtype: int
+        """
+        values = []
+        for dataset_id, uri in locations:
+            scheme, body = _split_uri(uri)
+            values.append(dict(dataset_ref=dataset_id, uri_scheme=scheme, uri_body=body))
+        added = 0
+        for chunk in _param_chunks(values):
+            r = self._connection.execute(
+                insert(DATASET_LOCATION).values(
+                    chunk
+                ).on_conflict_do_nothing(
+                    index_elements=['uri_scheme', 'uri_body', 'dataset_ref']
+                )
+            )
+            added += r.rowcount
+        return added
+
     def contains_dataset(self, dataset_id):
         return bool(
             self._connection.execute(
@@ -319,6 +449,33 @@ class PostgresDbAPI(object):
                 raise MissingRecordError("Referenced source dataset doesn't exist")
             raise
 
+    def insert_dataset_sources(self, edges):
+        """
+        Insert many lineage edges with multi-row statements, skipping those already recorded.
+
+        :param edges: iterable of ``(classifier, dataset_id, source_dataset_id)``
+        :return: number of edges added
+        :rtype: int
+        """
+        values = [dict(classifier=classifier, dataset_ref=dataset_id, source_dataset_ref=source_dataset_id)
+                  for classifier, dataset_id, source_dataset_id in edges]
+        added = 0
+        try:
+            for chunk in _param_chunks(values):
+                r = self._connection.execute(
+                    insert(DATASET_SOURCE).values(
+                        chunk
+                    ).on_conflict_do_nothing(
+                        index_elements=['classifier', 'dataset_ref']
+                    )
+                )
+                added += r.rowcount
+            return added
+        except IntegrityError as e:
+            if e.orig.pgcode == PGCODE_FOREIGN_KEY_VIOLATION:
+                raise MissingRecordError("Referenced source dataset doesn't exist")
+            raise
+
     def archive_dataset(self, dataset_id):
         self._connection.execute(
             DATASET.update().where(
@@ -356,6 +513,14 @@ class PostgresDbAPI(object):
             select(_DATASET_SELECT_FIELDS).where(DATASET.c.id.in_(dataset_ids))
         ).fetchall()
 
+    def get_datasets_metadata(self, dataset_ids):
+        """
+        :return: ``(id, metadata)`` of each of the datasets
+        """
+        return self._connection.execute(
+            select([DATASET.c.id, DATASET.c.metadata]).where(DATASET.c.id.in_(dataset_ids))
+        ).fetchall()
+
     def get_derived_datasets(self, dataset_id):
         return self._connection.execute(
             select(
@@ -431,13 +596,16 @@ class PostgresDbAPI(object):
 
     @staticmethod
     def search_datasets_query(expressions, source_exprs=None,
-                              select_fields=None, with_source_ids=False, limit=None):
+                              select_fields=None, with_source_ids=False, limit=None,
+                              metadata_keys=None):
         """
         :type expressions: Tuple[Expression]
         :type source_exprs: Tuple[Expression]
         :type select_fields: Iterable[PgField]
         :type with_source_ids: bool
         :type limit: int
+        :param metadata_keys: when selecting whole datasets, only select these top-level sections
+                              of their metadata documents
         :rtype: sqlalchemy.Expression
         """
 
@@ -446,6 +614,8 @@ class PostgresDbAPI(object):
                 f.alchemy_expression.label(f.name)
                 for f in select_fields
             )
+        elif metadata_keys is not None:
+            select_columns = _partial_dataset_select_fields(metadata_keys)
         else:
             select_columns = _DATASET_SELECT_FIELDS
 
@@ -534,6 +704,28 @@ class PostgresDbAPI(object):
                                                   select_fields, with_source_ids, limit)
         return self._connection.execute(select_query)
 
+    def search_datasets_union(self, queries, with_source_ids=False, limit=None, metadata_keys=None):
+        """
+        Run several searches, typically one per product, as a single UNION ALL statement.
+
+        The limit applies to each search separately.
+
+        :param queries: sequence of ``(expressions, select_fields)``. All searches must select
+                        the same columns.
+        :type queries: Sequence[Tuple[tuple[PgExpression], tuple[PgField]]]
+        :type with_source_ids: bool
+        :param metadata_keys: see :meth:`search_datasets_query`
+        """
+        select_queries = [self.search_datasets_query(expressions,
+                                                     select_fields=select_fields,
+                                                     with_source_ids=with_source_ids,
+                                                     limit=limit,
+                                                     metadata_keys=metadata_keys)
+                          for expressions, select_fields in queries]
+        if len(select_queries) == 1:
+            return self._connection.execute(select_queries[0])
+        return self._connection.execute(union_all(*select_queries))
+
     @staticmethod
     def search_unique_datasets_query(expressions, select_fields, limit):
         """
@@ -650,6 +842,31 @@ class PostgresDbAPI(object):
 
         return self._connection.scalar(select_query)
 
+    def count_datasets_by_product(self, queries):
+        """
+        Count datasets matching several sets of expressions, typically one per product, in a single statement.
+
+        :param queries: sequence of expressions to count
+        :type queries: Sequence[tuple[datacube.drivers.postgres._fields.PgExpression]]
+        :return: ``(product_id, count)`` of each product with matching datasets
+        :rtype: list[(int, int)]
+        """
+        count_queries = [
+            select(
+                [DATASET.c.dataset_type_ref, func.count('*')]
+            ).select_from(
+                self._from_expression(DATASET, expressions)
+            ).where(
+                and_(DATASET.c.archived == None, *self._alchemify_expressions(expressions))
+            ).group_by(
+                DATASET.c.dataset_type_ref
+            )
+            for expressions in queries
+        ]
+        if not count_queries:
+            return []
+        return list(self._connection.execute(union_all(*count_queries)))
+
     def count_datasets_through_time(self, start, end, period, time_field, expressions):
         """
         :type period: str
@@ -667,6 +884,38 @@ class PostgresDbAPI(object):
             # if not time_period.upper_inf:
             yield Range(time_period.lower, time_period.upper), dataset_count
 
+    def count_datasets_through_time_by_product(self, start, end, period, queries):
+        """
+        :func:`count_datasets_through_time` of several products, in a single statement.
+
+        :type period: str
+        :type start: datetime.datetime
+        :type end: datetime.datetime
+        :param queries: sequence of ``(product_id, time_field, expressions)``
+        :return: for each product id, the time ranges in order and their count
+        :rtype: dict[int, list[(Range, int)]]
+        """
+        counts = {product_id: [] for product_id, _, _ in queries}
+        if not counts:
+            return counts
+
+        count_queries = [
+            self.count_datasets_through_time_query(
+                start, end, period, time_field, expressions
+            ).column(
+                literal(product_id).label('product_ref')
+            )
+            for product_id, time_field, expressions in queries
+        ]
+        all_counts = union_all(*count_queries).alias('all_counts')
+
+        results = self._connection.execute(
+            select((all_counts,)).order_by(all_counts.c.product_ref, all_counts.c.time_period)
+        )
+        for time_period, dataset_count, product_id in results:
+            counts[product_id].append((Range(time_period.lower, time_period.upper), dataset_count))
+        return counts
+
     def count_datasets_through_time_query(self, start, end, period, time_field, expressions):
         raw_expressions = self._alchemify_expressions(expressions)
 
@@ -58,6 +58,7 @@ class PostgresDb(object):
         # We don't recommend using this constructor directly as it may change.
         # Use static methods PostgresDb.create() or PostgresDb.from_config()
         self._engine = engine
+        self._has_footprint = None
 
     @classmethod
     def from_config(cls, config, application_name=None, validate_connection=True):
@@ -122,6 +123,17 @@ class PostgresDb(object):
     def url(self) -> str:
         return self._engine.url
 
+    @property
+    def has_footprint(self) -> bool:
+        """
+        Whether datasets have the optional footprint column for spatial searches.
+
+        Checked once, ``datacube system init`` adds it to older databases.
+        """
+        if self._has_footprint is None:
+            self._has_footprint = _core.has_dataset_footprint(self._engine)
+        return self._has_footprint
+
     @staticmethod
     def get_db_username(config):
         try:
@@ -180,11 +192,12 @@ class PostgresDb(object):
         is_new = _core.ensure_db(self._engine, with_permissions=with_permissions)
         if not is_new:
             _core.update_schema(self._engine)
+        self._has_footprint = None
 
         return is_new
 
     @contextmanager
-    def connect(self):
+    def connect(self, fetch_size=None):
         """
         Borrow a connection from the pool.
 
@@ -197,9 +210,22 @@ class PostgresDb(object):
         The connection can raise errors if not following this advice ("server closed the connection unexpectedly"),
         as some servers will aggressively close idle connections (eg. DEA's NCI servers). It also prevents the
         connection from being reused while borrowed.
+
+        :param int fetch_size: When supplied, query results are streamed from a server-side cursor, at most
+                               ``fetch_size`` rows at a time, instead of being fetched in full when the query is
+                               executed. Queries then run in a transaction that lasts until the connection is returned,
+                               so this is only suitable for reading.
         """
+        has_footprint = self.has_footprint
         with self._engine.connect() as connection:
-            yield _api.PostgresDbAPI(connection)
+            api_connection = connection
+            if fetch_size is not None:
+                # server-side (named) cursors need a transaction, isolation level is reset when
+                # the connection goes back to the pool
+                api_connection = connection.execution_options(isolation_level='READ COMMITTED',
+                                                              stream_results=True,
+                                                              max_row_buffer=fetch_size)
+            yield _api.PostgresDbAPI(api_connection, has_footprint=has_footprint)
             connection.close()
 
     @contextmanager
@@ -218,10 +244,11 @@ class PostgresDb(object):
 
         :rtype: PostgresDBAPI
         """
+        has_footprint = self.has_footprint
         with self._engine.connect() as connection:
             connection.execute(text('BEGIN'))
             try:
-                yield _api.PostgresDbAPI(connection)
+                yield _api.PostgresDbAPI(connection, has_footprint=has_footprint)
                 connection.execute(text('COMMIT'))
             except Exception:  # pylint: disable=broad-except
                 connection.execute(text('ROLLBACK'))
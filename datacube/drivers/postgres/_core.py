@@ -5,7 +5,7 @@ Core SQL schema settings.
 
 import logging
 
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, select, and_, func
 from sqlalchemy.engine import Engine
 from sqlalchemy.schema import CreateSchema
 
@@ -142,6 +142,47 @@ def schema_is_latest(engine: Engine) -> bool:
     return True
 
 
+def has_dataset_footprint(engine) -> bool:
+    """
+    Does the dataset table have the (optional) footprint column used for spatial searches?
+
+    It is created with new databases and added to older ones by ``update_schema()``.
+    """
+    return pg_column_exists(engine, schema_qualified('dataset'), 'footprint')
+
+
+def _backfill_dataset_footprints(connection):
+    """
+    Record footprints of already indexed datasets from the bounds of their lat/lon search fields.
+    """
+    # Avoid a circular import
+    from ._api import get_dataset_fields
+    from ._fields import RangeDocField
+    from ._schema import DATASET, METADATA_TYPE
+
+    for metadata_type_id, definition in connection.execute(select([METADATA_TYPE.c.id, METADATA_TYPE.c.definition])):
+        fields = get_dataset_fields(definition)
+        lat, lon = fields.get('lat'), fields.get('lon')
+        if not isinstance(lat, RangeDocField) or not isinstance(lon, RangeDocField):
+            continue
+
+        west, east = lon.lower.alchemy_expression, lon.greater.alchemy_expression
+        south, north = lat.lower.alchemy_expression, lat.greater.alchemy_expression
+        res = connection.execute(
+            DATASET.update().where(
+                and_(
+                    DATASET.c.metadata_type_ref == metadata_type_id,
+                    DATASET.c.footprint.is_(None),
+                    # Skips datasets without lon bounds, and those that may cross the antimeridian
+                    east - west <= 180,
+                )
+            ).values(
+                footprint=func.polygon(func.box(func.point(west, south), func.point(east, north)))
+            )
+        )
+        _LOG.info("Recorded footprints of %d datasets of metadata type %s", res.rowcount, definition['name'])
+
+
 def update_schema(engine: Engine):
     """
     Check and apply any missing schema changes to the database.
@@ -154,10 +195,21 @@ def update_schema(engine: Engine):
     # This will typically check if something exists (like a newly added column), and
     # run the SQL of the change inside a single transaction.
 
-    # Empty, as no schema changes have been made recently.
-    # -> If you need to write one, look at the Git history of this
-    #    function for some examples.
-    
+    # Dataset footprints for spatial search, existing datasets get theirs from their lat/lon bounds
+    if not has_dataset_footprint(engine):
+        _LOG.info("Adding dataset footprint column")
+        c = engine.connect()
+        c.execute('begin')
+        c.execute("""
+        alter table {schema}.dataset add column footprint polygon;
+        """.format(schema=SCHEMA_NAME))
+        _backfill_dataset_footprints(c)
+        c.execute("""
+        create index ix_agdc_dataset_footprint on {schema}.dataset using gist (footprint);
+        """.format(schema=SCHEMA_NAME))
+        c.execute('commit')
+        c.close()
+
     # Post 1.8 DB Federation triggers
     from datacube.drivers.postgres._triggers import install_timestamp_trigger
     _LOG.info("Adding Update Triggers")
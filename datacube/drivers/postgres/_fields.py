@@ -9,7 +9,7 @@ from decimal import Decimal
 
 from dateutil import tz
 from psycopg2.extras import NumericRange, DateTimeTZRange
-from sqlalchemy import cast, func, and_
+from sqlalchemy import cast, func, and_, or_
 from sqlalchemy.dialects import postgresql as postgres
 from sqlalchemy.dialects.postgresql import INT4RANGE
 from sqlalchemy.dialects.postgresql import NUMRANGE, TSTZRANGE
@@ -19,7 +19,7 @@ from datacube import utils
 from datacube.model.fields import Expression, Field
 from datacube.model import Range
 from datacube.utils import get_doc_offset_safe
-from .sql import FLOAT8RANGE
+from .sql import FLOAT8RANGE, PGPOLYGON
 
 from typing import Any, Callable, Tuple, Union
 
@@ -516,6 +516,25 @@ class EqualsExpression(PgExpression):
         return self.field.evaluate(ctx) == self.value
 
 
+class PolygonOverlapsExpression(PgExpression):
+    """
+    Polygon column overlaps any of the given polygons (sequences of (x, y) points).
+
+    Rows where the column is null are matched too, so the expression can be used
+    where only some rows have the polygon recorded.
+    """
+
+    def __init__(self, field, polygons):
+        super(PolygonOverlapsExpression, self).__init__(field)
+        self.polygons = polygons
+
+    @property
+    def alchemy_expression(self):
+        column = self.field.alchemy_column
+        return or_(column.is_(None),
+                   *(column.op('&&')(cast(polygon, PGPOLYGON)) for polygon in self.polygons))
+
+
 def parse_fields(doc, table_column):
     """
     Parse a field spec document into objects.
@@ -6,7 +6,7 @@ Tables for indexing the datasets which were ingested into the AGDC.
 import logging
 
 from sqlalchemy import ForeignKey, UniqueConstraint, PrimaryKeyConstraint, CheckConstraint, SmallInteger
-from sqlalchemy import Table, Column, Integer, String, DateTime
+from sqlalchemy import Table, Column, Index, Integer, String, DateTime
 from sqlalchemy.dialects import postgresql as postgres
 from sqlalchemy.sql import func
 
@@ -70,6 +70,10 @@ DATASET = Table(
     # When it was added and by whom.
     Column('added', DateTime(timezone=True), server_default=func.now(), nullable=False),
     Column('added_by', sql.PGNAME, server_default=func.current_user(), nullable=False),
+
+    # Footprint of the dataset in lon/lat, for spatial searches. Null when unknown.
+    Column('footprint', sql.PGPOLYGON, nullable=True),
+    Index('ix_agdc_dataset_footprint', 'footprint', postgresql_using='gist'),
 )
 
 DATASET_LOCATION = Table(
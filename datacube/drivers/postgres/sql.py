@@ -50,6 +50,24 @@ def visit_float8range(element, compiler, **kw):
     return "FLOAT8RANGE"
 
 
+# pylint: disable=abstract-method
+class PGPOLYGON(sqltypes.TypeEngine):
+    """Postgres native 'POLYGON' type, bound from a sequence of (x, y) points."""
+    __visit_name__ = 'POLYGON'
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if value is None:
+                return None
+            return '(' + ','.join('({!r},{!r})'.format(float(x), float(y)) for x, y in value) + ')'
+        return process
+
+
+@compiles(PGPOLYGON)
+def visit_polygon(element, compiler, **kw):
+    return "POLYGON"
+
+
 # Register the function with SQLAlchemhy.
 # pylint: disable=too-many-ancestors
 class CommonTimestamp(GenericFunction):
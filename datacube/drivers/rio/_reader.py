@@ -2,21 +2,23 @@
 """
 from typing import (
     List, Optional, Union, Any, Iterable,
-    Tuple, NamedTuple, TypeVar
+    Tuple, NamedTuple, TypeVar, Sequence
 )
 import numpy as np
 from affine import Affine
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, Future
 import rasterio
 from rasterio.io import DatasetReader
 import rasterio.crs
 
 from datacube.storage import BandInfo
+from datacube.storage._lazy import has_indexed_grid
 from datacube.utils.geometry import CRS
 from datacube.utils import (
     uri_to_local_path,
     get_part_from_uri,
 )
+from datacube.utils.rio import RioFileHandle, RioFileCache
 from datacube.drivers._types import (
     ReaderDriverEntry,
     ReaderDriver,
@@ -79,13 +81,19 @@ def _dc_crs(crs: Optional[rasterio.crs.CRS]) -> Optional[CRS]:
     return CRS(crs.wkt)
 
 
-def _read(src: DatasetReader,
+def _read(handle: RioFileHandle,
           bidx: int,
           window: Optional[RasterWindow],
-          out_shape: Optional[RasterShape]) -> np.ndarray:
-    return src.read(bidx,
-                    window=_roi_to_window(window, src.shape),
-                    out_shape=out_shape)
+          out_shape: Optional[RasterShape],
+          out: Optional[np.ndarray] = None) -> np.ndarray:
+    with handle.use() as src:
+        window = _roi_to_window(window, src.shape)
+        if out is not None:
+            return src.read(bidx, window=window, out=out)
+
+        return src.read(bidx,
+                        window=window,
+                        out_shape=out_shape)
 
 
 def _rio_uri(band: BandInfo) -> str:
@@ -124,21 +132,26 @@ def _rio_band_idx(band: BandInfo, src: DatasetReader) -> int:
 
 class RIOReader(GeoRasterReader):
     def __init__(self,
-                 src: DatasetReader,
+                 handle: RioFileHandle,
                  band_idx: int,
                  pool: ThreadPoolExecutor,
                  overrides: Overrides = Overrides(None, None, None)):
 
-        transform = pick(overrides.transform, src.transform)
-        if transform is not None and transform.is_identity:
-            transform = None
+        with handle.use() as src:
+            transform = pick(overrides.transform, src.transform)
+            if transform is not None and transform.is_identity:
+                transform = None
+
+            self._crs = overrides.crs or _dc_crs(src.crs)
+            self._nodata = pick(overrides.nodata, src.nodatavals[band_idx-1])
+            self._dtype = src.dtypes[band_idx-1]
+            self._shape = src.shape
+            self._overviews = tuple(src.overviews(band_idx))
+            self._block_shape = tuple(src.block_shapes[band_idx-1])
 
-        self._src = src
-        self._crs = overrides.crs or _dc_crs(src.crs)
+        self._handle = handle
         self._transform = transform
-        self._nodata = pick(overrides.nodata, src.nodatavals[band_idx-1])
         self._band_idx = band_idx
-        self._dtype = src.dtypes[band_idx-1]
         self._pool = pool
 
     @property
@@ -155,16 +168,25 @@ class RIOReader(GeoRasterReader):
 
     @property
     def shape(self) -> RasterShape:
-        return self._src.shape
+        return self._shape
 
     @property
     def nodata(self) -> Optional[Union[int, float]]:
         return self._nodata
 
+    @property
+    def overviews(self) -> Sequence[int]:
+        return self._overviews
+
+    @property
+    def block_shape(self) -> Optional[RasterShape]:
+        return self._block_shape
+
     def read(self,
              window: Optional[RasterWindow] = None,
-             out_shape: Optional[RasterShape] = None) -> FutureNdarray:
-        return self._pool.submit(_read, self._src, self._band_idx, window, out_shape)
+             out_shape: Optional[RasterShape] = None,
+             out: Optional[np.ndarray] = None) -> FutureNdarray:
+        return self._pool.submit(_read, self._handle, self._band_idx, window, out_shape, out)
 
 
 def _compute_overrides(src: DatasetReader, bi: BandInfo) -> Overrides:
@@ -184,21 +206,95 @@ def _compute_overrides(src: DatasetReader, bi: BandInfo) -> Overrides:
     return Overrides(crs=crs, transform=transform, nodata=nodata)
 
 
+def _rdr_handle(band: BandInfo, ctx: Any) -> RioFileHandle:
+    """ If ``ctx`` is a :class:`RioFileCache` file handle is looked up there
+        first, otherwise a new one is created. Handle is not opened.
+    """
+    normalised_uri = _rio_uri(band)
+    if isinstance(ctx, RioFileCache):
+        return ctx.get(normalised_uri)
+    return RioFileHandle(normalised_uri)
+
+
 def _rdr_open(band: BandInfo, ctx: Any, pool: ThreadPoolExecutor) -> RIOReader:
     """ Open file pointed by BandInfo and return RIOReader instance.
 
+        If ``ctx`` is a :class:`RioFileCache` file handle is looked up there
+        first, and only opened if not already cached.
+
         raises Exception on failure
+    """
+    handle = _rdr_handle(band, ctx)
 
-        TODO: start using ctx for handle cache
+    with handle.use() as src:
+        bidx = _rio_band_idx(band, src)
+        return RIOReader(handle, bidx, pool, _compute_overrides(src, band))
+
+
+def _indexed_read(band: BandInfo,
+                  ctx: Any,
+                  window: Optional[RasterWindow],
+                  out_shape: Optional[RasterShape],
+                  out: Optional[np.ndarray] = None) -> np.ndarray:
+    handle = _rdr_handle(band, ctx)
+    with handle.use() as src:
+        bidx = _rio_band_idx(band, src)
+    return _read(handle, bidx, window, out_shape, out)
+
+
+class IndexedRIOReader(GeoRasterReader):
+    """ Reader that takes raster metadata from the index, file is only opened once pixels are read.
+
+        Nodata and data type recorded in the product definition are assumed to
+        match the file, overviews are not used.
     """
-    normalised_uri = _rio_uri(band)
-    src = rasterio.open(normalised_uri, 'r')
-    bidx = _rio_band_idx(band, src)
 
-    return RIOReader(src, bidx, pool, _compute_overrides(src, band))
+    def __init__(self,
+                 band: BandInfo,
+                 ctx: Any,
+                 pool: ThreadPoolExecutor):
+        self._band = band
+        self._ctx = ctx
+        self._pool = pool
+
+    @property
+    def crs(self) -> Optional[CRS]:
+        return self._band.crs
+
+    @property
+    def transform(self) -> Optional[Affine]:
+        return self._band.grid_transform
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self._band.dtype)
+
+    @property
+    def shape(self) -> RasterShape:
+        return self._band.grid_shape
+
+    @property
+    def nodata(self) -> Optional[Union[int, float]]:
+        return self._band.nodata
+
+    def read(self,
+             window: Optional[RasterWindow] = None,
+             out_shape: Optional[RasterShape] = None,
+             out: Optional[np.ndarray] = None) -> FutureNdarray:
+        return self._pool.submit(_indexed_read, self._band, self._ctx, window, out_shape, out)
 
 
 class RIORdrDriver(ReaderDriver):
+    """
+    **cfg**:
+       file_cache -- :class:`RioFileCache` to use for all loads (can be shared with other readers)
+       file_cache_size -- Maximum number of open files to keep around between loads, 0 disables caching
+       file_cache_max_idle -- Close files not accessed for that many seconds
+       lazy_open -- Use raster metadata recorded in the index (EO3 ``grids``) when available,
+                    and only open files when reading pixels, sources that turn out to not
+                    overlap with the destination are never opened
+    """
+
     def __init__(self, pool: ThreadPoolExecutor, cfg: dict):
         self._pool = pool
         self._cfg = cfg
@@ -206,9 +302,29 @@ class RIORdrDriver(ReaderDriver):
     def new_load_context(self,
                          bands: Iterable[BandInfo],
                          old_ctx: Optional[Any]) -> Any:
-        return None  # TODO: implement file handle cache with this
+        """ Load context is a cache of open file handles, it is re-used across loads
+        """
+        if isinstance(old_ctx, RioFileCache):
+            old_ctx.purge()
+            return old_ctx
+
+        cache = self._cfg.get('file_cache', None)
+        if cache is not None:
+            return cache
+
+        max_size = self._cfg.get('file_cache_size', 64)
+        if max_size <= 0:
+            return None
+
+        return RioFileCache(max_size=max_size,
+                            max_idle=self._cfg.get('file_cache_max_idle', 60.0))
 
     def open(self, band: BandInfo, ctx: Any) -> FutureGeoRasterReader:
+        if self._cfg.get('lazy_open', False) and has_indexed_grid(band):
+            fut = Future()  # type: Future
+            fut.set_result(IndexedRIOReader(band, ctx, self._pool))
+            return fut
+
         return self._pool.submit(_rdr_open, band, ctx, self._pool)
 
 
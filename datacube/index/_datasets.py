@@ -2,9 +2,14 @@
 """
 API for dataset indexing, access and search.
 """
+import copy
+import itertools
 import logging
+import threading
 import warnings
-from collections import namedtuple
+import weakref
+from collections import namedtuple, OrderedDict
+from collections.abc import MutableMapping
 from typing import Any, Iterable, Set, Tuple, Union, List
 from uuid import UUID
 
@@ -13,19 +18,206 @@ from datacube.model.utils import flatten_datasets
 from datacube.utils import jsonify_document, _readable_offset, changes, cached_property
 from datacube.utils.changes import get_doc_changes
 from . import fields
+from .exceptions import MissingRecordError
 
 import json
-from datacube.drivers.postgres._fields import SimpleDocField, DateDocField
+from datacube.drivers.postgres._fields import SimpleDocField, DateDocField, NativeField, PolygonOverlapsExpression
 from datacube.drivers.postgres._schema import DATASET
 from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
 from datacube.model.fields import Field
 
 _LOG = logging.getLogger(__name__)
 
+_FOOTPRINT_FIELD = NativeField('footprint', 'Dataset footprint in lon/lat', DATASET.c.footprint)
+
 
 # It's a public api, so we can't reorganise old methods.
 # pylint: disable=too-many-public-methods, too-many-lines
 
+def _lonlat_polygons(geom):
+    """
+    Convex hulls of the parts of a geometry, as lists of lon/lat points.
+
+    These are used to pre-filter datasets in the database, so a covering approximation is fine.
+    Returns None if the geometry can't be represented that way (eg. it crosses the antimeridian).
+    """
+    try:
+        geom = geom.to_crs('EPSG:4326')
+    except Exception:  # pylint: disable=broad-except
+        _LOG.debug("Unable to convert %r to lon/lat", geom)
+        return None
+
+    parts = list(geom) if geom.type.startswith('Multi') or geom.type == 'GeometryCollection' else [geom]
+    polygons = []
+    for part in parts:
+        if part.is_empty:
+            continue
+        hull = part.convex_hull
+        if hull.type != 'Polygon':
+            return None
+        bbox = hull.boundingbox
+        if bbox.right - bbox.left > 180:
+            return None
+        polygons.append(hull.exterior.points)
+
+    return polygons or None
+
+
+def _dataset_footprint(dataset):
+    """
+    Lon/lat footprint of a dataset to record in the index, or None if it has no usable extent.
+    """
+    try:
+        extent = dataset.extent
+    except Exception:  # pylint: disable=broad-except
+        _LOG.debug("Unable to compute extent of dataset %s", dataset.id)
+        return None
+    if extent is None:
+        return None
+
+    polygons = _lonlat_polygons(extent)
+    if polygons is None or len(polygons) != 1:
+        return None
+    return polygons[0]
+
+
+def _footprint_expressions(query, has_footprint=True):
+    """
+    Remove a 'geopolygon' search term from the query, returning expressions to match it against
+    the recorded dataset footprints.
+
+    :param bool has_footprint: Whether the database records footprints, no expressions are returned if not
+    """
+    geopolygon = query.pop('geopolygon', None)
+    if geopolygon is None or not has_footprint:
+        return ()
+
+    polygons = _lonlat_polygons(geopolygon)
+    if polygons is None:
+        return ()
+    return (PolygonOverlapsExpression(_FOOTPRINT_FIELD, polygons),)
+
+
+def _partial_doc_keys(metadata_type):
+    """
+    Top-level sections of dataset documents needed to load data: id, format, measurements,
+    grid, time and lat/lon information (the latter for grouping by solar day).
+    """
+    dataset_section = metadata_type.definition['dataset']
+    offsets = [dataset_section.get(name) for name in ('id', 'format', 'measurements', 'grid_spatial')]
+
+    search_fields = dataset_section.get('search_fields', {})
+    for name in ('time', 'key_time', 'lat', 'lon'):
+        field = search_fields.get(name, {})
+        offsets.append(field.get('offset'))
+        offsets.extend(field.get('min_offset', []))
+        offsets.extend(field.get('max_offset', []))
+
+    return {offset[0] for offset in offsets if offset} | {'driver_data', 'grids'}
+
+
+class _PartialDocument(MutableMapping):
+    """
+    A dataset document of which only some top-level sections have been fetched from the index.
+
+    The whole document is fetched by the shared :class:`_DocumentFetcher` the first time anything else is needed.
+    """
+
+    def __init__(self, dataset_id, sections, keys, fetcher):
+        self.dataset_id = dataset_id
+        self._sections = sections
+        self._keys = keys
+        self._fetcher = fetcher
+        self._doc = None
+
+    @property
+    def document(self):
+        """ The whole document, fetching it if needed """
+        if self._doc is None:
+            self._fetcher.fetch(self)
+        return self._doc
+
+    def _set_document(self, doc):
+        # sections are kept, readers in other threads may have just decided to use them
+        self._doc = doc
+
+    def __getitem__(self, key):
+        doc = self._doc
+        if doc is None and key in self._keys:
+            return self._sections[key]
+        return (doc if doc is not None else self.document)[key]
+
+    def __contains__(self, key):
+        doc = self._doc
+        if doc is None and key in self._keys:
+            return key in self._sections
+        return key in (doc if doc is not None else self.document)
+
+    def __setitem__(self, key, value):
+        self.document[key] = value
+
+    def __delitem__(self, key):
+        del self.document[key]
+
+    def __iter__(self):
+        return iter(self.document)
+
+    def __len__(self):
+        return len(self.document)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(self.document, memo)
+
+    def __reduce__(self):
+        # The fetcher holds a database connection pool, which can't be sent to other processes.
+        # Pickled documents (eg. in task graphs of a distributed scheduler) are therefore whole
+        # documents, fetched beforehand in batches like any other access.
+        return dict, (self.document,)
+
+    def __repr__(self):
+        return repr(self.document)
+
+
+class _DocumentFetcher(object):
+    """
+    Fetches whole documents of partial search results on demand, a batch at a time.
+
+    Asking for one document also fetches those of the next datasets from the same search that are still in use.
+    """
+
+    def __init__(self, db, keys, batch_size=1000):
+        self._db = db
+        self._keys = keys
+        self._batch_size = batch_size
+        self._pending = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def document(self, dataset_id, sections):
+        doc = _PartialDocument(dataset_id, sections, self._keys, self)
+        self._pending[dataset_id] = doc
+        return doc
+
+    def fetch(self, doc):
+        with self._lock:
+            if doc._doc is not None:  # pylint: disable=protected-access
+                return
+
+            ids = [doc.dataset_id] + list(itertools.islice((id_ for id_ in self._pending.keys()
+                                                            if id_ != doc.dataset_id),
+                                                           self._batch_size - 1))
+            with self._db.connect() as connection:
+                rows = connection.get_datasets_metadata(ids)
+
+            for id_, metadata in rows:
+                pending = self._pending.pop(id_, None)
+                if pending is not None:
+                    pending._set_document(metadata)  # pylint: disable=protected-access
+
+            if doc._doc is None:  # pylint: disable=protected-access
+                raise MissingRecordError('Dataset {} is no longer in the index'.format(doc.dataset_id))
+
+
 class DatasetSpatialMixin(object):
     __slots__ = ()
 
@@ -161,7 +353,8 @@ class DatasetResource(object):
 
             # First insert all new datasets
             for ds in dss:
-                is_new = transaction.insert_dataset(ds.metadata_doc_without_lineage(), ds.id, ds.type.id)
+                is_new = transaction.insert_dataset(ds.metadata_doc_without_lineage(), ds.id, ds.type.id,
+                                                    footprint=self._footprint(ds))
                 if is_new:
                     edges.extend((name, ds.id, src.id)
                                  for name, src in ds.sources.items())
@@ -209,6 +402,117 @@ class DatasetResource(object):
 
         return dataset
 
+    def add_many(self, datasets, with_lineage=True, batch_size=1000, on_error=None):
+        """
+        Add many datasets to the index, skipping those already present.
+
+        Datasets are processed ``batch_size`` at a time. Presence of every dataset of a batch
+        (and of its lineage) is checked with a single query, then new datasets, lineage edges
+        and locations are inserted with one multi-row statement each, in a single transaction
+        per batch. This is much faster than calling :meth:`add` in a loop.
+
+        All datasets are added before this returns, see :meth:`add_many_iter` to add a long
+        stream of datasets without keeping all of them in memory.
+
+        :param datasets: iterable of :class:`Dataset`
+        :param bool with_lineage: True -- attempt adding lineage if it's missing, False don't
+        :param int batch_size: Number of top-level datasets per transaction
+        :param on_error: Callable ``(dataset, exception) -> None``. When supplied, a batch that fails
+                         is retried one dataset at a time with :meth:`add`, and datasets that still
+                         fail are reported to it instead of raising an error
+        :return: list of ``(dataset, outcome)`` in the order of ``datasets``, where ``outcome`` is
+                 ``True`` when the dataset was added, ``False`` when it was already in the index and
+                 ``None`` when it failed and was reported to ``on_error``
+        :rtype: list[(Dataset, bool)]
+        """
+        return list(self.add_many_iter(datasets, with_lineage=with_lineage,
+                                       batch_size=batch_size, on_error=on_error))
+
+    def add_many_iter(self, datasets, with_lineage=True, batch_size=1000, on_error=None):
+        """
+        Add many datasets to the index as the result is iterated, see :meth:`add_many`.
+
+        Nothing is added until iteration starts, each batch is added when its first outcome is requested.
+
+        :return: iterator of ``(dataset, outcome)``, see :meth:`add_many`
+        :rtype: __generator[(Dataset, bool)]
+        """
+        if batch_size < 1:
+            raise ValueError('batch_size should be positive')
+
+        datasets = iter(datasets)
+        while True:
+            batch = list(itertools.islice(datasets, batch_size))
+            if not batch:
+                return
+
+            try:
+                outcomes = self._add_batch(batch, with_lineage)
+            except (ValueError, MissingRecordError, IntegrityError) as e:
+                if on_error is None:
+                    raise
+                _LOG.warning('Failed to add a batch of %d datasets, adding one at a time: %s', len(batch), e)
+                outcomes = []
+                for dataset in batch:
+                    try:
+                        is_new = not self.has(dataset.id)
+                        if is_new:
+                            self.add(dataset, with_lineage=with_lineage)
+                        outcomes.append(is_new)
+                    except (ValueError, MissingRecordError, IntegrityError) as e:
+                        on_error(dataset, e)
+                        outcomes.append(None)
+
+            yield from zip(batch, outcomes)
+
+    def _add_batch(self, batch, with_lineage):
+        """ Add a batch of top-level datasets in one transaction, see :meth:`add_many`.
+
+        :return: list with an outcome for every dataset of ``batch``
+        """
+        ds_by_uuid = OrderedDict()
+        for dataset in batch:
+            if with_lineage:
+                for id_, dss in flatten_datasets(dataset).items():
+                    ds_by_uuid.setdefault(id_, dss[0])
+            else:
+                ds_by_uuid.setdefault(dataset.id, dataset)
+
+        all_uuids = list(ds_by_uuid)
+        present = {k: v for k, v in zip(all_uuids, self.bulk_has(all_uuids))}
+        dss = [ds for id_, ds in ds_by_uuid.items() if not present[id_]]
+
+        # Only the first occurrence of a new top-level dataset counts as added
+        outcomes = []
+        seen = set()
+        for dataset in batch:
+            if present[dataset.id]:
+                _LOG.warning('Dataset %s is already in the database', dataset.id)
+            outcomes.append(not present[dataset.id] and dataset.id not in seen)
+            seen.add(dataset.id)
+
+        if not dss:
+            return outcomes
+
+        _LOG.info('Indexing %d datasets', len(dss))
+
+        with self._db.begin() as transaction:
+            inserted = transaction.insert_datasets((ds.metadata_doc_without_lineage(), ds.id, ds.type.id,
+                                                    self._footprint(ds))
+                                                   for ds in dss)
+
+            transaction.insert_dataset_sources((name, ds.id, src.id)
+                                               for ds in dss if ds.id in inserted
+                                               for name, src in (ds.sources or {}).items())
+
+            # Locations only for new top-level datasets, oldest first
+            transaction.insert_dataset_locations((dataset.id, uri)
+                                                 for dataset, is_new in zip(batch, outcomes)
+                                                 if is_new and dataset.id in inserted and dataset.uris
+                                                 for uri in dataset.uris[::-1] if uri is not None)
+
+        return [is_new and dataset.id in inserted for dataset, is_new in zip(batch, outcomes)]
+
     def search_product_duplicates(self, product: DatasetType, *args):
         """
         Find dataset ids who have duplicates of the given set of field names.
@@ -298,7 +602,8 @@ class DatasetResource(object):
 
         product = self.types.get_by_name(dataset.type.name)
         with self._db.begin() as transaction:
-            if not transaction.update_dataset(dataset.metadata_doc_without_lineage(), dataset.id, product.id):
+            if not transaction.update_dataset(dataset.metadata_doc_without_lineage(), dataset.id, product.id,
+                                              footprint=self._footprint(dataset)):
                 raise ValueError("Failed to update dataset %s..." % dataset.id)
 
         self._ensure_new_locations(dataset, existing)
@@ -450,11 +755,20 @@ class DatasetResource(object):
             was_restored = connection.restore_location(id_, uri)
             return was_restored
 
-    def _make(self, dataset_res, full_info=False, product=None):
+    def _footprint(self, dataset):
+        """
+        Footprint of a dataset to record in the index, None when the database doesn't record them.
+        """
+        if not self._db.has_footprint:
+            return None
+        return _dataset_footprint(dataset)
+
+    def _make(self, dataset_res, full_info=False, product=None, fetcher=None):
         """
         :rtype Dataset
 
         :param bool full_info: Include all available fields
+        :param _DocumentFetcher fetcher: The row has a partial metadata document, fetch the rest with this
         """
         if dataset_res.uris:
             uris = [uri for uri in dataset_res.uris if uri]
@@ -463,9 +777,14 @@ class DatasetResource(object):
 
         product = product or self.types.get(dataset_res.dataset_type_ref)
 
+        if fetcher is not None:
+            metadata_doc = fetcher.document(dataset_res.id, dataset_res.metadata)
+        else:
+            metadata_doc = dataset_res.metadata
+
         return Dataset(
             type_=product,
-            metadata_doc=dataset_res.metadata,
+            metadata_doc=metadata_doc,
             uris=uris,
             indexed_by=dataset_res.added_by if full_info else None,
             indexed_time=dataset_res.added if full_info else None,
@@ -491,19 +810,33 @@ class DatasetResource(object):
             for dataset in self._make_many(connection.search_datasets_by_metadata(metadata)):
                 yield dataset
 
-    def search(self, limit=None, **query):
+    def search(self, limit=None, fetch_size=None, partial=False, **query):
         """
         Perform a search, returning results as Dataset objects.
 
         :param Union[str,float,Range,list] query:
         :param int limit: Limit number of datasets
+        :param int fetch_size: Stream results from the database this many rows at a time, so that memory use
+                               does not grow with the number of results. By default all results are
+                               fetched at once. While streaming, a pooled connection with an open cursor
+                               and transaction is held until the returned generator is exhausted or
+                               closed, so don't leave it partially consumed.
+        :param bool partial: Only fetch the parts of dataset documents needed to load data (id, format,
+                             measurements, grid, time and lat/lon information). The rest of a document is
+                             fetched the first time it is accessed, together with those of other datasets
+                             of the search. Pickling a dataset, eg. to send it to a distributed
+                             scheduler, also fetches its whole document. Not supported with ``source_filter``.
         :rtype: __generator[Dataset]
         """
         source_filter = query.pop('source_filter', None)
-        for product, datasets in self._do_search_by_product(query,
-                                                            source_filter=source_filter,
-                                                            limit=limit):
-            yield from self._make_many(datasets, product)
+        if partial and not source_filter:
+            yield from self._do_partial_search(query, limit=limit, fetch_size=fetch_size)
+            return
+
+        yield from self._make_many(self._do_search(query,
+                                                   source_filter=source_filter,
+                                                   limit=limit,
+                                                   fetch_size=fetch_size))
 
     def search_by_product(self, **query):
         """
@@ -515,7 +848,7 @@ class DatasetResource(object):
         for product, datasets in self._do_search_by_product(query):
             yield product, self._make_many(datasets, product)
 
-    def search_returning(self, field_names, limit=None, **query):
+    def search_returning(self, field_names, limit=None, fetch_size=None, **query):
         """
         Perform a search, returning only the specified fields.
 
@@ -526,17 +859,17 @@ class DatasetResource(object):
         :param tuple[str] field_names:
         :param Union[str,float,Range,list] query:
         :param int limit: Limit number of datasets
+        :param int fetch_size: Stream results from the database this many rows at a time, see :meth:`search`
         :returns __generator[tuple]: sequence of results, each result is a namedtuple of your requested fields
         """
         result_type = namedtuple('search_result', field_names)
 
-        for _, results in self._do_search_by_product(query,
-                                                     return_fields=True,
-                                                     select_field_names=field_names,
-                                                     limit=limit):
-
-            for columns in results:
-                yield result_type(*columns)
+        for columns in self._do_search(query,
+                                       return_fields=True,
+                                       select_field_names=field_names,
+                                       limit=limit,
+                                       fetch_size=fetch_size):
+            yield result_type(*columns)
 
     def count(self, **query):
         """
@@ -545,7 +878,6 @@ class DatasetResource(object):
         :param dict[str,str|float|datacube.model.Range] query:
         :rtype: int
         """
-        # This may be optimised into one query in the future.
         result = 0
         for product_type, count in self._do_count_by_product(query):
             result += count
@@ -608,7 +940,7 @@ class DatasetResource(object):
     # pylint: disable=too-many-locals
     def _do_search_by_product(self, query, return_fields=False, select_field_names=None,
                               with_source_ids=False, source_filter=None,
-                              limit=None):
+                              limit=None, fetch_size=None):
         if source_filter:
             product_queries = list(self._get_product_queries(source_filter))
             if not product_queries:
@@ -623,13 +955,86 @@ class DatasetResource(object):
         else:
             source_exprs = None
 
+        for product, query_exprs, select_fields in self._product_searches(query, return_fields, select_field_names):
+            with self._db.connect(fetch_size=fetch_size) as connection:
+                yield (product,
+                       connection.search_datasets(
+                           query_exprs,
+                           source_exprs,
+                           select_fields=select_fields,
+                           limit=limit,
+                           with_source_ids=with_source_ids
+                       ))
+
+    def _do_search(self, query, return_fields=False, select_field_names=None,
+                   source_filter=None, limit=None, fetch_size=None):
+        """
+        Search all products matching the query with a single statement, yielding result rows.
+
+        The limit applies to each product. With ``fetch_size`` the connection, its server-side
+        cursor and transaction stay borrowed from the pool until this generator finishes or is closed.
+        """
+        if source_filter:
+            for _, results in self._do_search_by_product(query,
+                                                         return_fields=return_fields,
+                                                         select_field_names=select_field_names,
+                                                         source_filter=source_filter,
+                                                         limit=limit,
+                                                         fetch_size=fetch_size):
+                yield from results
+            return
+
+        searches = self._product_searches(query, return_fields, select_field_names)
+
+        columns = {tuple((field.name, type(field)) for field in select_fields or ())
+                   for _, _, select_fields in searches}
+        if len(columns) > 1:
+            # Products of different metadata types return different fields, they can't share a statement.
+            for _, query_exprs, select_fields in searches:
+                with self._db.connect(fetch_size=fetch_size) as connection:
+                    yield from connection.search_datasets(query_exprs, select_fields=select_fields, limit=limit)
+            return
+
+        with self._db.connect(fetch_size=fetch_size) as connection:
+            yield from connection.search_datasets_union(
+                [(query_exprs, select_fields) for _, query_exprs, select_fields in searches],
+                limit=limit
+            )
+
+    def _do_partial_search(self, query, limit=None, fetch_size=None):
+        searches = self._product_searches(query)
+
+        keys = set()
+        for product, _, _ in searches:
+            keys |= _partial_doc_keys(product.metadata_type)
+        fetcher = _DocumentFetcher(self._db, keys)
+
+        with self._db.connect(fetch_size=fetch_size) as connection:
+            results = connection.search_datasets_union(
+                [(query_exprs, None) for _, query_exprs, _ in searches],
+                limit=limit,
+                metadata_keys=keys
+            )
+            for dataset_res in results:
+                yield self._make(dataset_res, fetcher=fetcher)
+
+    def _product_searches(self, query, return_fields=False, select_field_names=None):
+        """
+        The expressions and fields to select for each product matching the query.
+
+        :rtype: list[(DatasetType, tuple[Expression], tuple[Field])]
+        """
+        query = dict(query)
+        footprint_exprs = _footprint_expressions(query, self._db.has_footprint)
+
         product_queries = list(self._get_product_queries(query))
         if not product_queries:
             raise ValueError('No products match search terms: %r' % query)
 
+        searches = []
         for q, product in product_queries:
             dataset_fields = product.metadata_type.dataset_fields
-            query_exprs = tuple(fields.to_expressions(dataset_fields.get, **q))
+            query_exprs = tuple(fields.to_expressions(dataset_fields.get, **q)) + footprint_exprs
             select_fields = None
             if return_fields:
                 # if no fields specified, select all
@@ -639,24 +1044,22 @@ class DatasetResource(object):
                 else:
                     select_fields = tuple(dataset_fields[field_name]
                                           for field_name in select_field_names)
-            with self._db.connect() as connection:
-                yield (product,
-                       connection.search_datasets(
-                           query_exprs,
-                           source_exprs,
-                           select_fields=select_fields,
-                           limit=limit,
-                           with_source_ids=with_source_ids
-                       ))
+            searches.append((product, query_exprs, select_fields))
+        return searches
 
     def _do_count_by_product(self, query):
-        product_queries = self._get_product_queries(query)
+        query = dict(query)
+        footprint_exprs = _footprint_expressions(query, self._db.has_footprint)
+        product_queries = list(self._get_product_queries(query))
 
-        for q, product in product_queries:
-            dataset_fields = product.metadata_type.dataset_fields
-            query_exprs = tuple(fields.to_expressions(dataset_fields.get, **q))
-            with self._db.connect() as connection:
-                count = connection.count_datasets(query_exprs)
+        with self._db.connect() as connection:
+            counts = dict(connection.count_datasets_by_product([
+                tuple(fields.to_expressions(product.metadata_type.dataset_fields.get, **q)) + footprint_exprs
+                for q, product in product_queries
+            ]))
+
+        for _, product in product_queries:
+            count = counts.get(product.id, 0)
             if count > 0:
                 yield product, count
 
@@ -668,6 +1071,7 @@ class DatasetResource(object):
 
         start, end = query['time']
         del query['time']
+        footprint_exprs = _footprint_expressions(query, self._db.has_footprint)
 
         product_queries = list(self._get_product_queries(query))
         if ensure_single:
@@ -677,28 +1081,28 @@ class DatasetResource(object):
                 raise ValueError('Multiple products match single query search: %r' %
                                  ([dt.name for q, dt in product_queries],))
 
+        queries = []
         for q, product in product_queries:
             dataset_fields = product.metadata_type.dataset_fields
-            query_exprs = tuple(fields.to_expressions(dataset_fields.get, **q))
-            with self._db.connect() as connection:
-                yield product, list(connection.count_datasets_through_time(
-                    start,
-                    end,
-                    period,
-                    dataset_fields.get('time'),
-                    query_exprs
-                ))
+            query_exprs = tuple(fields.to_expressions(dataset_fields.get, **q)) + footprint_exprs
+            queries.append((product.id, dataset_fields.get('time'), query_exprs))
+
+        with self._db.connect() as connection:
+            counts = connection.count_datasets_through_time_by_product(start, end, period, queries)
+
+        for _, product in product_queries:
+            yield product, counts[product.id]
 
-    def search_summaries(self, **query):
+    def search_summaries(self, fetch_size=None, **query):
         """
         Perform a search, returning just the search fields of each dataset.
 
         :param dict[str,str|float|datacube.model.Range] query:
+        :param int fetch_size: Stream results from the database this many rows at a time, see :meth:`search`
         :rtype: __generator[dict]
         """
-        for _, results in self._do_search_by_product(query, return_fields=True):
-            for columns in results:
-                yield dict(columns)
+        for columns in self._do_search(query, return_fields=True, fetch_size=fetch_size):
+            yield dict(columns)
 
     def search_eager(self, **query):
         """
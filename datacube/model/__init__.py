@@ -147,8 +147,12 @@ class Dataset:
         """
         :rtype: datetime.datetime
         """
-        if 'key_time' in self.metadata.fields:
-            return self.metadata.key_time
+        # Only extract the one field, rather than all of them through ``metadata.fields``
+        if 'key_time' in self.metadata_type.dataset_fields:
+            try:
+                return self.metadata.key_time
+            except (AttributeError, KeyError, ValueError):
+                pass
 
         # Existing datasets are already using the computed "center_time" for their storage index key
         # if 'center_time' in self.metadata.fields:
@@ -321,7 +325,7 @@ class Measurement(dict):
     """
     REQUIRED_KEYS = ('name', 'dtype', 'nodata', 'units')
     OPTIONAL_KEYS = ('aliases', 'spectral_definition', 'flags_definition')
-    ATTR_BLACKLIST = set(['name', 'dtype', 'aliases', 'resampling_method', 'fuser'])
+    ATTR_BLACKLIST = set(['name', 'dtype', 'aliases', 'resampling_method', 'fuser', 'snap', 'lazy_open'])
 
     def __init__(self, **kwargs):
         missing_keys = set(self.REQUIRED_KEYS) - set(kwargs)
@@ -464,6 +468,12 @@ class DatasetType:
 
         return GridSpec(crs=crs, **gs_params)
 
+    def load_hints(self) -> Dict[str, Any]:
+        """
+        Default load settings for this product, from the ``load`` section of the product definition
+        """
+        return dict(self.definition.get('load', {}))
+
     def canonical_measurement(self, measurement: str) -> str:
         """ resolve measurement alias into canonical name
         """
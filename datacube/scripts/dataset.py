@@ -10,7 +10,6 @@ import yaml
 import yaml.resolver
 from click import echo
 
-from datacube.index.exceptions import MissingRecordError
 from datacube.index.hl import Doc2Dataset, check_dataset_consistent
 from datacube.index.eo3 import prep_eo3
 from datacube.index.index import Index
@@ -181,13 +180,24 @@ def index_cmd(index, product_names,
 
 
 def index_datasets(dss, index, auto_add_lineage, dry_run):
-    for dataset in dss:
-        _LOG.info('Matched %s', dataset)
-        if not dry_run:
-            try:
-                index.datasets.add(dataset, with_lineage=auto_add_lineage)
-            except (ValueError, MissingRecordError) as e:
-                _LOG.error('Failed to add dataset %s: %s', dataset.local_uri, e)
+    def matched(dss):
+        for dataset in dss:
+            _LOG.info('Matched %s', dataset)
+            yield dataset
+
+    if dry_run:
+        for _ in matched(dss):
+            pass
+        return
+
+    def on_error(dataset, e):
+        _LOG.error('Failed to add dataset %s: %s', dataset.local_uri, e)
+
+    n_added = sum(1 for _, is_new in index.datasets.add_many_iter(matched(dss),
+                                                                  with_lineage=auto_add_lineage,
+                                                                  on_error=on_error)
+                  if is_new)
+    _LOG.info('Added %d new datasets', n_added)
 
 
 def parse_update_rules(keys_that_can_change):
@@ -403,13 +413,15 @@ def info_cmd(index: Index, show_sources: bool, show_derived: bool,
               type=int, default=None)
 @click.option('-f', help='Output format',
               type=click.Choice(list(_OUTPUT_WRITERS)), default='yaml', show_default=True)
+@click.option('--fetch-size', help='Number of results to fetch from the database at a time',
+              type=int, default=1000, show_default=True)
 @ui.parsed_search_expressions
 @ui.pass_index()
-def search_cmd(index, limit, f, expressions):
+def search_cmd(index, limit, f, fetch_size, expressions):
     """
     Search available Datasets
     """
-    datasets = index.datasets.search(limit=limit, **expressions)
+    datasets = index.datasets.search(limit=limit, fetch_size=fetch_size, **expressions)
     _OUTPUT_WRITERS[f](
         build_dataset_info(index, dataset)
         for dataset in datasets
@@ -292,19 +292,17 @@ def ingest_work(config, source_type, output_type, tile, tile_index):
 
 
 def _index_datasets(index, results):
-    n = 0
-    for datasets in results:
-        extra_args = {}
-        # datasets is an xarray.DataArray
-        if 'driver_data' in datasets.attrs:
-            extra_args['driver_data'] = datasets.attrs['driver_data']
-
-        for dataset in datasets.values:
-            if 'driver_data' in extra_args:
-                dataset.metadata_doc['driver_data'] = extra_args['driver_data']
-            index.datasets.add(dataset, with_lineage=False, **extra_args)
-            n += 1
-    return n
+    def all_datasets():
+        for datasets in results:
+            # datasets is an xarray.DataArray
+            driver_data = datasets.attrs.get('driver_data', None)
+
+            for dataset in datasets.values:
+                if driver_data is not None:
+                    dataset.metadata_doc['driver_data'] = driver_data
+                yield dataset
+
+    return len(index.datasets.add_many(all_datasets(), with_lineage=False))
 
 
 def process_tasks(index, config, source_type, output_type, tasks, queue_size, executor):
@@ -80,16 +80,18 @@ def cli(ctx, f):
 
 
 @cli.command()
+@click.option('--fetch-size', help='Number of results to fetch from the database at a time',
+              type=int, default=1000, show_default=True)
 @ui.parsed_search_expressions
 @PASS_INDEX
 @click.pass_context
-def datasets(ctx, index, expressions):
+def datasets(ctx, index, fetch_size, expressions):
     """
     Search available Datasets
     """
     ctx.obj['write_results'](
         sorted(index.datasets.get_field_names()),
-        index.datasets.search_summaries(**expressions)
+        index.datasets.search_summaries(fetch_size=fetch_size, **expressions)
     )
 
 
@@ -1,5 +1,6 @@
 from typing import Optional, Dict, Any, Tuple
 from urllib.parse import urlparse
+from affine import Affine
 
 from datacube.model import Dataset
 from datacube.utils.uris import uri_resolve, pick_uri
@@ -44,6 +45,24 @@ def _get_band_and_layer(b: Dict[str, Any]) -> Tuple[Optional[int], Optional[str]
 def _extract_driver_data(ds: Dataset) -> Optional[Any]:
     return ds.metadata_doc.get('driver_data', None)
 
+
+def _extract_grid(ds: Dataset, mm: Dict[str, Any]) -> Tuple[Optional[Tuple[int, int]], Optional[Affine]]:
+    """ Pixel grid of a band as recorded in the dataset document (EO3 ``grids`` section).
+
+    :returns: ``(shape, transform)``, or ``(None, None)`` if not known
+    """
+    grids = ds.metadata_doc.get('grids', None)
+    if not isinstance(grids, dict):
+        return None, None
+
+    grid = grids.get(mm.get('grid', 'default'), None)
+    if grid is None or grid.get('shape') is None or grid.get('transform') is None:
+        return None, None
+
+    h, w = grid['shape']
+    return (int(h), int(w)), Affine(*grid['transform'][:6])
+
+
 def measurement_paths(ds: Dataset) -> Dict[str, str]:
     """
     Returns a dictionary mapping from band name to url pointing to band storage
@@ -71,7 +90,9 @@ class BandInfo:
                  'transform',
                  'center_time',
                  'format',
-                 'driver_data')
+                 'driver_data',
+                 'grid_shape',
+                 'grid_transform')
 
     def __init__(self,
                  ds: Dataset,
@@ -106,6 +127,7 @@ class BandInfo:
         self.transform = ds.transform
         self.format = ds.format
         self.driver_data = _extract_driver_data(ds)
+        self.grid_shape, self.grid_transform = _extract_grid(ds, mm)
 
     @property
     def uri_scheme(self) -> str:
@@ -0,0 +1,87 @@
+"""
+Data sources that defer opening files until pixels are needed.
+"""
+from contextlib import contextmanager
+from typing import Optional, Iterator, Union
+
+import numpy as np
+from affine import Affine
+
+from datacube.utils import geometry
+from datacube.utils.math import num2numpy
+from . import DataSource, GeoRasterReader, RasterShape, RasterWindow, BandInfo
+
+
+def has_indexed_grid(band: BandInfo) -> bool:
+    """ Check if pixel grid of the band is recorded in the index, so it can be read without opening the file first.
+    """
+    return (band.grid_shape is not None
+            and band.grid_transform is not None
+            and band.crs is not None)
+
+
+class IndexedBandDataSource(GeoRasterReader):
+    """ Band reader that takes raster metadata from the index instead of the file.
+
+    Underlying data source is only opened when pixels are read, so sources
+    that do not overlap with the destination are never opened. Nodata and
+    data type recorded in the product definition are assumed to match the file.
+    """
+
+    def __init__(self, source: DataSource, band: BandInfo):
+        assert has_indexed_grid(band)
+        self._source = source
+        self._band = band
+        self._dtype = np.dtype(band.dtype)
+        self._nodata = None if band.nodata is None else num2numpy(band.nodata, self._dtype)
+
+    @property
+    def crs(self) -> geometry.CRS:
+        return self._band.crs
+
+    @property
+    def transform(self) -> Affine:
+        return self._band.grid_transform
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @property
+    def shape(self) -> RasterShape:
+        return self._band.grid_shape
+
+    @property
+    def nodata(self) -> Optional[Union[int, float]]:
+        return self._nodata
+
+    def read(self, window: Optional[RasterWindow] = None,
+             out_shape: Optional[RasterShape] = None,
+             out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """Open underlying data source and read pixels from it
+        """
+        with self._source.open() as rdr:
+            if out is not None and isinstance(rdr, GeoRasterReader):
+                return rdr.read(window, out_shape, out=out)
+            return rdr.read(window, out_shape)
+
+
+class IndexedGridDataSource(DataSource):
+    """ Wrap data source to use raster metadata recorded in the index, see :class:`IndexedBandDataSource`.
+    """
+
+    def __init__(self, source: DataSource, band: BandInfo):
+        self._source = source
+        self._band = band
+
+    @contextmanager
+    def open(self) -> Iterator[GeoRasterReader]:
+        yield IndexedBandDataSource(self._source, self._band)
+
+
+def maybe_lazy_datasource(source: DataSource, band: BandInfo) -> DataSource:
+    """ Wrap ``source`` with :class:`IndexedGridDataSource` if band's pixel grid is recorded in the index.
+    """
+    if has_indexed_grid(band):
+        return IndexedGridDataSource(source, band)
+    return source
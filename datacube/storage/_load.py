@@ -5,35 +5,120 @@ Important functions are:
 
 """
 import logging
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import Future, wait, FIRST_COMPLETED
 import numpy as np
 from xarray.core.dataarray import DataArray as XrDataArray, DataArrayCoordinates
 from xarray.core.dataset import Dataset as XrDataset
 from typing import (
     Union, Optional, Callable,
-    List, Any, Iterator, Iterable, Mapping, Tuple, Hashable, cast
+    List, Any, Iterator, Iterable, Mapping, Tuple, Hashable, Dict, Deque, NamedTuple, cast
 )
 
 from datacube.utils import ignore_exceptions_if
-from datacube.utils.math import invalid_mask
-from datacube.utils.geometry import GeoBox, roi_is_empty
+from datacube.utils.math import invalid_mask, valid_mask, dtype_is_float
+from datacube.utils.buffers import BufferPool, scratch_buffer, get_default_buffer_pool
+from datacube.utils.geometry import GeoBox, Geometry, CRS, roi_is_empty, roi_shape, intersects
 from datacube.model import Measurement
 from datacube.drivers._types import ReaderDriver
 from . import DataSource, BandInfo
+from ._read import SnapPolicy
 
 _LOG = logging.getLogger(__name__)
 
 FuserFunction = Callable[[np.ndarray, np.ndarray], Any]  # pylint: disable=invalid-name
 ProgressFunction = Callable[[int, int], Any]  # pylint: disable=invalid-name
-
-
-def _default_fuser(dst: np.ndarray, src: np.ndarray, dst_nodata) -> None:
+ReadJob = NamedTuple('ReadJob', [('group', Hashable),
+                                 ('band', BandInfo),
+                                 ('dst_gbox', GeoBox),
+                                 ('resampling', str),
+                                 ('dst_nodata', Any),
+                                 ('snap', Optional[SnapPolicy]),
+                                 ('out', Optional[np.ndarray]),
+                                 ('normalise', bool)])
+ReadResult = Tuple[Hashable, Optional[np.ndarray], Any, Any, bool]  # pylint: disable=invalid-name
+
+
+def _default_fuser(dst: np.ndarray, src: np.ndarray, dst_nodata, src_nodata=None) -> int:
     """ Overwrite only those pixels in `dst` with `src` that are "not valid"
 
         For every pixel in dst that equals to dst_nodata replace it with pixel
-        from src.
+        from src. When ``src_nodata`` is supplied pixels of ``src`` equal to it
+        are skipped, this way ``src`` doesn't need to be normalised to
+        ``dst_nodata`` before fusing.
+
+        :returns: Number of ``dst`` pixels that were missing and are now valid
+    """
+    where = invalid_mask(dst, dst_nodata)
+    n_missing = int(np.count_nonzero(where))
+    if n_missing == 0:
+        return 0
+
+    if src_nodata is not None and (dtype_is_float(src.dtype) or src_nodata != dst_nodata):
+        where &= valid_mask(src, src_nodata)
+    np.copyto(dst, src, where=where)
+    return n_missing - int(np.count_nonzero(invalid_mask(dst, dst_nodata)))
+
+
+def _n_filled(dst: np.ndarray, roi, nodata) -> int:
+    """ Number of valid pixels in ``dst[roi]``, that was all nodata before
     """
-    np.copyto(dst, src, where=invalid_mask(dst, dst_nodata))
+    n_total = int(np.prod(roi_shape(roi)))
+    return n_total - int(np.count_nonzero(invalid_mask(dst[roi], nodata)))
+
+
+@contextmanager
+def _nodata_on_error(dst: np.ndarray, nodata):
+    """ Reset ``dst`` to ``nodata`` when reading into it fails, a failed read
+    might have left partial data behind. Only for reads into arrays that were
+    all nodata before.
+    """
+    try:
+        yield dst
+    except Exception:
+        dst.fill(nodata)
+        raise
+
+
+def _dataset_footprint(ds, crs: CRS) -> Optional[Geometry]:
+    """ Indexed footprint of a dataset (``valid_data`` polygon when available) in a given CRS,
+    ``None`` when it's not known or can not be converted to ``crs``.
+    """
+    try:
+        extent = ds.extent
+        if extent is None:
+            return None
+        return extent.to_crs(crs)
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+
+def select_overlapping(datasets: Iterable[Any], geobox: GeoBox) -> Tuple[List[Any], List[Any]]:
+    """ Partition datasets by whether their indexed footprint overlaps with ``geobox``.
+
+    This uses only the information from the index, so that sources not
+    contributing any pixels to the output are never opened. Output region is
+    padded by one pixel to keep sources that only contribute to edge pixels via
+    resampling. Datasets with unknown footprint are assumed to overlap.
+
+    :returns: ``(overlapping, skipped)``, original order is preserved
+    """
+    res = max(abs(r) for r in geobox.resolution)
+    region = geobox.extent.buffer(res)
+
+    overlapping, skipped = [], []  # type: Tuple[List[Any], List[Any]]
+    for ds in datasets:
+        footprint = _dataset_footprint(ds, geobox.crs)
+        if footprint is None or intersects(footprint, region):
+            overlapping.append(ds)
+        else:
+            skipped.append(ds)
+
+    if skipped:
+        _LOG.debug('Skipping %d datasets that do not overlap with output region', len(skipped))
+
+    return overlapping, skipped
 
 
 def reproject_and_fuse(datasources: List[DataSource],
@@ -43,7 +128,8 @@ def reproject_and_fuse(datasources: List[DataSource],
                        resampling: str = 'nearest',
                        fuse_func: Optional[FuserFunction] = None,
                        skip_broken_datasets: bool = False,
-                       progress_cbk: Optional[ProgressFunction] = None):
+                       progress_cbk: Optional[ProgressFunction] = None,
+                       snap: Optional[SnapPolicy] = None):
     """
     Reproject and fuse `sources` into a 2D numpy array `destination`.
 
@@ -53,23 +139,39 @@ def reproject_and_fuse(datasources: List[DataSource],
     :param skip_broken_datasets: Carry on in the face of adversity and failing reads.
     :param progress_cbk: If supplied will be called with 2 integers `Items processed, Total Items`
                          after reading each file.
+    :param snap: Paste sources that are off the destination grid by a fraction of a pixel,
+                 see :class:`datacube.storage._read.SnapPolicy`
+
+    Scratch buffer needed for fusing multiple sources is taken from the default
+    buffer pool, see :func:`datacube.utils.buffers.set_default_buffer_pool`.
+
+    With the default fuser remaining sources are not opened once there are no
+    missing pixels left in the destination, so sources should be ordered from
+    the most to the least useful.
     """
-    # pylint: disable=too-many-locals
+    # pylint: disable=too-many-locals,too-many-branches
     from ._read import read_time_slice
     assert len(destination.shape) == 2
 
+    # with the default fuser first valid pixel wins, so we can keep track of
+    # how many pixels are still missing and stop once there are none left
+    n_missing = [destination.size]
+
     def copyto_fuser(dest: np.ndarray, src: np.ndarray) -> None:
-        _default_fuser(dest, src, dst_nodata)
+        n_missing[0] -= _default_fuser(dest, src, dst_nodata)
 
+    # with the default fuser first source can go straight into the destination
+    direct_ok = fuse_func is None
+    track_missing = fuse_func is None
     fuse_func = fuse_func or copyto_fuser
 
     destination.fill(dst_nodata)
     if len(datasources) == 0:
         return destination
     elif len(datasources) == 1:
-        with ignore_exceptions_if(skip_broken_datasets):
+        with ignore_exceptions_if(skip_broken_datasets), _nodata_on_error(destination, dst_nodata):
             with datasources[0].open() as rdr:
-                read_time_slice(rdr, destination, dst_gbox, resampling, dst_nodata)
+                read_time_slice(rdr, destination, dst_gbox, resampling, dst_nodata, snap=snap)
 
         if progress_cbk:
             progress_cbk(1, 1)
@@ -77,20 +179,167 @@ def reproject_and_fuse(datasources: List[DataSource],
         return destination
     else:
         # Multiple sources, we need to fuse them together into a single array
-        buffer_ = np.full(destination.shape, dst_nodata, dtype=destination.dtype)
-        for n_so_far, source in enumerate(datasources, 1):
-            with ignore_exceptions_if(skip_broken_datasets):
-                with source.open() as rdr:
-                    roi = read_time_slice(rdr, buffer_, dst_gbox, resampling, dst_nodata)
+        buffer_ = None  # type: Optional[np.ndarray]
+        with ExitStack() as stack:
+            for n_so_far, source in enumerate(datasources, 1):
+                with ignore_exceptions_if(skip_broken_datasets):
+                    if direct_ok:
+                        with _nodata_on_error(destination, dst_nodata), source.open() as rdr:
+                            roi = read_time_slice(rdr, destination, dst_gbox, resampling, dst_nodata, snap=snap)
+                        direct_ok = roi_is_empty(roi)
+                        if not direct_ok:
+                            n_missing[0] -= _n_filled(destination, roi, dst_nodata)
+                    else:
+                        if buffer_ is None:
+                            buffer_ = stack.enter_context(scratch_buffer(destination.shape,
+                                                                         destination.dtype,
+                                                                         fill=dst_nodata))
+
+                        with _nodata_on_error(buffer_, dst_nodata), source.open() as rdr:
+                            roi = read_time_slice(rdr, buffer_, dst_gbox, resampling, dst_nodata, snap=snap)
+
+                        if not roi_is_empty(roi):
+                            fuse_func(destination[roi], buffer_[roi])
+                            buffer_[roi] = dst_nodata  # clean up for next read
+
+                if progress_cbk:
+                    progress_cbk(n_so_far, len(datasources))
+
+                if track_missing and n_missing[0] <= 0:
+                    _LOG.debug('Destination is full, skipping %d remaining sources',
+                               len(datasources) - n_so_far)
+                    if progress_cbk:
+                        # skipped sources still count as processed
+                        for n in range(n_so_far + 1, len(datasources) + 1):
+                            progress_cbk(n, len(datasources))
+                    break
 
-                if not roi_is_empty(roi):
-                    fuse_func(destination[roi], buffer_[roi])
-                    buffer_[roi] = dst_nodata  # clean up for next read
+        return destination
+
+
+def reproject_and_fuse_bands(datasources: List[List[DataSource]],
+                             destinations: List[np.ndarray],
+                             dst_gbox: GeoBox,
+                             dst_nodata: List[Optional[Union[int, float]]],
+                             resampling: List[str],
+                             fuse_func: List[Optional[FuserFunction]],
+                             skip_broken_datasets: bool = False,
+                             progress_cbk: Optional[ProgressFunction] = None,
+                             snap: Optional[SnapPolicy] = None):
+    """
+    Same as :func:`reproject_and_fuse` but for several bands that are stored in the same file.
+
+    Every file is opened once and all the bands are read from it with a
+    single read call, resampling and fusing is still done separately for
+    every band.
+
+    :param datasources: For every source, list of data sources (one per
+                        destination band) all pointing to the same file
+    :param destinations: 2D arrays to read data into, one per band
+    :param dst_gbox: GeoBox defining destination region
+    :param dst_nodata: Nodata value per band
+    :param resampling: Resampling method per band
+    :param fuse_func: Fuser function per band, ``None`` means use default
+    :param skip_broken_datasets: Carry on in the face of adversity and failing reads.
+    :param progress_cbk: If supplied will be called with 2 integers `Items processed, Total Items`
+                         after reading each band of each file.
+    :param snap: Paste sources that are off the destination grid by a fraction of a pixel
+
+    Remaining files are skipped once all the bands are full, this only
+    happens when every band uses the default fuser.
+    """
+    # pylint: disable=too-many-locals,too-many-branches,too-many-statements
+    from ._read import read_time_slice
+    from ._rio import RasterioDataSource, open_bands
+
+    n_bands = len(destinations)
+    assert all(len(dst.shape) == 2 for dst in destinations)
+    assert n_bands == len(dst_nodata) == len(resampling) == len(fuse_func)
+
+    # number of missing pixels per band, only tracked for the default fuser
+    n_missing = [dst.size if fuser is None else None
+                 for dst, fuser in zip(destinations, fuse_func)]
+
+    def mk_fuser(i, fuser, nodata):
+        if fuser is not None:
+            return fuser
+
+        def copyto_fuser(dest, src):
+            n_missing[i] -= _default_fuser(dest, src, nodata)
+        return copyto_fuser
+
+    fusers = [mk_fuser(i, fuser, nodata) for i, (fuser, nodata) in enumerate(zip(fuse_func, dst_nodata))]
+
+    # with the default fuser first source can go straight into the destination
+    direct_ok = [fuser is None for fuser in fuse_func]
+
+    @contextmanager
+    def open_all(srcs):
+        if all(isinstance(src, RasterioDataSource) for src in srcs):
+            with open_bands(srcs) as rdrs:
+                yield rdrs
+        else:
+            with ExitStack() as stack:
+                yield [stack.enter_context(src.open()) for src in srcs]
+
+    for dst, nodata in zip(destinations, dst_nodata):
+        dst.fill(nodata)
+
+    single_source = len(datasources) == 1
+    buffers = {}  # type: Dict[Tuple[np.dtype, Any], np.ndarray]
+
+    n_total = len(datasources)*n_bands
+    n_so_far = 0
+    with ExitStack() as buffers_stack:
+        def get_buffer(dst, nodata):
+            key = (dst.dtype, nodata)
+            buf = buffers.get(key, None)
+            if buf is None:
+                buf = buffers[key] = buffers_stack.enter_context(scratch_buffer(dst.shape, dst.dtype,
+                                                                                fill=nodata))
+            return buf
+
+        for srcs in datasources:
+            assert len(srcs) == n_bands
+            with ignore_exceptions_if(skip_broken_datasets):
+                with open_all(srcs) as rdrs:
+                    for i, (rdr, dst, nodata, rr, fuser) in enumerate(zip(rdrs, destinations, dst_nodata,
+                                                                          resampling, fusers)):
+                        if single_source:
+                            with _nodata_on_error(dst, nodata):
+                                read_time_slice(rdr, dst, dst_gbox, rr, nodata, snap=snap)
+                            continue
+
+                        if direct_ok[i]:
+                            with _nodata_on_error(dst, nodata):
+                                roi = read_time_slice(rdr, dst, dst_gbox, rr, nodata, snap=snap)
+                            direct_ok[i] = roi_is_empty(roi)
+                            if not direct_ok[i]:
+                                n_missing[i] -= _n_filled(dst, roi, nodata)
+                            continue
+
+                        buffer_ = get_buffer(dst, nodata)
+                        with _nodata_on_error(buffer_, nodata):
+                            roi = read_time_slice(rdr, buffer_, dst_gbox, rr, nodata, snap=snap)
+
+                        if not roi_is_empty(roi):
+                            fuser(dst[roi], buffer_[roi])
+                            buffer_[roi] = nodata  # clean up for next read
 
             if progress_cbk:
-                progress_cbk(n_so_far, len(datasources))
+                for _ in range(n_bands):
+                    n_so_far += 1
+                    progress_cbk(n_so_far, n_total)
 
-        return destination
+            if all(n is not None and n <= 0 for n in n_missing):
+                _LOG.debug('All bands are full, skipping remaining sources')
+                if progress_cbk:
+                    # skipped sources still count as processed
+                    for n in range(n_so_far + 1, n_total + 1):
+                        progress_cbk(n, n_total)
+                break
+
+    return destinations
 
 
 def _mk_empty_ds(coords: DataArrayCoordinates, geobox: GeoBox) -> XrDataset:
@@ -115,19 +364,125 @@ def _allocate_storage(coords: DataArrayCoordinates,
     return xx
 
 
+def _pipelined_reads(jobs: Iterable[ReadJob],
+                     driver: ReaderDriver,
+                     ctx: Any,
+                     max_in_flight: int = 1,
+                     skip_broken_datasets: bool = False,
+                     pool: Optional[BufferPool] = None) -> Iterator[ReadResult]:
+    """ Open and read sources with up to ``max_in_flight`` of them being active at any time.
+
+    :param jobs: Sequence of :class:`ReadJob`, pixels are placed into ``job.out``
+                 when supplied (see :func:`datacube.storage._read.plan_read_v2`)
+    :param pool: Pool to take warp buffers from, caller should release ``pix``
+                 back to it once done with it when ``pooled`` is ``True``
+
+    :returns: Iterator of ``(group, pix, roi, nodata, pooled)`` tuples, results are produced as
+              soon as they are available, but results within the same
+              ``group`` are always produced in the order they were submitted.
+              ``pix`` is ``None`` for sources that do not overlap with
+              destination, or that failed to load when
+              ``skip_broken_datasets=True``. ``nodata`` is the value marking
+              missing pixels in ``pix``, it's ``job.dst_nodata`` unless
+              ``job.normalise`` is ``False``. ``pooled`` is ``True`` when ``pix``
+              is a buffer taken from ``pool``.
+    """
+    # pylint: disable=too-many-locals
+    from ._read import plan_read_v2
+
+    assert max_in_flight > 0
+    jobs = enumerate(jobs)
+    in_flight = {}  # type: Dict[Future, Tuple[int, ReadJob, Any]]
+    done = {}  # type: Dict[int, ReadResult]
+    queues = OrderedDict()  # type: Dict[Hashable, Deque[int]]
+    n_active = 0
+
+    def submit_next() -> bool:
+        seq_job = next(jobs, None)
+        if seq_job is None:
+            return False
+
+        seq, job = seq_job
+        queues.setdefault(job.group, deque()).append(seq)
+        in_flight[driver.open(job.band, ctx)] = (seq, job, None)
+        return True
+
+    def on_complete(fut: Future, seq: int, job: ReadJob, state: Any):
+        roi = None
+        try:
+            if state is None:  # open completed
+                rdr = fut.result()
+                read_args, finalise, roi = plan_read_v2(rdr, job.dst_gbox, job.resampling, job.dst_nodata,
+                                                        snap=job.snap, out=job.out, normalise=job.normalise,
+                                                        pool=pool)
+                nodata = job.dst_nodata if job.normalise or rdr.nodata is None else rdr.nodata
+                if read_args is not None:
+                    in_flight[rdr.read(*read_args)] = (seq, job, (finalise, roi, nodata))
+                    return
+                done[seq] = (job.group, None, roi, nodata, False)
+            else:  # read completed
+                finalise, roi, nodata = state
+                pix = finalise(fut.result())
+                done[seq] = (job.group, pix, roi, nodata, pool is not None and pool.owns(pix))
+        except Exception:  # pylint: disable=broad-except
+            if not skip_broken_datasets:
+                raise
+            if job.out is not None and state is not None:
+                # failed read might have left partial data in the output
+                job.out[state[1]] = job.dst_nodata
+            done[seq] = (job.group, None, None, None, False)
+
+    try:
+        while True:
+            while n_active < max_in_flight and submit_next():
+                n_active += 1
+
+            if not in_flight:
+                break
+
+            completed, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for fut in completed:
+                on_complete(fut, *in_flight.pop(fut))
+
+            for q in queues.values():
+                while q and q[0] in done:
+                    yield done.pop(q.popleft())
+                    n_active -= 1
+    finally:
+        for fut in in_flight:
+            fut.cancel()
+
+
 def xr_load(sources: XrDataArray,
             geobox: GeoBox,
             measurements: List[Measurement],
             driver: ReaderDriver,
             driver_ctx_prev: Optional[Any] = None,
-            skip_broken_datasets: bool = False) -> Tuple[XrDataset, Any]:
-    # pylint: disable=too-many-locals
-    from ._read import read_time_slice_v2
+            skip_broken_datasets: bool = False,
+            max_in_flight: int = 1) -> Tuple[XrDataset, Any]:
+    """
+    Load data from grouped datasets using reader driver.
 
+    :param sources: Grouped datasets as returned by ``Datacube.group_datasets``
+    :param geobox: Output geobox
+    :param measurements: Measurements to load
+    :param driver: Reader driver to use for opening and reading files
+    :param driver_ctx_prev: Load context from previous call to ``xr_load`` (if any)
+    :param skip_broken_datasets: Carry on in the face of adversity and failing reads.
+    :param max_in_flight: Maximum number of sources being opened/read concurrently,
+                          completed reads are fused into the output as soon as
+                          possible, but in the original source order within each
+                          output slice.
+
+    :returns: Loaded data and driver load context to pass to the next call
+    """
+    # pylint: disable=too-many-locals
     out = _allocate_storage(sources.coords, geobox, measurements)
 
     def all_groups() -> Iterator[Tuple[Measurement, int, List[BandInfo]]]:
         for idx, dss in np.ndenumerate(sources.values):
+            # datasets that do not overlap with the output are never opened
+            dss, _ = select_overlapping(dss, geobox)
             for m in measurements:
                 bbi = [BandInfo(ds, m.name) for ds in dss]
                 yield (m, idx, bbi)
@@ -137,24 +492,59 @@ def xr_load(sources: XrDataArray,
             yield from bbi
 
     groups = list(all_groups())
+    pool = get_default_buffer_pool()
     ctx = driver.new_load_context(just_bands(groups), driver_ctx_prev)
 
-    # TODO: run upto N concurrently
-    for m, idx, bbi in groups:
+    dsts = []
+    for m, idx, _ in groups:
         dst = out.data_vars[m.name].values[idx]
         dst[:] = m.nodata
-        resampling = m.get('resampling_method', 'nearest')
+        dsts.append(dst)
+
+    # With the default fuser the first source of every slice is read straight
+    # into the output, the rest are fused with nodata normalisation done as
+    # part of fusing. Sources are no longer submitted for reading once there
+    # are no missing pixels left in the output slice.
+    direct = [m.get('fuser', None) is None for m, _, _ in groups]
+    n_missing = [dst.size if ok else None for dst, ok in zip(dsts, direct)]
+
+    def all_jobs():
+        for gidx, (m, _, bbi) in enumerate(groups):
+            resampling = m.get('resampling_method', 'nearest')
+            snap = m.get('snap', None)
+            for i, band in enumerate(bbi):
+                if direct[gidx] and n_missing[gidx] <= 0:
+                    _LOG.debug('Output slice is full, skipping %d remaining sources', len(bbi) - i)
+                    break
+
+                if direct[gidx] and i == 0:
+                    yield ReadJob(gidx, band, geobox, resampling, m.nodata, snap, dsts[gidx], True)
+                else:
+                    yield ReadJob(gidx, band, geobox, resampling, m.nodata, snap, None, not direct[gidx])
+
+    n_seen = [0]*len(groups)
+    for gidx, pix, roi, pix_nodata, pooled in _pipelined_reads(all_jobs(), driver, ctx,
+                                                               max_in_flight=max_in_flight,
+                                                               skip_broken_datasets=skip_broken_datasets,
+                                                               pool=pool):
+        n_seen[gidx] += 1
+        if pix is None:
+            continue
+
+        m = groups[gidx][0]
         fuse_func = m.get('fuser', None)
+        dst = dsts[gidx]
 
-        for band in bbi:
-            rdr = driver.open(band, ctx).result()
+        if direct[gidx] and n_seen[gidx] == 1:
+            n_missing[gidx] -= _n_filled(dst, roi, m.nodata)
+            continue
 
-            pix, roi = read_time_slice_v2(rdr, geobox, resampling, m.nodata)
+        if fuse_func:
+            fuse_func(dst[roi], pix)
+        else:
+            n_missing[gidx] -= _default_fuser(dst[roi], pix, m.nodata, pix_nodata)
 
-            if pix is not None:
-                if fuse_func:
-                    fuse_func(dst[roi], pix)
-                else:
-                    _default_fuser(dst[roi], pix, m.nodata)
+        if pooled:
+            pool.release(pix)
 
     return out, ctx
@@ -1,10 +1,12 @@
 """ Dataset -> Raster
 """
+from math import ceil
+from types import SimpleNamespace
 from affine import Affine
 import numpy as np
-from typing import Tuple
+from typing import Tuple, Optional, Callable, Any
 
-from ..utils.math import is_almost_int, valid_mask
+from ..utils.math import is_almost_int, valid_mask, invalid_mask, dtype_is_float
 
 from ..utils.geometry import (
     roi_shape,
@@ -18,9 +20,37 @@ from ..utils.geometry import (
     compute_reproject_roi)
 
 from ..utils.geometry._warp import is_resampling_nn, Resampling, Nodata
+from ..utils.geometry.tools import box_overlap
+from ..drivers.datasource import GeoRasterReader
+from ..utils.buffers import BufferPool
 from ..utils.geometry import gbox as gbx
 
 
+class SnapPolicy(object):
+    """ Allow pasting of sources that are offset from the destination pixel grid
+    by a fraction of a pixel.
+
+    When translation between source and destination pixel grids is within
+    ``tolerance`` (in destination pixels) of a whole number of pixels, source
+    is treated as if it was aligned with destination grid, so it can be pasted
+    instead of resampled.
+
+    ``applied`` is set to ``True`` once snapping was used for any read.
+    """
+
+    def __init__(self, tolerance: float):
+        if not 0 <= tolerance <= 0.5:
+            raise ValueError('Snap tolerance should be in [0, 0.5] range, got {}'.format(tolerance))
+        self.tolerance = tolerance
+        self.applied = False
+
+    def __repr__(self) -> str:
+        return 'SnapPolicy<tolerance={}, applied={}>'.format(self.tolerance, self.applied)
+
+    def __dask_tokenize__(self):
+        return ('SnapPolicy', self.tolerance)
+
+
 def rdr_geobox(rdr) -> GeoBox:
     """ Construct GeoBox from opened dataset reader.
     """
@@ -63,11 +93,9 @@ def can_paste(rr, stol=1e-3, ttol=1e-2):
     if not all(is_almost_int(n, stol) for n in (nx, ny)):
         return False, "src_roi doesn't align for scale"
 
-    # TODO: probably need to deal with sub-pixel translation here, if we want
-    # to ignore sub-pixel translation and dst roi is 1 pixel bigger than src it
-    # should still be ok to paste after cropping dst roi by one pixel on the
-    # appropriate side. As it stands sub-pixel translation will be ignored only
-    # in some cases.
+    # NOTE: sub-pixel translation is ignored here only when it doesn't change
+    # the shape of the overlap region, see `snap_roi` for a way to paste
+    # with sub-pixel translation in all cases.
 
     # scaled down shape doesn't match dst shape
     s_shape = (int(ny), int(nx))
@@ -81,7 +109,31 @@ def can_paste(rr, stol=1e-3, ttol=1e-2):
     return True, None
 
 
-def pick_read_scale(scale: float, rdr=None, tol=1e-3):
+def rdr_overviews(rdr) -> Tuple[int, ...]:
+    """ Decimation factors of overview levels available in opened dataset reader.
+    """
+    return tuple(getattr(rdr, 'overviews', ()))
+
+
+def rdr_block_shape(rdr) -> Optional[Tuple[int, int]]:
+    """ Shape of internal blocks of opened dataset reader, ``None`` if unknown.
+    """
+    shape = getattr(rdr, 'block_shape', None)
+    return None if shape is None else tuple(shape)
+
+
+def overview_geobox(gbox: GeoBox, factor: int) -> GeoBox:
+    """ Exact geometry of the overview level with a given decimation factor.
+
+    Overview shape is rounded up, so when image size is not a multiple of
+    ``factor`` overview pixels are slightly smaller than ``factor`` times the
+    native pixel size.
+    """
+    return gbx.zoom_to(gbox, gbx.zoom_out(gbox, factor).shape)
+
+
+def pick_read_scale(scale: float, rdr=None, tol=1e-3,
+                    resampling: Resampling = 'nearest') -> int:
     assert scale > 0
     # First find nearest integer scale
     #    Scale down to nearest integer, unless we can scale up by less than tol
@@ -93,47 +145,221 @@ def pick_read_scale(scale: float, rdr=None, tol=1e-3):
     if scale < 1:
         return 1
 
+    if rdr is not None and not is_resampling_nn(resampling):
+        # Decimated read uses nearest neighbour, for other resampling methods
+        # read from the closest overview that is not coarser than requested
+        # and let warp do the rest.
+        shape = getattr(rdr, 'shape', None)
+        overviews = [ovr for ovr in rdr_overviews(rdr)
+                     if _overview_scale(ovr, shape) <= scale*(1 + tol)]
+        if overviews:
+            return max(overviews)
+
     if is_almost_int(scale, tol):
         scale = np.round(scale)
 
-    scale = int(scale)
+    return int(scale)
+
+
+def _overview_scale(factor: int, shape: Optional[Tuple[int, int]]) -> float:
+    """ Actual shrink factor of the overview level, can be a bit smaller than
+        ``factor`` due to rounding up of the overview image size.
+    """
+    if shape is None:
+        return factor
+    return min(n/ceil(n/factor) for n in shape)
+
+
+def snap_roi(rr, src_shape: Tuple[int, int], dst_shape: Tuple[int, int],
+             tolerance: float, stol=1e-3):
+    """ Treat source as aligned with destination pixel grid if it's off by no
+    more than ``tolerance`` of a destination pixel.
+
+    :param rr: Result of ``compute_reproject_roi(src_gbox, dst_gbox)``
+    :param src_shape: Shape of the source image
+    :param dst_shape: Shape of the destination image
+    :param tolerance: Maximum sub-pixel translation to ignore, in destination pixels
+
+    :returns: ``None`` if source is already aligned, or can not be snapped,
+              otherwise copy of ``rr`` with translation rounded to whole
+              pixels and ROIs recomputed for that.
+    """
+    if not rr.is_st or not is_almost_int(rr.scale, stol):
+        return None
+
+    (sx, _, tx,
+     _, sy, ty, *_) = rr.transform.linear  # src -> dst
+
+    if max(abs(np.round(t) - t) for t in (tx, ty)) > tolerance:
+        return None
+
+    if all(is_almost_int(t, 1e-6) for t in (tx, ty)):
+        return None
+
+    def snap_scale(s):
+        n = 1/abs(s)
+        return np.sign(s)/np.round(n) if is_almost_int(n, stol) else s
+
+    A = Affine(snap_scale(sx), 0, np.round(tx),
+               0, snap_scale(sy), np.round(ty))
+    roi_src, roi_dst = box_overlap(src_shape, dst_shape, ~A)
+
+    return SimpleNamespace(roi_src=roi_src,
+                           roi_dst=roi_dst,
+                           scale=rr.scale,
+                           scale2=rr.scale2,
+                           is_st=True,
+                           transform=SimpleNamespace(linear=A))
+
+
+def plan_paste(src_gbox: GeoBox, dst_gbox: GeoBox, resampling: Resampling = 'nearest',
+               snap: Optional[SnapPolicy] = None):
+    """ Decide how pixels of ``src_gbox`` would be read into ``dst_gbox``, without opening the source.
+
+    Same checks as :func:`read_time_slice` but ignoring overviews, so it can be used to
+    estimate the cost of a load from pixel grids recorded in the index.
+
+    :returns: ``(rr, paste_ok)``, where ``rr`` is reproject ROI (with ``snap`` applied
+              when that allows pasting) and ``paste_ok`` is ``True`` when the source can be
+              read and pasted, ``False`` when it has to be resampled
+    """
+    rr = compute_reproject_roi(src_gbox, dst_gbox)
+    if roi_is_empty(rr.roi_dst):
+        return rr, False
+
+    rr, paste_ok, _ = _decide_paste(rr, src_gbox.shape, dst_gbox.shape, resampling, snap)
+    return rr, paste_ok
+
+
+def _decide_paste(rr, src_shape, dst_shape, resampling: Resampling,
+                  snap: Optional[SnapPolicy] = None):
+    """ Decide whether source can be pasted, snapping it to destination grid when ``snap`` allows.
+
+    :returns: ``(rr, paste_ok, snapped)``, where ``rr`` is reproject ROI to use
+              (snapped copy when ``snapped`` is ``True``)
+    """
+    if snap is not None:
+        rr_snapped = snap_roi(rr, src_shape, dst_shape, snap.tolerance)
+        if rr_snapped is not None and can_paste(rr_snapped)[0]:
+            return rr_snapped, True, True
+
+    paste_ok, _ = can_paste(rr, ttol=0.9 if is_resampling_nn(resampling) else 0.01)
+    return rr, paste_ok, False
+
+
+def _pick_source(rdr, dst_gbox: GeoBox, resampling: Resampling,
+                 snap: Optional[SnapPolicy] = None):
+    """ Decide whether to read from native resolution or from one of the overviews.
+
+    :returns: ``(src_gbox, rr, scale, norm_read_args, paste_ok, snapped)``, where ``src_gbox`` is
+              the geometry of the image we read from (native or overview),
+              ``rr`` is reproject ROI between that and ``dst_gbox``, ``scale`` is
+              any further decimation to apply when reading,
+              ``norm_read_args(roi, shape)`` converts ``roi`` in ``src_gbox``
+              pixels into ``(window, out_shape)`` accepted by ``rdr.read``,
+              ``paste_ok`` is ``True`` when ``rr`` can be pasted and
+              ``snapped`` is ``True`` when sub-pixel translation was ignored
+              according to ``snap`` policy, ``rr`` can then be pasted.
+    """
+    src_gbox = rdr_geobox(rdr)
+    rr = compute_reproject_roi(src_gbox, dst_gbox)
+    scale = 1
+    ovr = 1
+    paste_ok, snapped = False, False
+
+    if not roi_is_empty(rr.roi_dst):
+        scale = pick_read_scale(rr.scale, rdr, resampling=resampling)
+
+        if scale > 1 and scale in rdr_overviews(rdr):
+            # Read overview pixels as they are, but use exact geometry of the
+            # overview image when deciding whether we can paste
+            ovr = scale
+            src_gbox = overview_geobox(src_gbox, ovr)
+            rr = compute_reproject_roi(src_gbox, dst_gbox)
+            scale = pick_read_scale(rr.scale)
+
+        rr, paste_ok, snapped = _decide_paste(rr, src_gbox.shape, dst_gbox.shape, resampling, snap)
+
+    (H, W), (h, w) = rdr.shape, src_gbox.shape
+    sy, sx = H/h, W/w
+
+    def norm_read_args(roi, shape):
+        if roi_is_full(roi, src_gbox.shape):
+            roi = None
+
+        if roi is None and shape == rdr.shape:
+            shape = None
+
+        if roi is not None and ovr > 1:
+            # Window into full resolution image, read with out_shape matching
+            # the overview makes GDAL copy overview pixels
+            ys, xs = roi
+            roi = (slice(ys.start*sy, ys.stop*sy),
+                   slice(xs.start*sx, xs.stop*sx))
+
+        return roi, shape
+
+    return src_gbox, rr, scale, norm_read_args, paste_ok, snapped
 
-    if rdr is not None:
-        # TODO: check available overviews in rdr
-        pass
 
-    return scale
+def _flip(pix: np.ndarray, sx: float, sy: float) -> np.ndarray:
+    if sx < 0:
+        pix = pix[:, ::-1]
+    if sy < 0:
+        pix = pix[::-1, :]
+    return pix
+
+
+def normalise_nodata(pix: np.ndarray, src_nodata: Nodata, dst_nodata: Nodata) -> np.ndarray:
+    """ Replace pixels that are missing according to ``src_nodata`` with ``dst_nodata`` in place.
+
+    Does nothing when both nodata values mark the same pixels, so it's cheap to
+    call when source and destination agree on nodata.
+    """
+    if src_nodata is None:
+        return pix
+
+    if dtype_is_float(pix.dtype):
+        # NaN pixels are always invalid, only skip when both are NaN
+        if np.isnan(src_nodata) and dst_nodata is not None and np.isnan(dst_nodata):
+            return pix
+    elif src_nodata == dst_nodata:
+        return pix
+
+    pix[invalid_mask(pix, src_nodata)] = dst_nodata
+    return pix
 
 
 def read_time_slice(rdr,
                     dst: np.ndarray,
                     dst_gbox: GeoBox,
                     resampling: Resampling,
-                    dst_nodata: Nodata) -> Tuple[slice, slice]:
+                    dst_nodata: Nodata,
+                    snap: Optional[SnapPolicy] = None) -> Tuple[slice, slice]:
     """ From opened reader object read into `dst`
 
+    Pixels of the affected region that are missing in the source are set to
+    ``dst_nodata``. When ``dst`` is of the same type as the source, pasted
+    pixels are read straight into it without any intermediate copies
+    (``rdr`` has to be a :class:`GeoRasterReader` for that).
+
+    :param snap: When supplied, sources that are offset from destination grid
+                 by less than ``snap.tolerance`` of a pixel are pasted rather
+                 than resampled
+
     :returns: affected destination region
     """
     assert dst.shape == dst_gbox.shape
-    src_gbox = rdr_geobox(rdr)
-
-    rr = compute_reproject_roi(src_gbox, dst_gbox)
+    src_gbox, rr, scale, read_args, paste_ok, snapped = _pick_source(rdr, dst_gbox, resampling, snap)
 
     if roi_is_empty(rr.roi_dst):
         return rr.roi_dst
 
-    is_nn = is_resampling_nn(resampling)
-    scale = pick_read_scale(rr.scale, rdr)
-
-    paste_ok, _ = can_paste(rr, ttol=0.9 if is_nn else 0.01)
+    if snapped:
+        snap.applied = True
 
     def norm_read_args(roi, shape):
-        if roi_is_full(roi, rdr.shape):
-            roi = None
-
-        if roi is None and shape == rdr.shape:
-            shape = None
-
+        roi, shape = read_args(roi, shape)
         return w_[roi], shape
 
     if paste_ok:
@@ -141,17 +367,22 @@ def read_time_slice(rdr,
         sx, sy = A.a, A.e
 
         dst = dst[rr.roi_dst]
-        pix = rdr.read(*norm_read_args(rr.roi_src, dst.shape))
-
-        if sx < 0:
-            pix = pix[:, ::-1]
-        if sy < 0:
-            pix = pix[::-1, :]
+        window, shape = norm_read_args(rr.roi_src, dst.shape)
 
-        if rdr.nodata is None:
-            np.copyto(dst, pix)
+        # duck-typed readers might not support `out=`
+        if isinstance(rdr, GeoRasterReader) and dst.dtype == rdr.dtype:
+            rdr.read(window, shape, out=_flip(dst, sx, sy))
+            normalise_nodata(dst, rdr.nodata, dst_nodata)
         else:
-            np.copyto(dst, pix, where=valid_mask(pix, rdr.nodata))
+            pix = _flip(rdr.read(window, shape), sx, sy)
+
+            if rdr.nodata is None:
+                np.copyto(dst, pix)
+            else:
+                # match the direct read above: missing pixels become dst_nodata
+                if dst_nodata is not None:
+                    dst.fill(dst_nodata)
+                np.copyto(dst, pix, where=valid_mask(pix, rdr.nodata))
     else:
         if rr.is_st:
             # add padding on src/dst ROIs, it was set to tight bounds
@@ -163,7 +394,7 @@ def read_time_slice(rdr,
         dst_gbox = dst_gbox[rr.roi_dst]
         src_gbox = src_gbox[rr.roi_src]
         if scale > 1:
-            src_gbox = gbx.zoom_out(src_gbox, scale)
+            src_gbox = overview_geobox(src_gbox, scale)
 
         pix = rdr.read(*norm_read_args(rr.roi_src, src_gbox.shape))
 
@@ -178,75 +409,146 @@ def read_time_slice(rdr,
     return rr.roi_dst
 
 
-def read_time_slice_v2(rdr,
-                       dst_gbox: GeoBox,
-                       resampling: Resampling,
-                       dst_nodata: Nodata) -> Tuple[np.ndarray,
-                                                    Tuple[slice, slice]]:
-    """ From opened reader object read into `dst`
-
-    :returns: pixels read and ROI of dst_gbox that was affected
+def plan_read_v2(rdr,
+                 dst_gbox: GeoBox,
+                 resampling: Resampling,
+                 dst_nodata: Nodata,
+                 snap: Optional[SnapPolicy] = None,
+                 out: Optional[np.ndarray] = None,
+                 normalise: bool = True,
+                 pool: Optional[BufferPool] = None) -> Tuple[Optional[Tuple[Any, ...]],
+                                                             Optional[Callable[[np.ndarray], np.ndarray]],
+                                                             Tuple[slice, slice]]:
+    """ Figure out what needs to be read from an opened reader without reading any pixels.
+
+    This is the first half of :func:`read_time_slice_v2`, split out so that
+    reads can be issued asynchronously and post-processed once they complete.
+
+    :param out: Optional array of ``dst_gbox.shape`` to place pixels into, only
+                ``roi_dst`` part of it is modified. When of the same type as
+                the source, pasted pixels are read straight into it.
+    :param normalise: When ``False`` missing pixels are left marked with the
+                      source nodata value (``rdr.nodata``, or ``dst_nodata`` if
+                      source has none) instead of ``dst_nodata``, so that
+                      normalisation can be combined with fusing by the caller.
+    :param pool: Take buffers for warped pixels from this pool instead of
+                 allocating new ones (only used when ``out`` is not supplied),
+                 caller should release returned pixels back to the pool.
+
+    :returns: ``(read_args, finalise, roi_dst)``, where ``read_args`` should be
+              passed to ``rdr.read(*read_args)``, and ``finalise`` converts
+              result of that read into pixels covering ``roi_dst`` of ``dst_gbox``
+              (a view into ``out`` when supplied).
+              When source doesn't overlap with destination ``read_args`` and
+              ``finalise`` are ``None``.
     """
     # pylint: disable=too-many-locals
-    src_gbox = rdr_geobox(rdr)
-
-    rr = compute_reproject_roi(src_gbox, dst_gbox)
+    src_gbox, rr, scale, norm_read_args, paste_ok, snapped = _pick_source(rdr, dst_gbox, resampling, snap)
 
     if roi_is_empty(rr.roi_dst):
-        return None, rr.roi_dst
-
-    is_nn = is_resampling_nn(resampling)
-    scale = pick_read_scale(rr.scale, rdr)
+        return None, None, rr.roi_dst
 
-    paste_ok, _ = can_paste(rr, ttol=0.9 if is_nn else 0.01)
-
-    def norm_read_args(roi, shape):
-        if roi_is_full(roi, rdr.shape):
-            roi = None
+    if snapped:
+        snap.applied = True
 
-        if roi is None and shape == rdr.shape:
-            shape = None
+    if normalise or rdr.nodata is None:
+        pix_nodata = dst_nodata
+    else:
+        pix_nodata = rdr.nodata
 
-        return roi, shape
+    dst = None if out is None else out[rr.roi_dst]
 
     if paste_ok:
         read_shape = roi_shape(rr.roi_dst)
         A = rr.transform.linear
         sx, sy = A.a, A.e
+        read_into = None
+
+        if dst is not None and dst.dtype == rdr.dtype:
+            read_into = _flip(dst, sx, sy)
+
+        def finalise_paste(pix: np.ndarray) -> np.ndarray:
+            if read_into is None:
+                pix = _flip(pix, sx, sy)
+            else:
+                pix = dst
+
+            normalise_nodata(pix, rdr.nodata, pix_nodata)
+
+            if dst is not None and read_into is None:
+                np.copyto(dst, pix)
+                return dst
+            return pix
+
+        read_args = norm_read_args(rr.roi_src, read_shape)
+        if read_into is not None:
+            read_args = (*read_args, read_into)
+
+        return read_args, finalise_paste, rr.roi_dst
+
+    if rr.is_st:
+        # add padding on src/dst ROIs, it was set to tight bounds
+        # TODO: this should probably happen inside compute_reproject_roi
+        rr.roi_dst = roi_pad(rr.roi_dst, 1, dst_gbox.shape)
+        rr.roi_src = roi_pad(rr.roi_src, 1, src_gbox.shape)
+
+    dst_gbox = dst_gbox[rr.roi_dst]
+    src_gbox = src_gbox[rr.roi_src]
+    if scale > 1:
+        src_gbox = overview_geobox(src_gbox, scale)
+
+    if dst is not None and dst.dtype != rdr.dtype:
+        dst = None
+
+    def finalise_warp(pix: np.ndarray) -> np.ndarray:
+        if dst is None:
+            if pool is None:
+                _dst = np.full(dst_gbox.shape, pix_nodata, dtype=rdr.dtype)
+            else:
+                _dst = pool.get(dst_gbox.shape, rdr.dtype, fill=pix_nodata)
+        else:
+            _dst = dst
+            _dst.fill(pix_nodata)
 
-        pix = rdr.read(*norm_read_args(rr.roi_src, read_shape)).result()
+        if rr.transform.linear is not None:
+            A = (~src_gbox.transform)*dst_gbox.transform
+            warp_affine(pix, _dst, A, resampling,
+                        src_nodata=rdr.nodata, dst_nodata=pix_nodata)
+        else:
+            rio_reproject(pix, _dst, src_gbox, dst_gbox, resampling,
+                          src_nodata=rdr.nodata, dst_nodata=pix_nodata)
 
-        if sx < 0:
-            pix = pix[:, ::-1]
-        if sy < 0:
-            pix = pix[::-1, :]
+        if out is not None and _dst is not dst:
+            _out = out[rr.roi_dst]
+            np.copyto(_out, _dst)
+            if pool is not None:
+                pool.release(_dst)
+            return _out
+        return _dst
 
-        # normalise nodata to be equal to `dst_nodata`
-        if rdr.nodata is not None and rdr.nodata != dst_nodata:
-            pix[pix == rdr.nodata] = dst_nodata
+    return norm_read_args(rr.roi_src, src_gbox.shape), finalise_warp, rr.roi_dst
 
-        dst = pix
-    else:
-        if rr.is_st:
-            # add padding on src/dst ROIs, it was set to tight bounds
-            # TODO: this should probably happen inside compute_reproject_roi
-            rr.roi_dst = roi_pad(rr.roi_dst, 1, dst_gbox.shape)
-            rr.roi_src = roi_pad(rr.roi_src, 1, src_gbox.shape)
 
-        dst_gbox = dst_gbox[rr.roi_dst]
-        src_gbox = src_gbox[rr.roi_src]
-        if scale > 1:
-            src_gbox = gbx.zoom_out(src_gbox, scale)
+def read_time_slice_v2(rdr,
+                       dst_gbox: GeoBox,
+                       resampling: Resampling,
+                       dst_nodata: Nodata,
+                       snap: Optional[SnapPolicy] = None,
+                       out: Optional[np.ndarray] = None,
+                       pool: Optional[BufferPool] = None) -> Tuple[Optional[np.ndarray],
+                                                                   Tuple[slice, slice]]:
+    """ From opened reader object read into `dst`
 
-        dst = np.full(dst_gbox.shape, dst_nodata, dtype=rdr.dtype)
-        pix = rdr.read(*norm_read_args(rr.roi_src, src_gbox.shape)).result()
+    :param out: Optional array of ``dst_gbox.shape`` to read into, only part of it
+                covered by the source is modified, see :func:`plan_read_v2`
+    :param pool: Buffer pool for warped pixels, see :func:`plan_read_v2`
 
-        if rr.transform.linear is not None:
-            A = (~src_gbox.transform)*dst_gbox.transform
-            warp_affine(pix, dst, A, resampling,
-                        src_nodata=rdr.nodata, dst_nodata=dst_nodata)
-        else:
-            rio_reproject(pix, dst, src_gbox, dst_gbox, resampling,
-                          src_nodata=rdr.nodata, dst_nodata=dst_nodata)
+    :returns: pixels read and ROI of dst_gbox that was affected
+    """
+    read_args, finalise, roi = plan_read_v2(rdr, dst_gbox, resampling, dst_nodata,
+                                            snap=snap, out=out, pool=pool)
+    if read_args is None:
+        return None, roi
 
-    return dst, rr.roi_dst
+    pix = rdr.read(*read_args).result()
+    return finalise(pix), roi
@@ -5,18 +5,19 @@ Driver implementation for Rasterio based reader.
 import logging
 import warnings
 import contextlib
+from collections import OrderedDict
 from contextlib import contextmanager
 from threading import RLock
 import numpy as np
 from affine import Affine
 import rasterio
 from urllib.parse import urlparse
-from typing import Optional, Iterator
+from typing import Optional, Iterator, Sequence, List, Dict, Tuple, Any
 
 from datacube.utils import geometry
 from datacube.utils.math import num2numpy
 from datacube.utils import uri_to_local_path, get_part_from_uri, is_vsipath
-from datacube.utils.rio import activate_from_config
+from datacube.utils.rio import activate_from_config, get_default_file_cache, RioFileCache
 from . import DataSource, GeoRasterReader, RasterShape, RasterWindow, BandInfo
 from ._hdf5 import HDF5_LOCK
 
@@ -36,6 +37,21 @@ def maybe_lock(lock):
     return lock
 
 
+def _read_band(source: rasterio.Band,
+               lock: Optional[RLock],
+               reads: Optional['_SharedBandReads'],
+               window: Optional[RasterWindow],
+               out_shape: Optional[RasterShape],
+               out: Optional[np.ndarray]) -> np.ndarray:
+    if reads is not None:
+        return reads.read(source.bidx, window=window, out_shape=out_shape, out=out)
+
+    with maybe_lock(lock):
+        if out is not None:
+            return source.ds.read(indexes=source.bidx, window=window, out=out)
+        return source.ds.read(indexes=source.bidx, window=window, out_shape=out_shape)
+
+
 class BandDataSource(GeoRasterReader):
     """
     Wrapper for a :class:`rasterio.Band` object
@@ -44,13 +60,15 @@ class BandDataSource(GeoRasterReader):
     """
 
     def __init__(self, source, nodata=None,
-                 lock: Optional[RLock] = None):
+                 lock: Optional[RLock] = None,
+                 reads: Optional['_SharedBandReads'] = None):
         self.source = source
         if nodata is None:
             nodata = self.source.ds.nodatavals[self.source.bidx-1]
 
         self._nodata = num2numpy(nodata, source.dtype)
         self._lock = lock
+        self._reads = reads
 
     @property
     def nodata(self):
@@ -72,12 +90,22 @@ class BandDataSource(GeoRasterReader):
     def shape(self) -> RasterShape:
         return self.source.shape
 
+    @property
+    def overviews(self) -> Sequence[int]:
+        with maybe_lock(self._lock):
+            return self.source.ds.overviews(self.source.bidx)
+
+    @property
+    def block_shape(self) -> Optional[RasterShape]:
+        with maybe_lock(self._lock):
+            return tuple(self.source.ds.block_shapes[self.source.bidx-1])
+
     def read(self, window: Optional[RasterWindow] = None,
-             out_shape: Optional[RasterShape] = None) -> Optional[np.ndarray]:
+             out_shape: Optional[RasterShape] = None,
+             out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
         """Read data in the native format, returning a numpy array
         """
-        with maybe_lock(self._lock):
-            return self.source.ds.read(indexes=self.source.bidx, window=window, out_shape=out_shape)
+        return _read_band(self.source, self._lock, self._reads, window, out_shape, out)
 
 
 class OverrideBandDataSource(GeoRasterReader):
@@ -94,12 +122,14 @@ class OverrideBandDataSource(GeoRasterReader):
                  nodata,
                  crs: geometry.CRS,
                  transform: Affine,
-                 lock: Optional[RLock] = None):
+                 lock: Optional[RLock] = None,
+                 reads: Optional['_SharedBandReads'] = None):
         self.source = source
         self._nodata = num2numpy(nodata, source.dtype)
         self._crs = crs
         self._transform = transform
         self._lock = lock
+        self._reads = reads
 
     @property
     def crs(self) -> geometry.CRS:
@@ -121,12 +151,22 @@ class OverrideBandDataSource(GeoRasterReader):
     def shape(self) -> RasterShape:
         return self.source.shape
 
+    @property
+    def overviews(self) -> Sequence[int]:
+        with maybe_lock(self._lock):
+            return self.source.ds.overviews(self.source.bidx)
+
+    @property
+    def block_shape(self) -> Optional[RasterShape]:
+        with maybe_lock(self._lock):
+            return tuple(self.source.ds.block_shapes[self.source.bidx-1])
+
     def read(self, window: Optional[RasterWindow] = None,
-             out_shape: Optional[RasterShape] = None) -> Optional[np.ndarray]:
+             out_shape: Optional[RasterShape] = None,
+             out: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
         """Read data in the native format, returning a native array
         """
-        with maybe_lock(self._lock):
-            return self.source.ds.read(indexes=self.source.bidx, window=window, out_shape=out_shape)
+        return _read_band(self.source, self._lock, self._reads, window, out_shape, out)
 
 
 class RasterioDataSource(DataSource):
@@ -135,10 +175,12 @@ class RasterioDataSource(DataSource):
 
     """
 
-    def __init__(self, filename, nodata, lock=None):
+    def __init__(self, filename, nodata, lock=None,
+                 file_cache: Optional[RioFileCache] = None):
         self.filename = filename
         self.nodata = nodata
         self._lock = lock
+        self._file_cache = file_cache
 
     def get_bandnumber(self, src):
         raise NotImplementedError()
@@ -149,74 +191,161 @@ class RasterioDataSource(DataSource):
     def get_crs(self):
         raise NotImplementedError()
 
+    @contextmanager
+    def _open_file(self):
+        cache = self._file_cache
+        if cache is None:
+            cache = get_default_file_cache()
+
+        if cache is None:
+            with rasterio.open(self.filename, sharing=False) as src:
+                yield src
+        else:
+            with cache.get(self.filename).use() as src:
+                yield src
+
     @contextmanager
     def open(self) -> Iterator[GeoRasterReader]:
         """Context manager which returns a :class:`BandDataSource`"""
+        with open_bands([self]) as (rdr,):
+            yield rdr
 
-        activate_from_config()  # check if settings changed and apply new
 
-        lock = self._lock
-        locked = False if lock is None else lock.acquire(blocking=True)
+class _SharedBandReads(object):
+    """ Read several bands of an open file in one go.
+
+    First request for a given window reads that window for all bands, the
+    rest are served from memory. Every band is handed out once per window.
+    """
+
+    def __init__(self, src, bidxs: Sequence[int], lock: Optional[RLock] = None):
+        self._src = src
+        self._bidxs = list(OrderedDict.fromkeys(bidxs))
+        self._lock = lock
+        self._cache = {}  # type: Dict[Tuple[Any, Any], Dict[int, np.ndarray]]
+
+    def read(self, bidx: int,
+             window: Optional[RasterWindow] = None,
+             out_shape: Optional[RasterShape] = None,
+             out: Optional[np.ndarray] = None) -> np.ndarray:
+        if out is not None:
+            out_shape = out.shape
+
+        key = (window, out_shape)
+        pix = self._cache.get(key, None)
+
+        if pix is None or bidx not in pix:
+            bidxs = self._bidxs
+            if out_shape is not None:
+                out_shape = (len(bidxs), *out_shape)
+
+            with maybe_lock(self._lock):
+                data = self._src.read(indexes=bidxs, window=window, out_shape=out_shape)
+
+            pix = self._cache[key] = dict(zip(bidxs, data))
+
+        if out is not None:
+            np.copyto(out, pix.pop(bidx))
+            return out
+
+        return pix.pop(bidx)
+
+
+@contextmanager
+def open_bands(sources: Sequence[RasterioDataSource]) -> Iterator[List[GeoRasterReader]]:
+    """ Open several bands stored in the same file at once.
+
+    The file is opened only once, and all bands are read with a single read
+    call when one of the returned band readers requests pixels.
+
+    :param sources: Data sources all pointing to the same file (``.filename``)
+    :returns: Context manager returning list of band readers, one per source
+    """
+    # pylint: disable=too-many-locals
+    assert len(sources) > 0
+    first = sources[0]
+    filename = first.filename
+    if any(s.filename != filename for s in sources):
+        raise ValueError("All sources must refer to the same file")
+
+    activate_from_config()  # check if settings changed and apply new
+
+    lock = first._lock  # pylint: disable=protected-access
+    locked = False if lock is None else lock.acquire(blocking=True)
+
+    try:
+        _LOG.debug("opening %s", filename)
+        with first._open_file() as src:  # pylint: disable=protected-access
+            override = False
+
+            transform = src.transform
+            if transform.is_identity:
+                override = True
+                transform = first.get_transform(src.shape)
+
+            try:
+                crs = _rasterio_crs(src)
+            except ValueError:
+                override = True
+                crs = first.get_crs()
+
+            bands = []
+            for source in sources:
+                band = rasterio.band(src, source.get_bandnumber(src))
+                nodata = src.nodatavals[band.bidx-1] if src.nodatavals[band.bidx-1] is not None else source.nodata
+                bands.append((band, num2numpy(nodata, band.dtype)))
 
-        try:
-            _LOG.debug("opening %s", self.filename)
-            with rasterio.open(self.filename, sharing=False) as src:
-                override = False
-
-                transform = src.transform
-                if transform.is_identity:
-                    override = True
-                    transform = self.get_transform(src.shape)
-
-                try:
-                    crs = _rasterio_crs(src)
-                except ValueError:
-                    override = True
-                    crs = self.get_crs()
-
-                bandnumber = self.get_bandnumber(src)
-                band = rasterio.band(src, bandnumber)
-                nodata = src.nodatavals[band.bidx-1] if src.nodatavals[band.bidx-1] is not None else self.nodata
-                nodata = num2numpy(nodata, band.dtype)
-
-                if locked:
-                    locked = False
-                    lock.release()
-
-                if override:
-                    warnings.warn(f"""Broken/missing geospatial data was found in file:
-"{self.filename}"
-Will use approximate metadata for backwards compatibility reasons (#673).
-This behaviour is deprecated. Future versions will raise an error.""",
-                                  category=DeprecationWarning)
-                    yield OverrideBandDataSource(band, nodata=nodata, crs=crs, transform=transform, lock=lock)
-                else:
-                    yield BandDataSource(band, nodata=nodata, lock=lock)
-
-        except Exception as e:
-            _LOG.error("Error opening source dataset: %s", self.filename)
-            raise e
-        finally:
             if locked:
+                locked = False
                 lock.release()
 
+            if override:
+                warnings.warn(f"""Broken/missing geospatial data was found in file:
+"{filename}"
+Will use approximate metadata for backwards compatibility reasons (#673).
+This behaviour is deprecated. Future versions will raise an error.""",
+                              category=DeprecationWarning)
+
+            reads = None
+            if len(bands) > 1:
+                reads = _SharedBandReads(src, [band.bidx for band, _ in bands], lock=lock)
+
+            if override:
+                yield [OverrideBandDataSource(band, nodata=nodata, crs=crs, transform=transform,
+                                              lock=lock, reads=reads)
+                       for band, nodata in bands]
+            else:
+                yield [BandDataSource(band, nodata=nodata, lock=lock, reads=reads)
+                       for band, nodata in bands]
+
+    except Exception as e:
+        _LOG.error("Error opening source dataset: %s", filename)
+        raise e
+    finally:
+        if locked:
+            lock.release()
+
 
 class RasterDatasetDataSource(RasterioDataSource):
     """Data source for reading from a Data Cube Dataset"""
 
-    def __init__(self, band: BandInfo):
+    def __init__(self, band: BandInfo,
+                 file_cache: Optional[RioFileCache] = None):
         """
         Initialise for reading from a Data Cube Dataset.
 
         :param dataset: dataset to read from
         :param measurement_id: measurement to read. a single 'band' or 'slice'
+        :param file_cache: Cache of open files to use, defaults to the one configured
+                           with :func:`datacube.utils.rio.set_default_file_cache`
         """
         self._band_info = band
         self._hdf = _is_hdf(band.format)
         self._part = get_part_from_uri(band.uri)
         filename = _url2rasterio(band.uri, band.format, band.layer)
         lock = HDF5_LOCK if self._hdf else None
-        super(RasterDatasetDataSource, self).__init__(filename, nodata=band.nodata, lock=lock)
+        super(RasterDatasetDataSource, self).__init__(filename, nodata=band.nodata, lock=lock,
+                                                      file_cache=file_cache)
 
     def get_bandnumber(self, src=None) -> Optional[int]:
 
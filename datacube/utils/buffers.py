@@ -0,0 +1,203 @@
+""" Pool of reusable scratch arrays
+"""
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Iterator, Tuple, Any, Dict, List
+
+import numpy as np
+
+BufferKey = Tuple[Tuple[int, ...], np.dtype]  # pylint: disable=invalid-name
+
+
+class _ThreadBuffers(object):
+    """ Per-thread free lists, never accessed from other threads except for stats.
+    """
+
+    def __init__(self):
+        self.free = OrderedDict()  # type: OrderedDict[BufferKey, List[np.ndarray]]
+        # buffers handed out and not yet released, by id, entries go away with the buffer
+        self.issued = weakref.WeakValueDictionary()  # type: weakref.WeakValueDictionary[int, np.ndarray]
+        self.nbytes = 0
+
+    def pop_oldest(self) -> int:
+        key, arrays = next(iter(self.free.items()))
+        a = arrays.pop()
+        if not arrays:
+            del self.free[key]
+        self.nbytes -= a.nbytes
+        return a.nbytes
+
+
+class BufferPool(object):
+    """ Thread-local pool of scratch arrays keyed by ``(shape, dtype)``.
+
+    Every thread gets its own set of free buffers, so buffers are handed out
+    without any locking. Released buffers are kept until there is more than
+    ``max_bytes`` of them in a given thread, least recently used shapes are
+    dropped first.
+
+    Buffers should only be released once they are no longer referenced
+    anywhere else, arrays that were not obtained from this pool by the calling
+    thread (including views of pool buffers) are ignored by :meth:`release`.
+    """
+
+    def __init__(self, max_bytes: int = 64*(1 << 20)):
+        if max_bytes < 0:
+            raise ValueError('max_bytes should be non-negative')
+
+        self._max_bytes = max_bytes
+        self._local = threading.local()
+        self._stores = weakref.WeakSet()  # type: weakref.WeakSet[_ThreadBuffers]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_bytes(self) -> int:
+        """ Maximum size of released buffers kept around, per thread """
+        return self._max_bytes
+
+    @property
+    def hit_rate(self) -> float:
+        """ Fraction of :meth:`get` calls that were served from the pool """
+        total = self.hits + self.misses
+        return self.hits/total if total > 0 else 0.0
+
+    @property
+    def bytes_held(self) -> int:
+        """ Total size of free buffers across all threads """
+        with self._lock:
+            return sum(s.nbytes for s in self._stores)
+
+    def _store(self) -> _ThreadBuffers:
+        store = getattr(self._local, 'store', None)
+        if store is None:
+            store = self._local.store = _ThreadBuffers()
+            with self._lock:
+                self._stores.add(store)
+        return store
+
+    def get(self, shape: Tuple[int, ...], dtype: Any, fill: Any = None) -> np.ndarray:
+        """ Get C-contiguous array of a given shape and type.
+
+        :param fill: Value to fill array with, content is undefined when ``None``
+        """
+        store = self._store()
+        key = (tuple(shape), np.dtype(dtype))
+        arrays = store.free.get(key, None)
+
+        if arrays:
+            a = arrays.pop()
+            if not arrays:
+                del store.free[key]
+            store.nbytes -= a.nbytes
+            hit = True
+        else:
+            a = np.empty(key[0], dtype=key[1])
+            hit = False
+
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        store.issued[id(a)] = a
+        if fill is not None:
+            a.fill(fill)
+        return a
+
+    def owns(self, a: Optional[np.ndarray]) -> bool:
+        """ Whether ``a`` was obtained with :meth:`get` by the calling thread and hasn't been released since.
+        """
+        if a is None:
+            return False
+        return self._store().issued.get(id(a), None) is a
+
+    def release(self, a: Optional[np.ndarray]) -> None:
+        """ Return buffer obtained with :meth:`get` back to the pool.
+        """
+        if not self.owns(a):
+            return
+
+        store = self._store()
+        del store.issued[id(a)]
+
+        if a.nbytes > self._max_bytes or not (a.flags.c_contiguous and a.flags.writeable):
+            return
+
+        key = (a.shape, a.dtype)
+        store.free.setdefault(key, []).append(a)
+        store.free.move_to_end(key)
+        store.nbytes += a.nbytes
+
+        while store.nbytes > self._max_bytes:
+            store.pop_oldest()
+
+    @contextmanager
+    def scratch(self, shape: Tuple[int, ...], dtype: Any, fill: Any = None) -> Iterator[np.ndarray]:
+        """ Borrow a buffer for the duration of the ``with`` block.
+        """
+        a = self.get(shape, dtype, fill=fill)
+        try:
+            yield a
+        finally:
+            self.release(a)
+
+    def clear(self) -> None:
+        """ Drop all free buffers of the calling thread and reset stats
+        """
+        store = self._store()
+        store.free.clear()
+        store.nbytes = 0
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(hits=self.hits,
+                    misses=self.misses,
+                    hit_rate=self.hit_rate,
+                    bytes_held=self.bytes_held)
+
+    def __repr__(self) -> str:
+        return 'BufferPool<held={}/{}, hits={}, misses={}>'.format(
+            self.bytes_held, self._max_bytes, self.hits, self.misses)
+
+
+_DEFAULT_POOL = BufferPool()  # type: Optional[BufferPool]
+
+
+def set_default_buffer_pool(pool: Optional[BufferPool]) -> Optional[BufferPool]:
+    """ Configure pool of scratch buffers used when loading data.
+
+    Pass ``None`` to always allocate new buffers instead.
+
+    :returns: Previously configured pool
+    """
+    global _DEFAULT_POOL  # pylint: disable=global-statement
+    prev, _DEFAULT_POOL = _DEFAULT_POOL, pool
+    return prev
+
+
+def get_default_buffer_pool() -> Optional[BufferPool]:
+    """ Get pool of scratch buffers configured with :func:`set_default_buffer_pool`
+    """
+    return _DEFAULT_POOL
+
+
+@contextmanager
+def scratch_buffer(shape: Tuple[int, ...], dtype: Any, fill: Any = None) -> Iterator[np.ndarray]:
+    """ Borrow a buffer from the default pool, or allocate a new one if pooling is disabled.
+    """
+    pool = _DEFAULT_POOL
+    if pool is None:
+        a = np.empty(shape, dtype=dtype)
+        if fill is not None:
+            a.fill(fill)
+        yield a
+    else:
+        with pool.scratch(shape, dtype, fill=fill) as a:
+            yield a
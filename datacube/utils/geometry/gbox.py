@@ -171,6 +171,15 @@ class GeoboxTiles():
                   for i, N, n in zip(idx, self._gbox.shape, self._tile_shape))
         return (ir, ic)
 
+    def roi(self, idx: Tuple[int, int]) -> Tuple[slice, slice]:
+        """ Region of the base GeoBox covered by a given tile.
+
+            :param idx: (row, col) index
+            :returns: (row slice, col slice) into the base GeoBox
+            :raises: IndexError when index is outside of [(0,0) -> .shape)
+        """
+        return self._idx_to_slice(idx)
+
     def chunk_shape(self, idx: Tuple[int, int]) -> Tuple[int, int]:
         """ Chunk shape for a given chunk index.
 
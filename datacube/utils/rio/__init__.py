@@ -11,6 +11,12 @@ from ._rio import (
     activate_from_config,
     configure_s3_access,
 )
+from ._cache import (
+    RioFileHandle,
+    RioFileCache,
+    set_default_file_cache,
+    get_default_file_cache,
+)
 
 __all__ = (
     'activate_rio_env',
@@ -19,4 +25,8 @@ __all__ = (
     'set_default_rio_config',
     'activate_from_config',
     'configure_s3_access',
+    'RioFileHandle',
+    'RioFileCache',
+    'set_default_file_cache',
+    'get_default_file_cache',
 )
@@ -0,0 +1,210 @@
+""" Cache of open rasterio file handles
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Iterator, List, Any
+
+import rasterio
+from rasterio.io import DatasetReader
+
+
+class RioFileHandle(object):
+    """ Lazily opened rasterio file that can be shared between threads.
+
+    GDAL file handles are not safe to use from several threads at the same
+    time, so every thread reading concurrently gets its own handle. Handles
+    are kept open for re-use once released. After :meth:`close` the file can
+    still be used, but it is then opened for every use and closed afterwards.
+    """
+
+    def __init__(self, uri: str, **open_args: Any):
+        self._uri = uri
+        self._open_args = open_args
+        self._idle = []  # type: List[DatasetReader]
+        self._closed = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.last_used = time.monotonic()
+
+    @property
+    def uri(self) -> str:
+        return self._uri
+
+    @property
+    def is_open(self) -> bool:
+        return len(self._idle) > 0
+
+    @contextmanager
+    def use(self) -> Iterator[DatasetReader]:
+        """ Get exclusive access to an opened file for the duration of the ``with`` block.
+
+        Nested use from the same thread gets the same file.
+        """
+        src = getattr(self._local, 'src', None)
+        if src is not None:
+            yield src
+            return
+
+        with self._lock:
+            src = self._idle.pop() if self._idle else None
+        if src is None:
+            src = rasterio.open(self._uri, 'r', sharing=False, **self._open_args)
+
+        self._local.src = src
+        try:
+            yield src
+        finally:
+            self._local.src = None
+            self.last_used = time.monotonic()
+            with self._lock:
+                keep = not self._closed
+                if keep:
+                    self._idle.append(src)
+            if not keep:
+                src.close()
+
+    def close(self) -> None:
+        """ Close files not in use and stop keeping files open, files in use are closed once released.
+
+        Does not wait for current users to finish.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+
+        for src in idle:
+            src.close()
+
+    def __repr__(self) -> str:
+        return 'RioFileHandle<uri={}, open={}>'.format(self._uri, self.is_open)
+
+
+class RioFileCache(object):
+    """ Bounded LRU cache of :class:`RioFileHandle` objects keyed by uri.
+
+    Safe to share between threads. Handles are evicted (closed) when there are
+    more than ``max_size`` of them, least recently accessed first, and when
+    they were not used for more than ``max_idle`` seconds.
+    """
+
+    def __init__(self,
+                 max_size: int = 64,
+                 max_idle: Optional[float] = 60.0,
+                 **open_args: Any):
+        if max_size < 1:
+            raise ValueError('max_size should be at least 1')
+
+        self._max_size = max_size
+        self._max_idle = max_idle
+        self._open_args = open_args
+        self._handles = OrderedDict()  # type: OrderedDict[str, RioFileHandle]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def max_idle(self) -> Optional[float]:
+        return self._max_idle
+
+    def get(self, uri: str) -> RioFileHandle:
+        """ Lookup handle for a given uri, creating new one if needed.
+
+        Returned handle is not opened until first use.
+        """
+        with self._lock:
+            h = self._handles.get(uri, None)
+            if h is not None:
+                self._handles.move_to_end(uri)
+                self.hits += 1
+            else:
+                h = RioFileHandle(uri, **self._open_args)
+                self._handles[uri] = h
+                self.misses += 1
+
+            evicted = self._pop_expired(keep=uri)
+
+        _close_all(evicted)
+        return h
+
+    def purge(self, max_idle: Optional[float] = None) -> int:
+        """ Close handles not used for more than ``max_idle`` seconds
+        (defaults to the cache setting).
+
+        :returns: Number of handles evicted
+        """
+        with self._lock:
+            evicted = self._pop_expired(max_idle=max_idle)
+
+        _close_all(evicted)
+        return len(evicted)
+
+    def clear(self) -> None:
+        """ Close and forget all handles
+        """
+        with self._lock:
+            evicted = list(self._handles.values())
+            self._handles.clear()
+
+        _close_all(evicted)
+
+    def _pop_expired(self,
+                     keep: Optional[str] = None,
+                     max_idle: Optional[float] = None) -> List[RioFileHandle]:
+        if max_idle is None:
+            max_idle = self._max_idle
+
+        evicted = []
+
+        if max_idle is not None:
+            t_cutoff = time.monotonic() - max_idle
+            for uri, h in list(self._handles.items()):
+                if uri != keep and h.last_used < t_cutoff:
+                    evicted.append(self._handles.pop(uri))
+
+        while len(self._handles) > self._max_size:
+            _, h = self._handles.popitem(last=False)
+            evicted.append(h)
+
+        return evicted
+
+    def __len__(self) -> int:
+        return len(self._handles)
+
+    def __contains__(self, uri: str) -> bool:
+        return uri in self._handles
+
+    def __repr__(self) -> str:
+        return 'RioFileCache<size={}/{}, hits={}, misses={}>'.format(
+            len(self), self._max_size, self.hits, self.misses)
+
+
+def _close_all(handles: List[RioFileHandle]) -> None:
+    for h in handles:
+        h.close()
+
+
+_DEFAULT_CACHE = None  # type: Optional[RioFileCache]
+
+
+def set_default_file_cache(cache: Optional[RioFileCache]) -> Optional[RioFileCache]:
+    """ Configure file handle cache used by default when reading data with rasterio.
+
+    Pass ``None`` to disable caching (this is the default).
+
+    :returns: Previously configured cache
+    """
+    global _DEFAULT_CACHE  # pylint: disable=global-statement
+    prev, _DEFAULT_CACHE = _DEFAULT_CACHE, cache
+    return prev
+
+
+def get_default_file_cache() -> Optional[RioFileCache]:
+    """ Get file handle cache configured with :func:`set_default_file_cache`
+    """
+    return _DEFAULT_CACHE
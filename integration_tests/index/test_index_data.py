@@ -249,6 +249,60 @@ def test_index_dataset_with_sources(index, default_metadata_type):
         index.datasets.add(child, sources_policy=p)
 
 
+def test_index_many_datasets_with_sources(index, default_metadata_type):
+    type_ = index.products.add_document(_pseudo_telemetry_dataset_type)
+
+    parent = Dataset(type_, _telemetry_dataset.copy(), None, sources={})
+    child_doc = _telemetry_dataset.copy()
+    child_doc['lineage'] = {'source_datasets': {'source': _telemetry_dataset}}
+    child_doc['id'] = '051a003f-5bba-43c7-b5f1-7f1da3ae9cfb'
+    child = Dataset(type_, child_doc, uris=['file:///a', 'file:///b'], sources={'source': parent})
+
+    with pytest.raises(MissingRecordError):
+        index.datasets.add_many([child], with_lineage=False)
+
+    failed = []
+    outcomes = index.datasets.add_many([child], with_lineage=False,
+                                       on_error=lambda ds, e: failed.append(ds.id))
+    assert outcomes == [(child, None)]
+    assert failed == [child.id]
+
+    outcomes = index.datasets.add_many([child, child])
+    assert outcomes == [(child, True), (child, False)]
+    assert index.datasets.get(parent.id)
+    assert index.datasets.get(child.id, include_sources=True).sources['source'].id == parent.id
+    assert index.datasets.get_locations(child.id) == ['file:///a', 'file:///b']
+    assert index.datasets.get_locations(parent.id) == []
+
+    assert index.datasets.add_many([parent, child]) == [(parent, False), (child, False)]
+
+    # nothing is added until the iterator is consumed
+    other_doc = dict(_telemetry_dataset, id='1d6f2d4b-61b0-4d97-9e47-0b0c0f5b1c3e')
+    other = Dataset(type_, other_doc, uris=['file:///c'], sources={})
+    it = index.datasets.add_many_iter([other])
+    assert not index.datasets.has(other.id)
+    assert list(it) == [(other, True)]
+    assert index.datasets.has(other.id)
+
+
+def test_index_many_datasets_in_chunks(index, default_metadata_type, monkeypatch):
+    from datacube.drivers.postgres import _api
+    # one row per statement
+    monkeypatch.setattr(_api, 'MAX_STATEMENT_PARAMS', 3)
+
+    type_ = index.products.add_document(_pseudo_telemetry_dataset_type)
+
+    parent = Dataset(type_, _telemetry_dataset.copy(), None, sources={})
+    child_doc = _telemetry_dataset.copy()
+    child_doc['lineage'] = {'source_datasets': {'source': _telemetry_dataset}}
+    child_doc['id'] = '051a003f-5bba-43c7-b5f1-7f1da3ae9cfb'
+    child = Dataset(type_, child_doc, uris=['file:///a', 'file:///b'], sources={'source': parent})
+
+    assert index.datasets.add_many([child, parent]) == [(child, True), (parent, True)]
+    assert index.datasets.get(child.id, include_sources=True).sources['source'].id == parent.id
+    assert index.datasets.get_locations(child.id) == ['file:///a', 'file:///b']
+
+
 @pytest.mark.parametrize('datacube_env_name', ('datacube', ), indirect=True)
 def test_index_dataset_with_location(index: Index, default_metadata_type: MetadataType):
     first_file = Path('/tmp/first/something.yaml').absolute()
@@ -6,15 +6,18 @@ import copy
 import csv
 import datetime
 import io
+import re
 import uuid
+from contextlib import contextmanager
 from decimal import Decimal
 from uuid import UUID
-from typing import List, Iterable, Dict, Any, Tuple
+from typing import List, Iterable, Iterator, Dict, Any, Tuple
 
 import pytest
 import yaml
 from dateutil import tz
 from psycopg2._range import NumericRange
+from sqlalchemy import event
 
 import datacube.scripts.cli_app
 import datacube.scripts.search_tool
@@ -28,6 +31,7 @@ from datacube.model import MetadataType
 from datacube.model import Range
 
 from datacube.testutils import load_dataset_definition
+from datacube.utils import geometry
 
 
 @pytest.fixture
@@ -422,6 +426,79 @@ def test_search_limit(index, pseudo_ls8_dataset, pseudo_ls8_dataset2):
     assert len(datasets) == 2
 
 
+def test_search_fetch_size(index, pseudo_ls8_dataset, pseudo_ls8_dataset2):
+    expected = {ds.id for ds in index.datasets.search()}
+    assert len(expected) == 2
+
+    # streamed through a server-side cursor, one row at a time
+    assert {ds.id for ds in index.datasets.search(fetch_size=1)} == expected
+    assert len(list(index.datasets.search(fetch_size=1, limit=1))) == 1
+    assert {r.id for r in index.datasets.search_returning(('id',), fetch_size=1)} == expected
+    assert {r['id'] for r in index.datasets.search_summaries(fetch_size=1)} == expected
+
+    # stopping early releases the connection
+    for _ in range(10):
+        next(index.datasets.search(fetch_size=1))
+    assert index.datasets.count() == 2
+
+
+def test_search_by_geopolygon(index: Index, pseudo_ls8_dataset: Dataset, ls5_dataset_w_children: Dataset) -> None:
+    product = ls5_dataset_w_children.type.name
+    datasets = index.datasets.search_eager(product=product, geopolygon=ls5_dataset_w_children.extent)
+    assert [ds.id for ds in datasets] == [ls5_dataset_w_children.id]
+
+    elsewhere = geometry.box(10, 10, 11, 11, crs='EPSG:4326')
+    assert index.datasets.search_eager(product=product, geopolygon=elsewhere) == []
+    assert index.datasets.count(product=product, geopolygon=elsewhere) == 0
+
+    # Datasets without a recorded footprint are never excluded
+    datasets = index.datasets.search_eager(platform='LANDSAT_8', geopolygon=elsewhere)
+    assert [ds.id for ds in datasets] == [pseudo_ls8_dataset.id]
+
+
+def test_search_without_footprint_column(index: Index, pseudo_ls8_dataset: Dataset,
+                                         ls5_dataset_w_children: Dataset) -> None:
+    # Databases that haven't been updated by `datacube system init` yet have no footprint column
+    index._db._engine.execute('alter table agdc.dataset drop column footprint')
+    index._db._has_footprint = None
+    assert not index._db.has_footprint
+
+    # geopolygon is not pushed down, the caller filters by extent
+    product = ls5_dataset_w_children.type.name
+    elsewhere = geometry.box(10, 10, 11, 11, crs='EPSG:4326')
+    datasets = index.datasets.search_eager(product=product, geopolygon=elsewhere)
+    assert [ds.id for ds in datasets] == [ls5_dataset_w_children.id]
+    assert index.datasets.count(product=product, geopolygon=elsewhere) == 1
+
+    # Datasets can still be indexed and updated
+    ds = Dataset(pseudo_ls8_dataset.type, dict(pseudo_ls8_dataset.metadata_doc, id=str(uuid.uuid4())),
+                 uris=pseudo_ls8_dataset.uris)
+    index.datasets.add(ds)
+    assert index.datasets.has(ds.id)
+    assert index.datasets.get(ds.id).id == ds.id
+
+
+def test_footprints_recorded_on_update(index: Index, ls5_dataset_w_children: Dataset) -> None:
+    index._db._engine.execute('alter table agdc.dataset drop column footprint')
+    index._db._has_footprint = None
+    assert not index._db.has_footprint
+
+    # Adds the column and records footprints of existing datasets from their lat/lon ranges
+    index.init_db()
+    assert index._db.has_footprint
+    missing = index._db._engine.execute(
+        'select count(*) from agdc.dataset where footprint is null and id = %s', str(ls5_dataset_w_children.id)
+    ).scalar()
+    assert missing == 0
+
+    product = ls5_dataset_w_children.type.name
+    datasets = index.datasets.search_eager(product=product, geopolygon=ls5_dataset_w_children.extent)
+    assert [ds.id for ds in datasets] == [ls5_dataset_w_children.id]
+
+    elsewhere = geometry.box(10, 10, 11, 11, crs='EPSG:4326')
+    assert index.datasets.search_eager(product=product, geopolygon=elsewhere) == []
+
+
 def test_search_or_expressions(index: Index,
                                pseudo_ls8_type: DatasetType,
                                pseudo_ls8_dataset: Dataset,
@@ -858,6 +935,75 @@ def test_count_time_groups(index: Index,
     ]
 
 
+@contextmanager
+def _dataset_statements(index: Index) -> Iterator[List[str]]:
+    """ Record SQL statements run against the dataset table """
+    statements = []  # type: List[str]
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if re.search(r'\bagdc\.dataset\b(?!_)', statement):
+            statements.append(statement)
+
+    engine = index._db._engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def test_count_and_search_multiple_products(index: Index,
+                                            pseudo_ls8_dataset: Dataset,
+                                            ls5_dataset_w_children: Dataset) -> None:
+    expected = {}
+    for product in index.products.get_all():
+        count = index.datasets.count(product=product.name)
+        if count:
+            expected[product] = count
+    assert len(expected) > 1
+
+    # All products are counted and searched with a single statement
+    with _dataset_statements(index) as statements:
+        assert dict(index.datasets.count_by_product()) == expected
+    assert len(statements) == 1
+    assert index.datasets.count() == sum(expected.values())
+
+    with _dataset_statements(index) as statements:
+        ids = {ds.id for ds in index.datasets.search()}
+    assert len(statements) == 1
+    assert len(ids) == sum(expected.values())
+    assert {r.id for r in index.datasets.search_returning(('id',))} == ids
+    assert len(list(index.datasets.search(limit=1))) == len(expected)
+
+    time = Range(datetime.datetime(1980, 1, 1, tzinfo=tz.tzutc()),
+                 datetime.datetime(2020, 1, 1, tzinfo=tz.tzutc()))
+    with _dataset_statements(index) as statements:
+        timelines = dict(index.datasets.count_by_product_through_time('10 years', time=time))
+    assert len(statements) == 1
+    assert set(timelines) == set(index.products.get_all())
+    for product, timeline in timelines.items():
+        assert [r.begin for r, _ in timeline] == [datetime.datetime(year, 1, 1, tzinfo=tz.tzutc())
+                                                  for year in (1980, 1990, 2000, 2010)]
+        assert sum(count for _, count in timeline) == expected.get(product, 0)
+
+
+def test_search_partial(index: Index, pseudo_ls8_dataset: Dataset, ls5_dataset_w_children: Dataset) -> None:
+    expected = {ds.id: ds for ds in index.datasets.search()}
+
+    datasets = list(index.datasets.search(partial=True))
+    assert {ds.id for ds in datasets} == set(expected)
+    for ds in datasets:
+        assert ds.type == expected[ds.id].type
+        assert ds.uris == expected[ds.id].uris
+        assert ds.time == expected[ds.id].time
+        assert ds.extent == expected[ds.id].extent
+        assert ds.measurements == expected[ds.id].measurements
+
+    # The rest of the document is fetched on access
+    for ds in datasets:
+        assert ds.metadata_doc == expected[ds.id].metadata_doc
+
+
 @pytest.mark.usefixtures('ga_metadata_type',
                          'indexed_ls5_scene_products')
 def test_source_filter(clirunner, index, example_ls5_dataset_path):
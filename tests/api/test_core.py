@@ -6,7 +6,7 @@ from types import SimpleNamespace
 import pytest
 
 from datacube.api.query import GroupBy
-from datacube.api.core import _calculate_chunk_sizes
+from datacube.api.core import _calculate_chunk_sizes, _LazyChunksLayer, _prefetch_map, sort_sources
 from datacube import Datacube
 from datacube.testutils.geom import AlbersGS
 from datacube.testutils import mk_sample_dataset
@@ -108,3 +108,102 @@ def test_dask_chunks():
 
     with pytest.raises(KeyError):
         _calculate_chunk_sizes(sources, geobox, {'zz': 1})
+
+
+def test_lazy_chunks_layer():
+    calls = []
+
+    def mk_task(idx):
+        calls.append(idx)
+        return (sum, list(idx)), [('dep', idx[0])]
+
+    def has_task(idx):
+        return idx != (1, 1)
+
+    layer = _LazyChunksLayer('aa', (1000, 2), mk_task, has_task=has_task)
+    assert layer.is_materialized() is False
+    assert calls == []
+
+    assert layer[('aa', 3, 1)] == (sum, [3, 1])
+    assert layer.get_dependencies(('aa', 3, 1), set()) == {('dep', 3)}
+    assert set(calls) == {(3, 1)}
+
+    assert ('aa', 0, 0) in layer
+    assert ('aa', 1, 1) not in layer
+    assert ('aa', 1000, 0) not in layer
+    assert ('bb', 0, 0) not in layer
+    assert 'aa' not in layer
+    with pytest.raises(KeyError):
+        layer[('aa', 0, 2)]
+    with pytest.raises(KeyError):
+        layer[('aa', 1, 1)]
+
+    # listing keys doesn't build tasks
+    calls.clear()
+    assert len(layer) == 1999
+    assert ('aa', 999, 1) in layer.get_output_keys()
+    assert ('aa', 1, 1) not in set(layer)
+    assert calls == []
+
+    # every chunk has a task by default
+    assert len(_LazyChunksLayer('bb', (3, 2), mk_task)) == 6
+
+
+def test_sort_sources():
+    from datacube.utils import geometry
+
+    geobox = AlbersGS.tile_geobox((0, 0))[:100, :100]
+    x0, y1, x1, y0 = geobox.extent.boundingbox
+    w = x1 - x0
+
+    def mk_ds(name, cc, x_shift):
+        extent = geometry.box(x0 + x_shift*w, y0, x1 + x_shift*w, y1, crs=geobox.crs)
+        return SimpleNamespace(name=name, extent=extent,
+                               metadata=SimpleNamespace(cloud_cover=cc))
+
+    dss = [mk_ds('a', 30, 0.5),
+           mk_ds('b', 10, 0.9),
+           mk_ds('c', None, 0),
+           mk_ds('d', 20, 0.5)]
+
+    def names(dss):
+        return ''.join(ds.name for ds in dss)
+
+    assert names(sort_sources(dss, None)) == 'abcd'
+    assert names(sort_sources(dss[:1], 'cloud_cover')) == 'a'
+    assert names(sort_sources(dss, 'cloud_cover')) == 'bdac'
+    assert names(sort_sources(dss, '-cloud_cover')) == 'adbc'
+    assert names(sort_sources(dss, 'no_such_field')) == 'abcd'
+    assert names(sort_sources(dss, 'coverage', geobox)) == 'cadb'
+    assert names(sort_sources(iter(dss), lambda ds: ds.name, geobox)) == 'abcd'
+
+    with pytest.raises(ValueError):
+        sort_sources(dss, 'coverage')
+
+    with pytest.raises(ValueError):
+        sort_sources(dss, 10)
+
+
+def test_prefetch_map():
+    started = []
+
+    def func(x):
+        started.append(x)
+        if x == 3:
+            raise ValueError(x)
+        return x*10
+
+    for prefetch in (0, 1, 2):
+        assert list(_prefetch_map(func, range(3), prefetch)) == [0, 10, 20]
+
+    started.clear()
+    it = _prefetch_map(func, range(10), 2)
+    assert started == []
+    assert next(it) == 0
+    assert len(started) <= 3
+    assert next(it) == 10
+    assert next(it) == 20
+    with pytest.raises(ValueError):
+        next(it)
+    assert list(it) == []
+    assert len(started) <= 6
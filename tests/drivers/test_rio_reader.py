@@ -171,6 +171,12 @@ def test_rio_driver_open(data_folder):
     assert xx.shape == src.shape
     assert xx.dtype == src.dtype
 
+    out = np.zeros((20, 40), dtype=src.dtype)
+    yy = src.read(np.s_[10:20, 30:70], out=out[10:, :]).result()
+    assert yy.base is out
+    np.testing.assert_array_equal(out[10:], xx[10:20, 30:70])
+    assert (out[:10] == 0).all()
+
     # check overrides
     bi = mk_band('b1', base, path="zeros_no_geo_int16_7x3.tif", format=GeoTIFF, nodata=None)
 
@@ -203,6 +209,100 @@ def test_rio_driver_open(data_folder):
     assert src.nodata == bi.nodata
 
 
+def test_rio_driver_file_cache(data_folder):
+    from datacube.utils.rio import RioFileCache
+    from datacube.storage._rio import RasterDatasetDataSource
+
+    base = "file://" + str(data_folder) + "/metadata.yml"
+    bands = [mk_band('b1', base, path="test.tif", format=GeoTIFF),
+             mk_band('b2', base, path="test.tif", format=GeoTIFF, band=2)]
+
+    rdr = mk_rio_driver()
+    ctx = rdr.new_load_context(iter(bands), None)
+    assert isinstance(ctx, RioFileCache)
+
+    for bi in bands:
+        src = rdr.open(bi, ctx).result()
+        assert src.read(np.s_[:2, :3]).result().shape == (2, 3)
+
+    assert len(ctx) == 1
+    assert (ctx.hits, ctx.misses) == (1, 1)
+
+    # context is re-used across loads
+    assert rdr.new_load_context(iter(bands), ctx) is ctx
+    rdr.open(bands[0], ctx).result()
+    assert (ctx.hits, ctx.misses) == (2, 1)
+
+    # reads still work after eviction
+    ctx.clear()
+    np.testing.assert_array_equal(src.read().result(),
+                                  rdr.open(bands[1], None).result().read().result())
+
+    # caching can be disabled or shared
+    rde = RDEntry()
+    assert rde.new_instance({'file_cache_size': 0}).new_load_context(iter([]), None) is None
+    cache = RioFileCache(max_size=3)
+    assert rde.new_instance({'file_cache': cache}).new_load_context(iter([]), None) is cache
+
+    # legacy data source can use the same cache
+    with RasterDatasetDataSource(bands[1], file_cache=cache).open() as rdr_legacy:
+        assert rdr_legacy.shape == (2000, 4000)
+        xx = rdr_legacy.read()
+    assert _rio_uri(bands[1]) in cache
+    np.testing.assert_array_equal(xx, src.read().result())
+
+
+def test_rio_driver_lazy_open(data_folder):
+    from datacube.utils.geometry import CRS
+    from datacube.utils.rio import RioFileCache
+    from datacube.drivers.rio._reader import IndexedRIOReader
+
+    base = "file://" + str(data_folder) + "/metadata.yml"
+    bi = mk_band('b1', base, path="test.tif", format=GeoTIFF, nodata=-999, dtype='int16')
+
+    rdr = RDEntry().new_instance({'lazy_open': True})
+    ctx = rdr.new_load_context(iter([bi]), None)
+    assert isinstance(ctx, RioFileCache)
+
+    # no grid in the index: file is opened
+    src = rdr.open(bi, ctx).result()
+    assert not isinstance(src, IndexedRIOReader)
+    expect = src.read().result()
+    assert len(ctx) == 1
+
+    with rasterio.open(str(data_folder) + "/test.tif") as f:
+        transform = f.transform
+
+    ctx.clear()
+    bi.grid_shape = (2000, 4000)
+    bi.grid_transform = transform
+    bi.crs = CRS('EPSG:4326')
+
+    fut = rdr.open(bi, ctx)
+    assert fut.done()
+    src = fut.result()
+    assert isinstance(src, IndexedRIOReader)
+    assert len(ctx) == 0
+
+    assert src.crs.epsg == 4326
+    assert src.transform == transform
+    assert src.shape == (2000, 4000)
+    assert src.nodata == -999
+    assert src.dtype == np.dtype(np.int16)
+    assert src.overviews == ()
+    assert src.block_shape is None
+
+    np.testing.assert_array_equal(src.read(np.s_[10:20, 30:70]).result(), expect[10:20, 30:70])
+    assert len(ctx) == 1
+
+    out = np.zeros((10, 40), dtype='int16')
+    assert src.read(np.s_[10:20, 30:70], out=out).result() is out
+    np.testing.assert_array_equal(out, expect[10:20, 30:70])
+
+    # lazy open is off by default
+    assert not isinstance(RDEntry().new_instance({}).open(bi, None).result(), IndexedRIOReader)
+
+
 def test_testutils_iodriver(data_folder):
     fpath = str(data_folder) + '/test.tif'
     src = open_reader(fpath)
@@ -1,17 +1,25 @@
 # coding=utf-8
 
 
+import copy
 import datetime
+import pickle
 from collections import namedtuple
 from contextlib import contextmanager
 from copy import deepcopy
 
+import numpy
 import pytest
+from sqlalchemy.exc import IntegrityError
 from uuid import UUID
 
-from datacube.index._datasets import DatasetResource
+from datacube.api.query import solar_day
+from datacube.index._datasets import DatasetResource, _lonlat_polygons, _partial_doc_keys, _DocumentFetcher
+from datacube.index._metadata_types import default_metadata_type_docs
 from datacube.index.exceptions import DuplicateRecordError
 from datacube.model import DatasetType, MetadataType, Dataset
+from datacube.model.fields import get_dataset_fields
+from datacube.utils import geometry
 from datacube.utils.changes import DocumentMismatchError
 
 _nbar_uuid = UUID('f2f12372-8366-11e5-817e-1040f381a756')
@@ -162,9 +170,13 @@ class MockIndex(object):
 
 
 class MockDb(object):
+    has_footprint = True
+
     def __init__(self):
         self.dataset = {}
         self.dataset_source = set()
+        self.dataset_location = []
+        self.metadata_fetches = []
 
     @contextmanager
     def begin(self):
@@ -177,16 +189,23 @@ class MockDb(object):
     def get_dataset(self, id):
         return self.dataset.get(id, None)
 
+    def get_datasets_metadata(self, ids):
+        self.metadata_fetches.append(list(ids))
+        return [(id_, deepcopy(self.dataset[id_].metadata)) for id_ in ids if id_ in self.dataset]
+
     def get_locations(self, dataset):
         return ['file:xxx']
 
     def datasets_intersection(self, ids):
         return [k for k in ids if k in self.dataset]
 
+    def contains_dataset(self, id_):
+        return id_ in self.dataset
+
     def insert_dataset_location(self, *args, **kwargs):
         return
 
-    def insert_dataset(self, metadata_doc, dataset_id, dataset_type_id):
+    def insert_dataset(self, metadata_doc, dataset_id, dataset_type_id, footprint=None):
         # Will we pretend this one was already ingested?
         if dataset_id in self.dataset:
             raise DuplicateRecordError('already ingested')
@@ -198,6 +217,21 @@ class MockDb(object):
     def insert_dataset_source(self, classifier, dataset_id, source_dataset_id):
         self.dataset_source.add((classifier, dataset_id, source_dataset_id))
 
+    def insert_datasets(self, rows):
+        inserted = set()
+        for metadata_doc, dataset_id, dataset_type_id, footprint in rows:
+            if dataset_id not in self.dataset:
+                self.insert_dataset(metadata_doc, dataset_id, dataset_type_id, footprint)
+                inserted.add(dataset_id)
+        return inserted
+
+    def insert_dataset_sources(self, edges):
+        for edge in edges:
+            self.insert_dataset_source(*edge)
+
+    def insert_dataset_locations(self, locations):
+        self.dataset_location.extend(locations)
+
 
 class MockTypesResource(object):
     def __init__(self, type_):
@@ -262,3 +296,127 @@ def test_index_two_levels_already_ingested():
     dataset = datasets.add(_EXAMPLE_NBAR_DATASET)
     assert len(mock_db.dataset) == 3
     assert len(mock_db.dataset_source) == 2
+
+
+def test_index_many():
+    mock_db = MockDb()
+    mock_types = MockTypesResource(_EXAMPLE_DATASET_TYPE)
+    datasets = DatasetResource(mock_db, mock_types)
+    ortho = _EXAMPLE_NBAR_DATASET.sources['ortho']
+
+    outcomes = datasets.add_many([ortho, _EXAMPLE_NBAR_DATASET, ortho], batch_size=2)
+    assert [(ds.id, is_new) for ds, is_new in outcomes] == [(_ortho_uuid, True),
+                                                            (_nbar_uuid, True),
+                                                            (_ortho_uuid, False)]
+    assert set(mock_db.dataset) == {_nbar_uuid, _ortho_uuid, _telemetry_uuid}
+    assert mock_db.dataset_source == {
+        ('ortho', _nbar_uuid, _ortho_uuid),
+        ('satellite_telemetry_data', _ortho_uuid, _telemetry_uuid)
+    }
+    # locations of top-level datasets only
+    assert mock_db.dataset_location == [(_ortho_uuid, 'file://test.zzz'),
+                                        (_nbar_uuid, 'file://test.zzz')]
+
+    outcomes = datasets.add_many([_EXAMPLE_NBAR_DATASET])
+    assert [is_new for _, is_new in outcomes] == [False]
+    assert len(mock_db.dataset) == 3
+
+    with pytest.raises(ValueError):
+        datasets.add_many([], batch_size=0)
+
+
+def test_index_many_integrity_error():
+    class FailingDb(MockDb):
+        def insert_datasets(self, rows):
+            raise IntegrityError('INSERT', {}, Exception('constraint violation'))
+
+    mock_db = FailingDb()
+    datasets = DatasetResource(mock_db, MockTypesResource(_EXAMPLE_DATASET_TYPE))
+
+    with pytest.raises(IntegrityError):
+        datasets.add_many([_EXAMPLE_NBAR_DATASET])
+    assert mock_db.dataset == {}
+
+    # failed batch is retried one dataset at a time
+    failed = []
+    outcomes = datasets.add_many([_EXAMPLE_NBAR_DATASET], on_error=lambda ds, e: failed.append(ds.id))
+    assert [(ds.id, is_new) for ds, is_new in outcomes] == [(_nbar_uuid, True)]
+    assert failed == []
+    assert set(mock_db.dataset) == {_nbar_uuid, _ortho_uuid, _telemetry_uuid}
+
+
+def test_lonlat_polygons():
+    box = geometry.box(140, -36, 141, -35, crs='EPSG:4326')
+    polygons = _lonlat_polygons(box)
+    assert len(polygons) == 1
+    assert {(round(x), round(y)) for x, y in polygons[0]} == {(140, -36), (141, -36), (141, -35), (140, -35)}
+
+    other = geometry.box(150, -36, 151, -35, crs='EPSG:4326')
+    multi = geometry.multipolygon([[box.exterior.points], [other.exterior.points]], crs='EPSG:4326')
+    assert len(_lonlat_polygons(multi)) == 2
+
+    # Can't be represented without wrapping the antimeridian, so no pre-filtering is done
+    assert _lonlat_polygons(geometry.box(-179, -10, 179, 10, crs='EPSG:4326')) is None
+
+
+def test_partial_documents():
+    mock_db = MockDb()
+    datasets = DatasetResource(mock_db, MockTypesResource(_EXAMPLE_DATASET_TYPE))
+    datasets.add(_EXAMPLE_NBAR_DATASET)
+
+    keys = _partial_doc_keys(_EXAMPLE_METADATA_TYPE)
+    assert keys == {'id', 'image', 'driver_data', 'grids'}
+
+    fetcher = _DocumentFetcher(mock_db, keys, batch_size=2)
+    records = list(mock_db.dataset.values())
+    docs = [fetcher.document(r.id, {k: v for k, v in r.metadata.items() if k in keys}) for r in records]
+
+    ds = Dataset(_EXAMPLE_DATASET_TYPE, docs[0])
+    assert ds.id == records[0].id
+    assert ds.measurements == Dataset(_EXAMPLE_DATASET_TYPE, records[0].metadata).measurements
+    assert 'grids' not in docs[0]
+    assert ds.key_time is None
+    assert mock_db.metadata_fetches == []
+
+    # Anything else fetches whole documents, a batch at a time
+    assert dict(docs[0]) == records[0].metadata
+    assert mock_db.metadata_fetches == [[records[0].id, records[1].id]]
+    assert docs[1]['lineage'] == records[1].metadata['lineage']
+    assert len(mock_db.metadata_fetches) == 1
+
+    # Copies are plain documents
+    assert copy.deepcopy(docs[2]) == records[2].metadata
+    assert type(copy.deepcopy(docs[2])) is dict
+    assert mock_db.metadata_fetches[-1] == [records[2].id]
+
+    # So are pickled ones, the fetcher can't be sent to other processes
+    docs = [fetcher.document(r.id, {k: v for k, v in r.metadata.items() if k in keys}) for r in records]
+    assert type(pickle.loads(pickle.dumps(docs[0]))) is dict
+    assert pickle.loads(pickle.dumps(docs[0])) == records[0].metadata
+    assert mock_db.metadata_fetches[-1] == [records[0].id, records[1].id]
+
+
+def test_partial_documents_solar_day():
+    eo3 = next(doc for doc in default_metadata_type_docs() if doc['name'] == 'eo3')
+    metadata_type = MetadataType(eo3, dataset_search_fields=get_dataset_fields(eo3))
+    product = DatasetType(metadata_type, {'name': 'eo3_test', 'description': "",
+                                          'metadata_type': 'eo3', 'metadata': {}})
+    doc = {
+        'id': str(_nbar_uuid),
+        'properties': {'datetime': '2014-01-26T02:05:23', 'odc:file_format': 'GeoTIFF'},
+        'extent': {'lon': {'begin': 116.58121, 'end': 118.96145},
+                   'lat': {'begin': -28.49412, 'end': -26.36025}},
+        'measurements': {'red': {'path': 'red.tif'}},
+        'lineage': {'source_datasets': {}},
+    }
+
+    keys = _partial_doc_keys(metadata_type)
+    assert keys == {'id', 'properties', 'extent', 'measurements', 'grid_spatial', 'driver_data', 'grids'}
+
+    mock_db = MockDb()
+    fetcher = _DocumentFetcher(mock_db, keys)
+    ds = Dataset(product, fetcher.document(_nbar_uuid, {k: v for k, v in doc.items() if k in keys}))
+
+    # Grouping by solar day only needs the time and lat/lon sections
+    assert solar_day(ds) == numpy.datetime64('2014-01-26', 'D')
+    assert mock_db.metadata_fetches == []
@@ -64,3 +64,31 @@ def test_band_info():
     ds.uris = None
     with pytest.raises(ValueError):
         BandInfo(ds, 'a')
+
+
+def test_band_info_grid():
+    from affine import Affine
+
+    bands = [dict(name=n, dtype='uint8', units='K', nodata=33, path=n+'.tiff')
+             for n in 'a b c'.split(' ')]
+    ds = mk_sample_dataset(bands,
+                           uri='file:///tmp/datataset.yml',
+                           format='GeoTIFF')
+    assert BandInfo(ds, 'a').grid_shape is None
+    assert BandInfo(ds, 'a').grid_transform is None
+
+    ds.metadata_doc['grids'] = {'default': {'shape': [100, 200],
+                                            'transform': [10, 0, 1000, 0, -10, 2000, 0, 0, 1]},
+                                'g20': {'shape': [50, 100],
+                                        'transform': [20, 0, 1000, 0, -20, 2000]},
+                                'broken': {'shape': [1, 1]}}
+    ds.metadata_doc['image']['bands']['b']['grid'] = 'g20'
+    ds.metadata_doc['image']['bands']['c']['grid'] = 'broken'
+
+    a, b, c = [BandInfo(ds, n) for n in 'abc']
+    assert a.grid_shape == (100, 200)
+    assert a.grid_transform == Affine(10, 0, 1000, 0, -10, 2000)
+    assert b.grid_shape == (50, 100)
+    assert b.grid_transform == Affine(20, 0, 1000, 0, -20, 2000)
+    assert c.grid_shape is None
+    assert c.grid_transform is None
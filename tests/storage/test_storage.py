@@ -12,10 +12,12 @@ from datacube.model import Dataset, DatasetType, MetadataType
 from datacube.testutils.io import RasterFileDataSource
 from datacube.storage import BandInfo
 from datacube.drivers.netcdf import create_netcdf_storage_unit, Variable
-from datacube.storage import reproject_and_fuse
+from datacube.storage import reproject_and_fuse, GeoRasterReader
+from datacube.storage._load import reproject_and_fuse_bands
 from datacube.storage._rio import RasterDatasetDataSource, _url2rasterio
 from datacube.storage._read import read_time_slice
 from datacube.utils.geometry import GeoBox
+from datacube.utils.buffers import BufferPool, set_default_buffer_pool
 
 from datacube.testutils.geom import epsg4326, epsg3577
 
@@ -96,6 +98,28 @@ def test_mixed_result_when_first_source_partially_empty():
     assert (output_data == [[1, 1], [2, 2]]).all()
 
 
+def test_reproject_and_fuse_reuses_buffers():
+    crs = epsg4326
+    shape = (2, 2)
+    no_data = -1
+
+    source1 = FakeDatasetSource([[1, 1], [no_data, no_data]], crs=crs)
+    source2 = FakeDatasetSource([[2, 2], [2, 2]], crs=crs)
+
+    pool = BufferPool()
+    prev = set_default_buffer_pool(pool)
+    try:
+        for _ in range(3):
+            output_data = np.full(shape, fill_value=no_data, dtype='int16')
+            reproject_and_fuse([source1, source2], output_data, mk_gbox(shape, crs=crs), dst_nodata=no_data)
+            assert (output_data == [[1, 1], [2, 2]]).all()
+    finally:
+        set_default_buffer_pool(prev)
+
+    assert (pool.hits, pool.misses) == (2, 1)
+    assert pool.bytes_held == output_data.nbytes
+
+
 def test_when_input_empty():
     shape = (2, 2)
     no_data = -1
@@ -194,6 +218,48 @@ def test_read_from_broken_source():
     assert (output_data == [[2, 2], [2, 2]]).all()
 
 
+class PartlyFailingBandDataSource(GeoRasterReader):
+    """ Reads some pixels into ``out`` before failing """
+    crs = epsg4326
+    transform = Affine.identity()
+    dtype = np.dtype('int16')
+    shape = (2, 2)
+    nodata = -999
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def read(self, window=None, out_shape=None, out=None):
+        out[-1, :] = 1
+        raise OSError('Read failed part way')
+
+
+def test_read_from_source_failing_part_way():
+    crs = epsg4326
+    shape = (2, 2)
+    no_data = -1
+
+    broken = FakeDatasetSource(value=None, crs=crs, band_source_class=PartlyFailingBandDataSource)
+    # only covers the first row
+    source2 = FakeDatasetSource(value=[[2, 2]], shape=(1, 2), crs=crs)
+
+    gbox = mk_gbox(shape, crs=crs)
+
+    for sources in ([broken], [broken, source2]):
+        output_data = np.full(shape, fill_value=no_data, dtype='int16')
+        reproject_and_fuse(sources, output_data, gbox, dst_nodata=no_data,
+                           skip_broken_datasets=True)
+        assert (output_data[-1] == no_data).all()
+
+        output_data = np.full(shape, fill_value=no_data, dtype='int16')
+        reproject_and_fuse_bands([[source] for source in sources], [output_data], gbox,
+                                 dst_nodata=[no_data], resampling=['nearest'], fuse_func=[None],
+                                 skip_broken_datasets=True)
+        assert (output_data[-1] == no_data).all()
+
+    assert (output_data == [[2, 2], [no_data, no_data]]).all()
+
+
 class FakeDataSource(object):
     def __init__(self):
         self.crs = epsg4326
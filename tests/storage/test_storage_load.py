@@ -2,13 +2,16 @@
 """
 
 import numpy as np
+from pathlib import Path
+from types import SimpleNamespace
 
 from datacube.storage._load import (
     xr_load, _default_fuser
 )
 
 from datacube.api.core import Datacube
-from datacube.testutils import mk_sample_dataset
+from datacube.drivers.rio._reader import RDEntry
+from datacube.testutils import mk_sample_dataset, mk_test_image, gen_tiff_dataset
 from datacube.testutils.io import rio_slurp
 from datacube.testutils.iodriver import mk_rio_driver, tee_new_load_context
 
@@ -38,6 +41,17 @@ def test_default_fuser():
     _default_fuser(dest, src1, None)
     assert np.all(dest == src1)
 
+    # un-normalised source nodata is skipped when fusing
+    dest = np.full((2, 2), -1)
+    _default_fuser(dest, np.array([[0, -7], [-7, 6]]), -1, -7)
+    assert np.all(dest == [[0, -1], [-1, 6]])
+    _default_fuser(dest, np.array([[1, 2], [-7, 3]]), -1, -7)
+    assert np.all(dest == [[0, 2], [-1, 6]])
+
+    dest = np.full((2, 2), -1.0)
+    _default_fuser(dest, np.array([[np.nan, 2.0], [-7, 3.0]]), -1.0, -7)
+    assert np.all(dest == [[-1, 2], [-1, 3]])
+
 
 def test_new_xr_load(data_folder):
     base = "file://" + str(data_folder) + "/metadata.yml"
@@ -77,3 +91,121 @@ def test_new_xr_load(data_folder):
 
     np.testing.assert_array_equal(im[0], xx.a.values[0])
     np.testing.assert_array_equal(im[1], xx.b.values[0])
+
+
+def test_xr_load_pipelined(tmpdir):
+    tmpdir = Path(str(tmpdir))
+    spatial = dict(resolution=(15, -15),
+                   offset=(11230, 1381110),)
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+    bb = np.full_like(aa, 3)
+
+    dss = []
+    for i, values in enumerate([aa, bb, aa, bb]):
+        bands = [SimpleNamespace(name=name, values=values, nodata=nodata)
+                 for name in ['a', 'b']]
+        ds, gbox = gen_tiff_dataset(bands, tmpdir,
+                                    prefix='ds{}-'.format(i),
+                                    timestamp='2018-07-{}'.format(19 + i//2),
+                                    **spatial)
+        dss.append(ds)
+
+    sources = Datacube.group_datasets(dss, 'time')
+    assert sources.shape == (2,)
+    measurements = [dss[0].type.measurements[n] for n in ('a', 'b')]
+
+    fuse_order = {}
+
+    def recording_fuser(dst, src):
+        # only order within the same output slice is guaranteed
+        fuse_order.setdefault(dst.ctypes.data, []).append(int(src.max()))
+        _default_fuser(dst, src, nodata)
+
+    measurements[1]['fuser'] = recording_fuser
+
+    rdr = RDEntry().new_instance({'max_workers': 4})
+    expect, _ = xr_load(sources, gbox, measurements, rdr)
+    assert list(fuse_order.values()) == [[aa.max(), 3]]*2
+
+    for max_in_flight in (2, 4, 100):
+        fuse_order.clear()
+        xx, _ = xr_load(sources, gbox, measurements, rdr, max_in_flight=max_in_flight)
+        np.testing.assert_array_equal(expect.a.values, xx.a.values)
+        np.testing.assert_array_equal(expect.b.values, xx.b.values)
+        # source order within output slice must be preserved
+        assert list(fuse_order.values()) == [[aa.max(), 3]]*2
+
+    # first valid pixel wins
+    np.testing.assert_array_equal(expect.a.values[0], np.where(aa == nodata, 3, aa))
+
+    # broken datasets are skipped when requested
+    (tmpdir/'ds0-a.tiff').unlink()
+    xx, _ = xr_load(sources, gbox, measurements, rdr,
+                    skip_broken_datasets=True, max_in_flight=3)
+    np.testing.assert_array_equal(xx.a.values[0], bb)
+
+
+def test_xr_load_early_stop(tmpdir, monkeypatch):
+    import rasterio
+
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+
+    dss = []
+    for i, values in enumerate([aa, np.full_like(aa, 3), np.full_like(aa, 5)]):
+        ds, gbox = gen_tiff_dataset(SimpleNamespace(name='a', values=values, nodata=nodata),
+                                    tmpdir,
+                                    prefix='ds{}-'.format(i),
+                                    timestamp='2018-07-19')
+        dss.append(ds)
+
+    n_opens = 0
+    rio_open = rasterio.open
+
+    def counting_open(*args, **kw):
+        nonlocal n_opens
+        n_opens += 1
+        return rio_open(*args, **kw)
+
+    monkeypatch.setattr(rasterio, 'open', counting_open)
+
+    sources = Datacube.group_datasets(dss, 'time')
+    mm = [dss[0].type.measurements['a']]
+    rdr = RDEntry().new_instance({})
+
+    xx, _ = xr_load(sources, gbox, mm, rdr)
+    assert n_opens == 2
+    np.testing.assert_array_equal(xx.a.values[0], np.where(aa == nodata, 3, aa))
+
+
+def test_select_overlapping():
+    from datacube.storage._load import select_overlapping
+    from datacube.utils import geometry
+    from datacube.utils.geometry import gbox as gbx
+    from datacube.testutils.geom import AlbersGS
+
+    gbox = AlbersGS.tile_geobox((0, 0))[:100, :100]
+    assert gbox.resolution == (-25, 25)
+
+    def mk_ds(name, dx, extent=True):
+        if not extent:
+            return SimpleNamespace(name=name, extent=None)
+        return SimpleNamespace(name=name, extent=gbx.translate_pix(gbox, dx, 0).extent)
+
+    dss = [mk_ds('a', 0),
+           mk_ds('b', 150),
+           mk_ds('c', -100.5),  # within a pixel of the edge
+           mk_ds('d', 0, extent=False),
+           mk_ds('e', -99)]
+
+    overlapping, skipped = select_overlapping(dss, gbox)
+    assert [ds.name for ds in overlapping] == ['a', 'c', 'd', 'e']
+    assert [ds.name for ds in skipped] == ['b']
+
+    # footprints are compared in the output CRS
+    gbox_4326 = geometry.GeoBox.from_geopolygon(gbox.extent.to_crs('EPSG:4326'),
+                                                resolution=(-0.0002, 0.0002))
+    overlapping, skipped = select_overlapping(dss, gbox_4326)
+    assert [ds.name for ds in skipped] == ['b']
@@ -6,6 +6,11 @@ from datacube.storage._read import (
     read_time_slice,
     read_time_slice_v2,
     pick_read_scale,
+    overview_geobox,
+    plan_read_v2,
+    snap_roi,
+    SnapPolicy,
+    rdr_block_shape,
     rdr_geobox)
 
 from datacube.testutils.io import RasterFileDataSource
@@ -35,6 +40,24 @@ def test_pick_read_scale():
     assert pick_read_scale(1.99999) == 2
 
 
+def test_pick_read_scale_overviews():
+    from types import SimpleNamespace
+    rdr = SimpleNamespace(overviews=[2, 4])
+
+    assert pick_read_scale(5.3, rdr) == 5
+    assert pick_read_scale(5.3, rdr, resampling='average') == 4
+    assert pick_read_scale(3.1, rdr, resampling='bilinear') == 2
+    assert pick_read_scale(1.5, rdr, resampling='average') == 1
+    assert pick_read_scale(3.99999, rdr, resampling='average') == 4
+    assert pick_read_scale(5.3, SimpleNamespace(), resampling='average') == 5
+
+    gbox = AlbersGS.tile_geobox((17, -40))[:130, :250]
+    ovr = overview_geobox(gbox, 4)
+    assert ovr.shape == (33, 63)
+    assert ovr.extent == gbox.extent
+    assert overview_geobox(gbox[:128, :248], 4) == gbx.zoom_out(gbox[:128, :248], 4)
+
+
 def test_can_paste():
     src = AlbersGS.tile_geobox((17, -40))
 
@@ -212,6 +235,54 @@ def test_read_with_reproject(tmpdir):
     assert nvalid > nempty
 
 
+def test_read_paste_dtype_mismatch(tmpdir):
+    from datacube.testutils import mk_test_image
+    from datacube.testutils.io import write_gtiff
+    from pathlib import Path
+
+    pp = Path(str(tmpdir))
+
+    xx = mk_test_image(128, 64, nodata=-999)
+    mm = write_gtiff(pp/'tst-read-paste-nodata-128x64-int16.tif', xx, nodata=-999)
+
+    with RasterFileDataSource(mm.path, 1).open() as rdr:
+        # float32 destination can't be read into directly, pasting goes through a copy
+        yy = np.full(mm.gbox.shape, 7, dtype='float32')
+        roi = read_time_slice(rdr, yy, mm.gbox, 'nearest', np.nan)
+
+    assert roi == np.s_[0:64, 0:128]
+    missing = xx == -999
+    assert missing.any()
+    assert np.isnan(yy[missing]).all()
+    np.testing.assert_array_equal(xx[~missing], yy[~missing])
+
+
+def test_read_warp_v2_out_dtype_mismatch(tmpdir):
+    from datacube.testutils import mk_test_image
+    from datacube.testutils.io import write_gtiff
+    from datacube.testutils.iodriver import open_reader
+    from datacube.utils.buffers import BufferPool
+    from pathlib import Path
+
+    xx = mk_test_image(128, 64, nodata=None)
+    mm = write_gtiff(Path(str(tmpdir))/'tst-warp-out-128x64-int16.tif', xx, nodata=None)
+    rdr = open_reader(mm.path, nodata=-999)
+
+    # half a pixel off, so pixels are warped rather than pasted
+    gbox = gbx.translate_pix(mm.gbox, 0.5, 0.5)
+    out = np.zeros(gbox.shape, dtype='float32')
+    pool = BufferPool()
+
+    read_args, finalise, roi = plan_read_v2(rdr, gbox, 'bilinear', -999, out=out, pool=pool)
+    pix = finalise(rdr.read(*read_args).result())
+
+    # warped into a pool buffer of source type, copied into `out` and given back to the pool
+    assert np.shares_memory(pix, out)
+    assert not pool.owns(pix)
+    assert pool.bytes_held > 0
+    assert (out[roi] != 0).any()
+
+
 def test_read_paste_v2(tmpdir):
     from datacube.testutils import mk_test_image
     from datacube.testutils.io import write_gtiff
@@ -355,3 +426,200 @@ def test_read_with_reproject_v2(tmpdir):
     nvalid = (yy != -999).sum()
     nempty = (yy == -999).sum()
     assert nvalid > nempty
+
+
+def test_read_overviews(tmpdir):
+    from datacube.testutils import mk_test_image
+    from datacube.testutils.io import write_gtiff
+    from datacube.testutils.iodriver import open_reader
+    from pathlib import Path
+    import rasterio
+    from rasterio.enums import Resampling as RioResampling
+
+    pp = Path(str(tmpdir))
+
+    xx = mk_test_image(250, 130, nodata=None)
+    mm = write_gtiff(pp/'tst-read-overviews-250x130-int16.tif', xx, nodata=-999)
+    with rasterio.open(str(mm.path), 'r+') as f:
+        f.build_overviews([2, 4], RioResampling.average)
+
+    with rasterio.open(str(mm.path), overview_level=1) as f:
+        ovr_pix = f.read(1)
+        ovr_gbox = GeoBox(f.width, f.height, f.transform, mm.gbox.crs)
+
+    assert ovr_gbox == overview_geobox(mm.gbox, 4)
+
+    with RasterFileDataSource(mm.path, 1).open() as rdr:
+        assert list(rdr.overviews) == [2, 4]
+        paste_ok, reason = can_paste(compute_reproject_roi(overview_geobox(rdr_geobox(rdr), 4),
+                                                           ovr_gbox))
+        assert paste_ok is True, reason
+
+        # reading exact overview geometry is a paste from overview
+        yy = np.full(ovr_gbox.shape, -999, dtype=rdr.dtype)
+        roi = read_time_slice(rdr, yy, ovr_gbox, 'average', -999)
+        assert roi_shape(roi) == ovr_gbox.shape
+        np.testing.assert_array_equal(ovr_pix, yy)
+
+        # partial overlap with the overview
+        sroi = np.s_[3:20, 7:41]
+        yy = np.full(roi_shape(sroi), -999, dtype=rdr.dtype)
+        roi = read_time_slice(rdr, yy, ovr_gbox[sroi], 'average', -999)
+        np.testing.assert_array_equal(ovr_pix[sroi], yy[roi])
+
+    rdr = open_reader(mm.path)
+    assert list(rdr.overviews) == [2, 4]
+    yy, roi = read_time_slice_v2(rdr, ovr_gbox, 'average', -999)
+    assert roi_shape(roi) == ovr_gbox.shape
+    np.testing.assert_array_equal(ovr_pix, yy)
+
+    # coarser than overview: read overview then average
+    gbox = gbx.zoom_out(mm.gbox, 5.5)
+    yy, roi = read_time_slice_v2(rdr, gbox, 'average', -999)
+    assert roi_shape(roi) == gbox.shape
+    assert (yy != -999).all()
+
+
+def test_rdr_block_shape(tmpdir):
+    from datacube.testutils import mk_test_image
+    from datacube.testutils.io import write_gtiff
+    from datacube.testutils.iodriver import open_reader
+    from pathlib import Path
+    from types import SimpleNamespace
+
+    pp = Path(str(tmpdir))
+    mm = write_gtiff(pp/'tst-block-shape.tif', mk_test_image(128, 64, nodata=None), nodata=-999, blocksize=32)
+
+    with RasterFileDataSource(mm.path, 1).open() as rdr:
+        assert rdr_block_shape(rdr) == (32, 32)
+
+    assert rdr_block_shape(open_reader(mm.path)) == (32, 32)
+    assert rdr_block_shape(SimpleNamespace()) is None
+
+
+def test_snap_roi():
+    import pytest
+    src = AlbersGS.tile_geobox((17, -40))[:64, :128]
+
+    def _snap(dst, tol=0.4):
+        return snap_roi(compute_reproject_roi(src, dst), src.shape, dst.shape, tol)
+
+    # already aligned
+    assert _snap(src) is None
+    assert _snap(gbx.translate_pix(src, 3, -4)) is None
+
+    # translation bigger than tolerance
+    assert _snap(gbx.translate_pix(src, 0.45, 0)) is None
+    assert _snap(gbx.translate_pix(src, 0.3, 0), tol=0.2) is None
+
+    # non-integer scale or not Scale+Translation
+    assert _snap(gbx.zoom_out(gbx.translate_pix(src, 0.3, 0), 1.5)) is None
+    assert _snap(GeoBox.from_geopolygon(src.extent.to_crs(epsg3857),
+                                        resolution=src.resolution)) is None
+
+    dst = gbx.translate_pix(gbx.pad(src, 3), 0.3, -0.2)
+    ok, reason = can_paste(compute_reproject_roi(src, dst))
+    assert ok is False
+
+    rr = _snap(dst)
+    assert rr is not None
+    assert can_paste(rr) == (True, None)
+    assert rr.roi_src == np.s_[0:64, 0:128]
+    assert rr.roi_dst == np.s_[3:67, 3:131]
+
+    rr = _snap(gbx.zoom_out(gbx.translate_pix(src, 0.6, 1.3), 2))
+    assert rr is not None
+    assert can_paste(rr) == (True, None)
+
+    with pytest.raises(ValueError):
+        SnapPolicy(0.6)
+    with pytest.raises(ValueError):
+        SnapPolicy(-0.1)
+
+
+def test_read_snap(tmpdir):
+    from datacube.testutils import mk_test_image
+    from datacube.testutils.io import write_gtiff
+    from datacube.testutils.iodriver import open_reader
+    from pathlib import Path
+
+    pp = Path(str(tmpdir))
+
+    xx = mk_test_image(128, 64, nodata=None)
+    mm = write_gtiff(pp/'tst-read-snap-128x64-int16.tif', xx, nodata=-999)
+    dst_gbox = gbx.translate_pix(gbx.pad(mm.gbox, 3), 0.3, -0.2)
+
+    with RasterFileDataSource(mm.path, 1).open() as rdr:
+        yy = np.full(dst_gbox.shape, -999, dtype=rdr.dtype)
+        read_time_slice(rdr, yy, dst_gbox, 'bilinear', -999)
+        assert (yy[3:-3, 3:-3] != xx).any()
+
+        snap = SnapPolicy(0.1)
+        read_time_slice(rdr, yy, dst_gbox, 'bilinear', -999, snap=snap)
+        assert snap.applied is False
+
+        snap = SnapPolicy(0.35)
+        yy = np.full(dst_gbox.shape, -999, dtype=rdr.dtype)
+        roi = read_time_slice(rdr, yy, dst_gbox, 'bilinear', -999, snap=snap)
+        assert snap.applied is True
+        assert roi == np.s_[3:67, 3:131]
+        np.testing.assert_array_equal(xx, yy[roi])
+        assert (yy[:3] == -999).all()
+
+    snap = SnapPolicy(0.35)
+    yy, roi = read_time_slice_v2(open_reader(mm.path), dst_gbox, 'bilinear', -999, snap=snap)
+    assert snap.applied is True
+    assert roi == np.s_[3:67, 3:131]
+    np.testing.assert_array_equal(xx, yy)
+
+
+def test_read_v2_into_out(tmpdir):
+    from datacube.testutils import mk_test_image
+    from datacube.testutils.io import write_gtiff
+    from datacube.testutils.iodriver import open_reader
+    from pathlib import Path
+
+    pp = Path(str(tmpdir))
+
+    xx = mk_test_image(128, 64, nodata=-33)
+    assert (xx == -33).any()
+    mm = write_gtiff(pp/'tst-read-into-out-128x64-int16.tif', xx, nodata=-33)
+    rdr = open_reader(mm.path)
+    assert rdr.nodata == -33
+
+    expect = np.where(xx == -33, -999, xx)
+
+    def _read(gbox, dtype='int16', resampling='nearest'):
+        out = np.full(gbox.shape, 7, dtype=dtype)
+        pix, roi = read_time_slice_v2(rdr, gbox, resampling, -999, out=out)
+        assert pix.base is out
+        np.testing.assert_array_equal(pix, out[roi])
+        return out, roi
+
+    # paste straight into output, only roi is modified
+    gbox = gbx.translate_pix(mm.gbox, -3, -10)
+    out, roi = _read(gbox)
+    assert roi == np.s_[10:64, 3:128]
+    np.testing.assert_array_equal(out[roi], expect[:-10, :-3])
+    assert (out[:10] == 7).all()
+    assert (out[:, :3] == 7).all()
+
+    # flipped
+    out, roi = _read(gbx.flipy(gbx.flipx(mm.gbox)))
+    np.testing.assert_array_equal(out, expect[::-1, ::-1])
+
+    # different dtype
+    out, roi = _read(mm.gbox, dtype='float32')
+    np.testing.assert_array_equal(out, expect)
+
+    # warp into output
+    gbox = gbx.zoom_out(mm.gbox[3:-3, 10:-10], 2.1)
+    yy, roi_ = read_time_slice_v2(rdr, gbox, 'bilinear', -999)
+    out, roi = _read(gbox, resampling='bilinear')
+    assert roi == roi_
+    np.testing.assert_array_equal(out[roi], yy)
+
+    # normalisation can be skipped
+    read_args, finalise, roi = plan_read_v2(rdr, mm.gbox, 'nearest', -999, normalise=False)
+    pix = finalise(rdr.read(*read_args).result())
+    np.testing.assert_array_equal(pix, xx)
@@ -178,3 +178,8 @@ def test_gbox_tiles():
     assert tt.chunk_shape((0, 1)) == (h, 2)
     assert tt.chunk_shape((1, 1)) == (1, 2)
     assert tt.chunk_shape((1, 0)) == (1, w)
+
+    assert tt.roi((0, 0)) == (slice(0, h), slice(0, w))
+    assert tt.roi((1, 1)) == (slice(h, H), slice(w, W))
+    with pytest.raises(IndexError):
+        tt.roi((2, 0))
@@ -5,6 +5,8 @@ from types import SimpleNamespace
 import pytest
 
 from pathlib import Path
+from uuid import uuid4
+from datacube.model import Dataset
 from datacube.testutils import (
     mk_sample_dataset,
     mk_test_image,
@@ -15,6 +17,29 @@ from datacube.testutils.iodriver import NetCDF
 from datacube.utils import ignore_exceptions_if
 
 
+@pytest.fixture
+def rasterio_open_counter(monkeypatch):
+    """ Counts calls to ``rasterio.open`` in ``.n``, set it to 0 before the part of interest
+    """
+    import rasterio
+    rio_open = rasterio.open
+    counter = SimpleNamespace(n=0)
+
+    def counting_open(*args, **kw):
+        counter.n += 1
+        return rio_open(*args, **kw)
+
+    monkeypatch.setattr(rasterio, 'open', counting_open)
+    return counter
+
+
+def _with_new_id(ds, **kw):
+    """ Copy of a dataset with a unique id (and any other top-level document changes),
+    so that lazy load can tell datasets apart
+    """
+    return Dataset(ds.type, dict(ds.metadata_doc, id=str(uuid4()), **kw), uris=ds.uris)
+
+
 def test_load_data(tmpdir):
     tmpdir = Path(str(tmpdir))
 
@@ -139,6 +164,761 @@ def test_load_data_cbk(tmpdir):
     assert progress_call_data == [(1, 4), (2, 4)]
 
 
+def test_load_data_parallel(tmpdir):
+    from concurrent.futures import ThreadPoolExecutor
+    from datacube.api import TerminateCurrentLoad
+
+    tmpdir = Path(str(tmpdir))
+
+    spatial = dict(resolution=(15, -15),
+                   offset=(11230, 1381110),)
+
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+
+    bands = [SimpleNamespace(name=name, values=aa, nodata=nodata)
+             for name in ['aa', 'bb']]
+
+    dss = []
+    for i, timestamp in enumerate(['2018-07-19', '2018-07-19', '2018-07-20']):
+        ds, gbox = gen_tiff_dataset(bands,
+                                    tmpdir,
+                                    prefix='ds{}-'.format(i),
+                                    timestamp=timestamp,
+                                    **spatial)
+        dss.append(ds)
+
+    sources = Datacube.group_datasets(dss, 'time')
+    assert sources.shape == (2,)
+
+    progress_call_data = []
+
+    def progress_cbk(n, nt):
+        progress_call_data.append((n, nt))
+
+    expect = Datacube.load_data(sources, gbox, ds.type.measurements)
+    xx = Datacube.load_data(sources, gbox, ds.type.measurements,
+                            progress_cbk=progress_cbk,
+                            max_workers=3)
+    assert 'dc_partial_load' not in xx.attrs
+    assert progress_call_data == [(n, 6) for n in range(1, 7)]
+    for name in ('aa', 'bb'):
+        np.testing.assert_array_equal(expect[name].values, xx[name].values)
+
+    def progress_cbk_fail_early(n, nt):
+        progress_call_data.append((n, nt))
+        raise TerminateCurrentLoad()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        progress_call_data = []
+        xx = Datacube.load_data(sources, gbox, ds.type.measurements,
+                                progress_cbk=progress_cbk_fail_early,
+                                executor=executor)
+        assert xx.dc_partial_load is True
+        assert progress_call_data == [(1, 6)]
+
+        # executor is still usable after partial load
+        xx = Datacube.load_data(sources, gbox, ds.type.measurements,
+                                executor=executor)
+        np.testing.assert_array_equal(expect.aa.values, xx.aa.values)
+
+    # errors are propagated unless asked to skip broken datasets
+    (tmpdir/'ds2-bb.tiff').unlink()
+    with pytest.raises(IOError):
+        Datacube.load_data(sources, gbox, ds.type.measurements, max_workers=2)
+
+    xx = Datacube.load_data(sources, gbox, ds.type.measurements,
+                            max_workers=2, skip_broken_datasets=True)
+    np.testing.assert_array_equal(expect.aa.values, xx.aa.values)
+    np.testing.assert_array_equal(nodata, xx.bb.values[1])
+
+
+def test_load_data_multiband(tmpdir, rasterio_open_counter):
+    from datacube.api.core import _group_by_file
+
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+    bb = np.full_like(aa, 7)
+    spatial = dict(resolution=(15, -15),
+                   offset=(11230, 1381110),)
+
+    dss = []
+    for i, (prefix, values) in enumerate((('ds1-', aa), ('ds2-', bb))):
+        meta = write_gtiff(tmpdir/(prefix + 'ab.tif'), np.stack([values, values[::-1]]),
+                           nodata=nodata, **spatial)
+        gbox = meta.gbox
+        single = write_gtiff(tmpdir/(prefix + 'c.tif'), values, nodata=nodata, **spatial)
+
+        ds = mk_sample_dataset([dict(name='a', path=prefix + 'ab.tif', band=1, nodata=nodata, dtype='int16'),
+                                dict(name='b', path=prefix + 'ab.tif', band=2, nodata=nodata, dtype='int16'),
+                                dict(name='c', path=single.path.name, nodata=nodata, dtype='int16')],
+                               uri=(tmpdir/'metadata.yaml').absolute().as_uri(),
+                               timestamp='2018-07-19',
+                               id='3a1df9e0-8484-44fc-8102-79184eab85d{}'.format(i),
+                               geobox=gbox)
+        dss.append(ds)
+
+    mm = [dss[0].type.measurements[n] for n in ('a', 'b', 'c')]
+    groups = _group_by_file(dss, mm)
+    assert [[m.name for m in g] for g in groups] == [['a', 'b'], ['c']]
+
+    rasterio_open_counter.n = 0
+
+    sources = Datacube.group_datasets(dss[:1], 'time')
+    xx = Datacube.load_data(sources, gbox, mm)
+    assert rasterio_open_counter.n == 2
+    np.testing.assert_array_equal(aa, xx.a.values[0])
+    np.testing.assert_array_equal(aa[::-1], xx.b.values[0])
+    np.testing.assert_array_equal(aa, xx.c.values[0])
+
+    progress_call_data = []
+
+    def progress_cbk(n, nt):
+        progress_call_data.append((n, nt))
+
+    rasterio_open_counter.n = 0
+    sources = Datacube.group_datasets(dss, 'time')
+    xx = Datacube.load_data(sources, gbox, mm, progress_cbk=progress_cbk)
+    assert rasterio_open_counter.n == 4
+    assert progress_call_data == [(n, 6) for n in range(1, 7)]
+
+    expect = np.where(aa == nodata, 7, aa)
+    np.testing.assert_array_equal(expect, xx.a.values[0])
+    np.testing.assert_array_equal(expect[::-1], xx.b.values[0])
+    np.testing.assert_array_equal(expect, xx.c.values[0])
+
+    # lazy load with one task per chunk for all bands
+    rasterio_open_counter.n = 0
+    xx = Datacube.load_data(sources, gbox, mm, dask_chunks={'x': 48}, dask_multiband=True)
+    layers = xx.a.data.dask.layers
+    assert len(layers) == 3
+    assert len(xx.__dask_graph__().layers) == 5  # datasets and bands layers are shared
+    xx = xx.load()
+    assert rasterio_open_counter.n == 8  # 2 chunks x 2 datasets x 2 files
+    np.testing.assert_array_equal(expect, xx.a.values[0])
+    np.testing.assert_array_equal(expect[::-1], xx.b.values[0])
+    np.testing.assert_array_equal(expect, xx.c.values[0])
+
+    # resampling is still done per band
+    from datacube.utils.geometry import gbox as gbx
+    xx = Datacube.load_data(sources, gbx.zoom_out(gbox, 2), mm, resampling={'a': 'nearest', 'b': 'average'})
+    assert xx.a.shape == xx.b.shape == (1, 32, 48)
+
+    (tmpdir/'ds1-ab.tif').unlink()
+    xx = Datacube.load_data(sources, gbox, mm, skip_broken_datasets=True)
+    np.testing.assert_array_equal(bb, xx.a.values[0])
+    np.testing.assert_array_equal(expect, xx.c.values[0])
+
+
+def test_load_data_snap(tmpdir):
+    from datacube.utils.geometry import gbox as gbx
+
+    tmpdir = Path(str(tmpdir))
+
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+
+    ds, gbox = gen_tiff_dataset(SimpleNamespace(name='aa', values=aa, nodata=nodata),
+                                tmpdir,
+                                prefix='ds1-',
+                                timestamp='2018-07-19',
+                                resolution=(15, -15),
+                                offset=(11230, 1381110))
+    sources = Datacube.group_datasets([ds], 'time')
+    mm = [ds.type.measurements['aa']]
+
+    # output grid is off by a fraction of a pixel and bigger than the source
+    dst_gbox = gbx.translate_pix(gbx.pad(gbox, 2), 0.3, -0.2)
+
+    xx = Datacube.load_data(sources, dst_gbox, mm, resampling='bilinear')
+    assert 'dc_snapped' not in xx.attrs
+    assert (xx.aa.values[0, 2:-2, 2:-2] != aa).any()
+
+    xx = Datacube.load_data(sources, dst_gbox, mm, resampling='bilinear', snap_tolerance=0.35)
+    assert xx.attrs['dc_snapped'] is True
+    assert 'snap' not in xx.aa.attrs
+    np.testing.assert_array_equal(xx.aa.values[0, 2:-2, 2:-2], aa)
+    assert (xx.aa.values[0, :2] == nodata).all()
+
+    # offset is larger than tolerance
+    xx = Datacube.load_data(sources, dst_gbox, mm, resampling='bilinear', snap_tolerance=0.1)
+    assert 'dc_snapped' not in xx.attrs
+
+    # lazy load snaps too, but doesn't record it
+    xx = Datacube.load_data(sources, dst_gbox, mm, resampling='bilinear', snap_tolerance=0.35,
+                            dask_chunks={'x': 40})
+    np.testing.assert_array_equal(xx.aa.values[0, 2:-2, 2:-2], aa)
+
+    with pytest.raises(ValueError):
+        Datacube.load_data(sources, dst_gbox, mm, snap_tolerance=0.7)
+
+
+def test_load_data_early_stop(tmpdir, rasterio_open_counter):
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+
+    dss = []
+    for i, values in enumerate([np.full_like(aa, 3), aa, np.full_like(aa, 5)]):
+        ds, gbox = gen_tiff_dataset(SimpleNamespace(name='aa', values=values, nodata=nodata),
+                                    tmpdir,
+                                    prefix='ds{}-'.format(i),
+                                    timestamp='2018-07-19',
+                                    resolution=(15, -15),
+                                    offset=(11230, 1381110))
+        dss.append(_with_new_id(ds))
+
+    rasterio_open_counter.n = 0
+
+    sources = Datacube.group_datasets(dss, 'time')
+    mm = [dss[0].type.measurements['aa']]
+    order = {ds.id: i for i, ds in enumerate(dss)}
+    progress_call_data = []
+
+    def progress_cbk(n, nt):
+        progress_call_data.append((n, nt))
+
+    # first dataset fills the output, the rest are not read
+    xx = Datacube.load_data(sources, gbox, mm, progress_cbk=progress_cbk,
+                            source_order=lambda ds: order[ds.id])
+    assert rasterio_open_counter.n == 1
+    assert (xx.aa.values == 3).all()
+    assert progress_call_data == [(1, 3), (2, 3), (3, 3)]
+
+    # partially empty dataset first, stops after the second one
+    rasterio_open_counter.n = 0
+    xx = Datacube.load_data(sources, gbox, mm, source_order=lambda ds: (order[ds.id] - 1) % 3)
+    assert rasterio_open_counter.n == 2
+    np.testing.assert_array_equal(xx.aa.values[0], np.where(aa == nodata, 5, aa))
+
+    # custom fuser reads everything
+    rasterio_open_counter.n = 0
+    Datacube.load_data(sources, gbox, mm, source_order=lambda ds: order[ds.id],
+                       fuse_func=lambda dst, src: np.copyto(dst, src, where=(dst == nodata)))
+    assert rasterio_open_counter.n == 3
+
+    # lazy load too
+    rasterio_open_counter.n = 0
+    xx = Datacube.load_data(sources, gbox, mm, source_order=lambda ds: (order[ds.id] - 1) % 3,
+                            dask_chunks={'x': 48}).load()
+    assert rasterio_open_counter.n == 4
+    np.testing.assert_array_equal(xx.aa.values[0], np.where(aa == nodata, 5, aa))
+
+
+def test_load_data_skips_non_overlapping(tmpdir, rasterio_open_counter):
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+
+    dss = []
+    for i, offset in enumerate([(11230, 1381110), (11230 + 96*15*3, 1381110)]):
+        ds, gbox = gen_tiff_dataset(SimpleNamespace(name='aa', values=aa, nodata=nodata),
+                                    tmpdir,
+                                    prefix='ds{}-'.format(i),
+                                    timestamp='2018-07-19',
+                                    resolution=(15, -15),
+                                    offset=offset)
+        dss.append(ds)
+
+    rasterio_open_counter.n = 0
+
+    progress_call_data = []
+
+    def progress_cbk(n, nt):
+        progress_call_data.append((n, nt))
+
+    sources = Datacube.group_datasets(dss, 'time')
+    mm = [dss[0].type.measurements['aa']]
+
+    # output covers only the second dataset
+    xx = Datacube.load_data(sources, gbox, mm, progress_cbk=progress_cbk)
+    assert rasterio_open_counter.n == 1
+    np.testing.assert_array_equal(xx.aa.values[0], aa)
+    assert progress_call_data == [(1, 2), (2, 2)]
+
+
+def test_load_data_lazy_open(tmpdir, rasterio_open_counter):
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+
+    dss, gboxes = [], []
+    for i, offset in enumerate([(11230, 1381110), (11230 + 96*15, 1381110)]):
+        ds, gbox = gen_tiff_dataset(SimpleNamespace(name='aa', values=aa, nodata=nodata),
+                                    tmpdir,
+                                    prefix='ds{}-'.format(i),
+                                    timestamp='2018-07-19',
+                                    resolution=(15, -15),
+                                    offset=offset)
+        dss.append(_with_new_id(ds, grids={'default': {'shape': list(gbox.shape),
+                                                       'transform': list(gbox.transform)}}))
+        gboxes.append(gbox)
+
+    # output covers the first dataset, second one is just to the right of it
+    gbox = gboxes[0]
+
+    rasterio_open_counter.n = 0
+
+    sources = Datacube.group_datasets(dss, 'time')
+    mm = [dss[0].type.measurements['aa']]
+
+    # footprint of the second dataset is within a pixel of the output, so it's opened
+    xx = Datacube.load_data(sources, gbox, mm)
+    assert rasterio_open_counter.n == 2
+    np.testing.assert_array_equal(xx.aa.values[0], aa)
+
+    rasterio_open_counter.n = 0
+    xx = Datacube.load_data(sources, gbox, mm, lazy_open=True)
+    assert rasterio_open_counter.n == 1
+    np.testing.assert_array_equal(xx.aa.values[0], aa)
+    assert 'lazy_open' not in xx.aa.attrs
+
+    rasterio_open_counter.n = 0
+    xx = Datacube.load_data(sources, gbox, mm, lazy_open=True, dask_chunks={})
+    np.testing.assert_array_equal(xx.aa.values[0], aa)
+    assert rasterio_open_counter.n == 1
+
+
+def test_dask_load_deterministic_keys(tmpdir):
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+    bands = [SimpleNamespace(name=name, values=aa, nodata=nodata)
+             for name in ['aa', 'bb']]
+    ds, gbox = gen_tiff_dataset(bands,
+                                tmpdir,
+                                prefix='ds1-',
+                                timestamp='2018-07-19',
+                                resolution=(15, -15),
+                                offset=(11230, 1381110))
+    sources = Datacube.group_datasets([ds], 'time')
+    mm = ds.type.measurements
+    chunks = {'x': 48}
+
+    def load(**kw):
+        return Datacube.load_data(sources, gbox, kw.pop('measurements', mm), dask_chunks=chunks, **kw)
+
+    xx1, xx2 = load(), load()
+    assert xx1.aa.data.name == xx2.aa.data.name
+    assert xx1.aa.data.name != xx1.bb.data.name
+
+    # same band loaded with other bands
+    assert load(measurements=[mm['aa']]).aa.data.name == xx1.aa.data.name
+
+    # repeated loads are merged into one graph
+    xx = (xx1.aa + xx2.aa).data
+    assert len(dict(xx.__dask_graph__())) == len(dict((xx1.aa*2).data.__dask_graph__()))
+    np.testing.assert_array_equal(xx.compute()[0], aa + aa)
+
+    for kw in [dict(resampling='bilinear'),
+               dict(fuse_func=lambda dst, src: None),
+               dict(snap_tolerance=0.1),
+               dict(skip_broken_datasets=True),
+               dict(dask_multiband=True)]:
+        assert load(**kw).aa.data.name != xx1.aa.data.name
+
+    assert load(snap_tolerance=0.1).aa.data.name == load(snap_tolerance=0.1).aa.data.name
+    assert load(dask_multiband=True).aa.data.name == load(dask_multiband=True).aa.data.name
+
+    chunks = {'x': 32}
+    assert load().aa.data.name != xx1.aa.data.name
+
+
+def test_dask_load_time_chunks(tmpdir):
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+
+    dss = []
+    for i in range(5):
+        bands = [SimpleNamespace(name=name, values=aa + i, nodata=nodata) for name in ['aa', 'bb']]
+        ds, gbox = gen_tiff_dataset(bands,
+                                    tmpdir,
+                                    prefix='ds{}-'.format(i),
+                                    timestamp='2018-07-{:02d}'.format(10 + i),
+                                    resolution=(15, -15),
+                                    offset=(11230, 1381110))
+        dss.append(_with_new_id(ds))
+
+    sources = Datacube.group_datasets(dss, 'time')
+    mm = dss[0].type.measurements
+    expect = Datacube.load_data(sources, gbox, mm)
+
+    for multiband in (False, True):
+        xx = Datacube.load_data(sources, gbox, mm, dask_chunks={'time': 2, 'x': 48}, dask_multiband=multiband)
+        assert xx.aa.data.chunks == ((2, 2, 1), (64,), (48, 48))
+        # blocks are loaded directly, there is no rechunking step
+        assert len(xx.aa.data.dask.layers) == (3 if multiband else 2)
+        if not multiband:
+            # last block is one slice deep
+            assert xx.aa.data.dask.layers[xx.aa.data.name][(xx.aa.data.name, 2, 0, 1)][-1] == (1,)
+
+        xx = xx.load()
+        np.testing.assert_array_equal(expect.aa.values, xx.aa.values)
+        np.testing.assert_array_equal(expect.bb.values, xx.bb.values)
+
+    # time slice with no data in some chunks
+    gbox_wide = gbox.__class__(gbox.width * 2, gbox.height, gbox.transform, gbox.crs)
+    sources = Datacube.group_datasets(dss, 'time')
+    xx = Datacube.load_data(sources, gbox_wide, mm, dask_chunks={'time': -1, 'x': 96})
+    assert xx.aa.data.chunks == ((5,), (64,), (96, 96))
+    xx = xx.load()
+    np.testing.assert_array_equal(expect.aa.values, xx.aa.values[:, :, :96])
+    assert (xx.aa.values[:, :, 96:] == nodata).all()
+
+
+def test_dask_load_auto_chunks(tmpdir):
+    from datacube.api.core import plan_dask_chunks
+    from datacube.utils.geometry import gbox as gbx
+
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(256, 128, 'int16', nodata=nodata)
+    ds, gbox = gen_tiff_dataset(SimpleNamespace(name='aa', values=aa, nodata=nodata),
+                                tmpdir,
+                                prefix='ds1-',
+                                timestamp='2018-07-19',
+                                resolution=(15, -15),
+                                offset=(11230, 1381110),
+                                blocksize=32)
+    sources = Datacube.group_datasets([ds], 'time')
+    mm = [ds.type.measurements['aa']]
+
+    plan = plan_dask_chunks(sources, gbox, mm, chunk_bytes=2*64*64)
+    assert plan.source_block == (32, 32)
+    assert plan.output_block == (32, 32)
+    assert plan.chunks == {'time': 1, 'y': 64, 'x': 64}
+    assert plan.chunk_bytes == 2*64*64
+
+    # budget is not a whole number of blocks
+    plan = plan_dask_chunks(sources, gbox, mm, chunk_bytes=2*100*100)
+    assert plan.chunks == {'time': 1, 'y': 96, 'x': 96}
+
+    # fixed dimensions are kept, the rest fill the budget
+    plan = plan_dask_chunks(sources, gbox, mm, {'x': 'auto', 'y': 16}, chunk_bytes=2*16*100)
+    assert plan.chunks == {'time': 1, 'y': 16, 'x': 96}
+
+    # whole extent fits
+    plan = plan_dask_chunks(sources, gbox, mm, chunk_bytes='1MiB')
+    assert plan.chunks == {'time': 1, 'y': 128, 'x': 256}
+
+    # zoomed out output, one source block is 16 output pixels
+    plan = plan_dask_chunks(sources, gbx.zoom_out(gbox, 2), mm, chunk_bytes=2*40*40)
+    assert plan.output_block == (16, 16)
+    assert plan.chunks == {'time': 1, 'y': 32, 'x': 48}
+
+    # never smaller than one block
+    plan = plan_dask_chunks(sources, gbox, mm, chunk_bytes=10)
+    assert plan.chunks == {'time': 1, 'y': 32, 'x': 32}
+
+    import dask
+    with dask.config.set({'array.chunk-size': 2*64*64}):
+        xx = Datacube.load_data(sources, gbox, mm, dask_chunks='auto')
+        assert xx.aa.data.chunks == ((1,), (64, 64), (64,)*4)
+        np.testing.assert_array_equal(xx.aa.values[0], aa)
+
+        xx = Datacube.load_data(sources, gbox, mm, dask_chunks={'time': 1, 'x': 'auto', 'y': 'auto'})
+        assert xx.aa.data.chunks == ((1,), (64, 64), (64,)*4)
+
+
+def test_load_iter(tmpdir, monkeypatch):
+    import xarray as xr
+
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+
+    dss = []
+    for i in range(5):
+        ds, gbox = gen_tiff_dataset(SimpleNamespace(name='aa', values=aa + i, nodata=nodata),
+                                    tmpdir,
+                                    prefix='ds{}-'.format(i),
+                                    timestamp='2018-07-{:02d}'.format(10 + i),
+                                    resolution=(15, -15),
+                                    offset=(11230, 1381110))
+        dss.append(_with_new_id(ds))
+
+    dc = Datacube(index=SimpleNamespace())
+    expect = dc.load(datasets=dss, like=gbox)
+
+    n_started = 0
+    load_data = Datacube.load_data
+
+    def counting_load_data(*args, **kw):
+        nonlocal n_started
+        n_started += 1
+        return load_data(*args, **kw)
+
+    monkeypatch.setattr(Datacube, 'load_data', staticmethod(counting_load_data))
+
+    for prefetch in (0, 1, 3):
+        n_started = 0
+        slices = []
+        for t, xx in enumerate(dc.load_iter(datasets=dss, like=gbox, prefetch=prefetch)):
+            assert n_started <= t + 1 + prefetch
+            assert xx.aa.shape == (1,) + gbox.shape
+            slices.append(xx)
+
+        assert n_started == 5
+        xx = xr.concat(slices, dim='time')
+        np.testing.assert_array_equal(expect.aa.values, xx.aa.values)
+        np.testing.assert_array_equal(expect.time.values, xx.time.values)
+
+    # stopping early doesn't load everything
+    n_started = 0
+    for xx in dc.load_iter(datasets=dss, like=gbox, prefetch=1):
+        break
+    assert n_started <= 2
+
+    assert list(dc.load_iter(datasets=[], like=gbox)) == []
+
+    with pytest.raises(ValueError):
+        dc.load_iter(datasets=dss, like=gbox, prefetch=-1)
+
+
+def test_load_to_store(tmpdir, monkeypatch):
+    import xarray as xr
+    from datacube.utils.geometry import gbox as gbx
+
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+
+    dss = []
+    for i in range(3):
+        bands = [SimpleNamespace(name=name, values=aa + i, nodata=nodata) for name in ['aa', 'bb']]
+        ds, gbox = gen_tiff_dataset(bands,
+                                    tmpdir,
+                                    prefix='ds{}-'.format(i),
+                                    timestamp='2018-07-{:02d}'.format(10 + i),
+                                    crs='EPSG:3577',
+                                    resolution=(15, -15),
+                                    offset=(11230, 1381110))
+        dss.append(_with_new_id(ds))
+
+    # output extends past the data, so some chunks have nothing to load
+    gbox = gbx.pad(gbox, 40)
+    dc = Datacube(index=SimpleNamespace())
+    expect = dc.load(datasets=dss, like=gbox)
+
+    progress = []
+    path = tmpdir/'out'/'store.nc'
+    assert dc.load_to_store(path, datasets=dss, like=gbox, chunks={'x': 32, 'y': 32},
+                            progress_cbk=lambda n, nt: progress.append((n, nt))) == path
+    assert progress == [(n, 3*5*6) for n in range(1, 3*5*6 + 1)]
+    assert not (tmpdir/'out'/'store.nc.progress').exists()
+
+    with xr.open_dataset(str(path), mask_and_scale=False) as xx:
+        assert xx.aa.encoding['chunksizes'] == (1, 32, 32)
+        np.testing.assert_array_equal(expect.aa.values, xx.aa.values)
+        np.testing.assert_array_equal(expect.bb.values, xx.bb.values)
+        np.testing.assert_array_equal(expect.time.values, xx.time.values)
+        np.testing.assert_array_equal(expect.x.values, xx.x.values)
+
+    with pytest.raises(RuntimeError):
+        dc.load_to_store(path, datasets=dss, like=gbox)
+    assert not (tmpdir/'out'/'store.nc.progress').exists()
+
+    # complete output is not touched when resuming
+    assert dc.load_to_store(path, datasets=dss, like=gbox, resume=True) == path
+
+    # interrupted load
+    n_loaded = 0
+    load_data = Datacube.load_data
+
+    def failing_load_data(*args, **kw):
+        nonlocal n_loaded
+        n_loaded += 1
+        if n_loaded > 5:
+            raise IOError('Failed to read')
+        return load_data(*args, **kw)
+
+    monkeypatch.setattr(Datacube, 'load_data', staticmethod(failing_load_data))
+    path = tmpdir/'store2.nc'
+    with pytest.raises(IOError):
+        dc.load_to_store(path, datasets=dss, like=gbox, chunks={'x': 32, 'y': 32}, prefetch=0)
+    assert (tmpdir/'store2.nc.progress').read_text().count('\n') == 5 + 9  # empty chunks are not loaded
+
+    monkeypatch.setattr(Datacube, 'load_data', staticmethod(load_data))
+    progress = []
+    dc.load_to_store(path, datasets=dss, like=gbox, chunks={'x': 32, 'y': 32}, resume=True,
+                     progress_cbk=lambda n, nt: progress.append(n))
+    assert progress == list(range(15, 91))
+    assert not (tmpdir/'store2.nc.progress').exists()
+
+    with xr.open_dataset(str(path), mask_and_scale=False) as xx:
+        np.testing.assert_array_equal(expect.aa.values, xx.aa.values)
+        np.testing.assert_array_equal(expect.bb.values, xx.bb.values)
+
+    with pytest.raises(ValueError):
+        dc.load_to_store(tmpdir/'store3.nc', datasets=dss, like=gbox, chunks={'time': 2})
+
+
+def test_load_data_memmap(tmpdir):
+    import dask
+    from datacube.utils.geometry import gbox as gbx
+
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+
+    dss = []
+    for i in range(3):
+        bands = [SimpleNamespace(name=name, values=aa + i, nodata=nodata) for name in ['aa', 'bb']]
+        ds, gbox = gen_tiff_dataset(bands,
+                                    tmpdir,
+                                    prefix='ds{}-'.format(i),
+                                    timestamp='2018-07-{:02d}'.format(10 + i),
+                                    resolution=(15, -15),
+                                    offset=(11230, 1381110),
+                                    blocksize=32)
+        dss.append(_with_new_id(ds))
+
+    gbox = gbx.pad(gbox, 20)
+    sources = Datacube.group_datasets(dss, 'time')
+    mm = dss[0].type.measurements
+    expect = Datacube.load_data(sources, gbox, mm)
+
+    scratch = tmpdir/'scratch'
+    scratch.mkdir()
+
+    def is_memmap(a):
+        while a is not None:
+            if isinstance(a, np.memmap):
+                return True
+            a = a.base
+        return False
+
+    progress_call_data = []
+    with dask.config.set({'array.chunk-size': 2*64*64}):
+        xx = Datacube.load_data(sources, gbox, mm, memmap_dir=scratch,
+                                progress_cbk=lambda n, nt: progress_call_data.append((n, nt)))
+    assert is_memmap(xx.aa.values)
+    assert list(scratch.iterdir()) == []  # files are anonymous
+    np.testing.assert_array_equal(expect.aa.values, xx.aa.values)
+    np.testing.assert_array_equal(expect.bb.values, xx.bb.values)
+
+    # 3 datasets x 2 bands, for each of 2x3 spatial blocks
+    n_total = 3*2*2*3
+    assert progress_call_data == [(n, n_total) for n in range(1, n_total + 1)]
+
+    with dask.config.set({'array.chunk-size': 2*64*64}):
+        xx = Datacube.load_data(sources, gbox, mm, memmap_dir=scratch, max_workers=3)
+    np.testing.assert_array_equal(expect.aa.values, xx.aa.values)
+    np.testing.assert_array_equal(expect.bb.values, xx.bb.values)
+
+    # single block
+    xx = Datacube.load_data(sources, gbox, mm, memmap_dir=scratch)
+    assert is_memmap(xx.aa.values)
+    np.testing.assert_array_equal(expect.aa.values, xx.aa.values)
+
+
+def test_load_data_out(tmpdir):
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+    bands = [SimpleNamespace(name=name, values=aa, nodata=nodata)
+             for name in ['aa', 'bb']]
+    ds, gbox = gen_tiff_dataset(bands,
+                                tmpdir,
+                                prefix='ds1-',
+                                timestamp='2018-07-19',
+                                resolution=(15, -15),
+                                offset=(11230, 1381110))
+    sources = Datacube.group_datasets([ds], 'time')
+    mm = ds.type.measurements
+
+    xx = Datacube.load_data(sources, gbox, mm)
+    xx.aa.values[:] = 0
+    xx.bb.values[:] = 0
+    aa_buf = xx.aa.values
+
+    yy = Datacube.load_data(sources, gbox, mm, out=xx)
+    assert np.shares_memory(yy.aa.values, aa_buf)
+    np.testing.assert_array_equal(xx.aa.values[0], aa)
+    np.testing.assert_array_equal(xx.bb.values[0], aa)
+    np.testing.assert_array_equal(yy.bb.values[0], aa)
+
+    out = {'aa': np.zeros((1,) + gbox.shape, dtype='int16'),
+           'bb': np.zeros((1,) + gbox.shape, dtype='int16')}
+    yy = Datacube.load_data(sources, gbox, mm, out=out, max_workers=2)
+    np.testing.assert_array_equal(out['aa'][0], aa)
+    assert np.shares_memory(yy.bb.values, out['bb'])
+
+    for bad in [{'aa': out['aa']},
+                dict(out, aa=out['aa'][:, 1:]),
+                dict(out, aa=out['aa'].astype('float32')),
+                dict(out, aa=xx.aa.chunk())]:
+        with pytest.raises(ValueError):
+            Datacube.load_data(sources, gbox, mm, out=bad)
+
+    with pytest.raises(ValueError):
+        Datacube.load_data(sources, gbox, mm, out=out, dask_chunks={})
+    with pytest.raises(ValueError):
+        Datacube.load_data(sources, gbox, mm, out=out, memmap_dir=str(tmpdir))
+
+
+def test_plan_load_data(tmpdir, monkeypatch):
+    import rasterio
+    from datacube.api.core import plan_load_data
+    from datacube.utils.geometry import gbox as gbx
+
+    tmpdir = Path(str(tmpdir))
+    nodata = -999
+    aa = mk_test_image(96, 64, 'int16', nodata=nodata)
+
+    dss, gboxes = [], []
+    for i, offset in enumerate([(11230, 1381110), (11230 + 96*15, 1381110)]):
+        ds, gbox = gen_tiff_dataset(SimpleNamespace(name='aa', values=aa, nodata=nodata),
+                                    tmpdir,
+                                    prefix='ds{}-'.format(i),
+                                    timestamp='2018-07-19',
+                                    resolution=(15, -15),
+                                    offset=offset)
+        dss.append(_with_new_id(ds, grids={'default': {'shape': list(gbox.shape),
+                                                       'transform': list(gbox.transform)}}))
+        gboxes.append(gbox)
+
+    def no_open(*args, **kw):
+        raise AssertionError('should not open files')
+
+    monkeypatch.setattr(rasterio, 'open', no_open)
+
+    sources = Datacube.group_datasets(dss, 'time')
+    mm = [dss[0].type.measurements['aa']]
+    gbox = gboxes[0]
+
+    # second dataset is within a pixel of the output, but has no pixels inside it
+    plan = plan_load_data(sources, gbox, mm)
+    assert plan.geobox == gbox
+    assert plan.n_datasets == 2
+    assert plan.n_files == 1
+    assert (plan.n_paste, plan.n_reproject, plan.n_unknown) == (1, 0, 0)
+    assert plan.read_bytes == aa.nbytes
+    assert plan.output_bytes == {'aa': aa.nbytes}
+    assert plan.chunks is None
+
+    plan = plan_load_data(Datacube.group_datasets(dss[:1], 'time'), gbx.zoom_out(gbox, 1.3), mm, dask_chunks={'x': 50})
+    assert (plan.n_paste, plan.n_reproject) == (0, 1)
+    assert plan.read_bytes == aa.nbytes
+    assert plan.chunks == ((1,), (plan.geobox.height,), (50, plan.geobox.width - 50))
+
+    # covers right half of the first and left half of the second dataset
+    gbox = gbx.translate_pix(gbox, 48, 0)
+    plan = plan_load_data(sources, gbox, mm)
+    assert plan.n_files == 2
+    assert plan.n_paste == 2
+    assert plan.read_bytes == aa.nbytes
+
+    # without indexed grid estimate is taken from footprints
+    doc = {k: v for k, v in dss[0].metadata_doc.items() if k != 'grids'}
+    sources = Datacube.group_datasets([Dataset(dss[0].type, doc, uris=dss[0].uris)], 'time')
+    plan = plan_load_data(sources, gbox, mm)
+    assert (plan.n_paste, plan.n_reproject, plan.n_unknown) == (0, 0, 1)
+    assert plan.read_bytes == aa.nbytes // 2
+
+
 def test_hdf5_lock_release_on_failure():
     from datacube.storage._rio import RasterDatasetDataSource, HDF5_LOCK
     from datacube.storage import BandInfo
@@ -112,6 +112,26 @@ def test_product_dimensions():
     assert product.dimensions == ('time', 'y', 'x')
 
 
+def test_product_load_hints():
+    from datacube.model import DatasetType
+    from datacube.utils.documents import InvalidDocException
+
+    product = mk_sample_product('test_product')
+    assert product.load_hints() == {}
+    DatasetType.validate(product.definition)
+
+    doc = dict(product.definition, load={'snap_tolerance': 0.2})
+    DatasetType.validate(doc)
+    assert DatasetType(product.metadata_type, doc).load_hints() == {'snap_tolerance': 0.2}
+
+    with pytest.raises(InvalidDocException):
+        DatasetType.validate(dict(doc, load={'snap_tolerance': 0.7}))
+
+    DatasetType.validate(dict(doc, load={'source_order': '-cloud_cover'}))
+    with pytest.raises(InvalidDocException):
+        DatasetType.validate(dict(doc, load={'source_order': 1}))
+
+
 def test_measurement():
     # Can create a measurement
     m = Measurement(name='t', dtype='uint8', nodata=255, units='1')
@@ -0,0 +1,163 @@
+import gc
+import threading
+
+import numpy as np
+import pytest
+
+from datacube.utils.buffers import (
+    BufferPool,
+    scratch_buffer,
+    get_default_buffer_pool,
+    set_default_buffer_pool,
+)
+
+
+def test_buffer_pool():
+    pool = BufferPool(max_bytes=1000)
+    assert pool.max_bytes == 1000
+    assert pool.hit_rate == 0
+    assert pool.bytes_held == 0
+    assert 'BufferPool' in str(pool)
+
+    a = pool.get((10, 10), 'uint8', fill=3)
+    assert a.shape == (10, 10)
+    assert a.dtype == 'uint8'
+    assert a.flags.c_contiguous
+    assert (a == 3).all()
+    assert (pool.hits, pool.misses) == (0, 1)
+
+    pool.release(a)
+    assert pool.bytes_held == 100
+
+    b = pool.get((10, 10), np.uint8, fill=7)
+    assert b is a
+    assert (b == 7).all()
+    assert (pool.hits, pool.misses) == (1, 1)
+    assert pool.hit_rate == 0.5
+    assert pool.bytes_held == 0
+
+    # different dtype or shape is a different buffer
+    c = pool.get((10, 10), 'int16')
+    assert c is not a
+    d = pool.get((10,), 'uint8')
+    assert d is not a
+    assert (pool.hits, pool.misses) == (1, 3)
+
+    # arrays not from the pool, or released twice are ignored
+    pool.release(np.zeros(10, dtype='uint8'))
+    pool.release(None)
+    assert pool.bytes_held == 0
+    pool.release(d)
+    pool.release(d)
+    assert pool.bytes_held == 10
+
+    # over the limit: least recently used is dropped
+    pool.release(a)
+    pool.release(c)
+    assert pool.bytes_held == 310
+    e = pool.get((30, 20), 'int16')
+    pool.release(e)
+    assert pool.bytes_held == 310  # too big to keep
+
+    f = pool.get((40, 10), 'int16')
+    pool.release(f)
+    assert pool.bytes_held == 1000  # d and a were dropped
+    assert pool.get((10,), 'uint8') is not d
+    assert pool.get((10, 10), 'uint8') is not a
+
+    with pool.scratch((40, 10), 'int16', fill=0) as g:
+        assert g is f
+        assert (g == 0).all()
+    assert pool.bytes_held == 1000
+
+    assert pool.stats()['hits'] == pool.hits
+    pool.clear()
+    assert pool.bytes_held == 0
+    assert (pool.hits, pool.misses) == (0, 0)
+
+    with pytest.raises(ValueError):
+        BufferPool(max_bytes=-1)
+
+
+def test_buffer_pool_ownership():
+    pool = BufferPool()
+    a = pool.get((10,), 'uint8')
+    assert pool.owns(a)
+
+    # views of pool buffers are not pool buffers
+    pool.release(a[::-1])
+    pool.release(a[:5])
+    assert pool.bytes_held == 0
+    assert pool.owns(a)
+
+    pool.release(a)
+    assert not pool.owns(a)
+    assert pool.bytes_held == 10
+    assert pool.get((10,), 'uint8') is a
+
+    # buffers that became read-only are not reused
+    a.flags.writeable = False
+    pool.release(a)
+    assert not pool.owns(a)
+    assert pool.bytes_held == 0
+    assert pool.get((10,), 'uint8') is not a
+
+
+def test_buffer_pool_unreleased():
+    pool = BufferPool()
+    a = pool.get((8, 8), 'float32')
+    a_id = id(a)
+    del a
+    gc.collect()
+
+    # buffers that are never released are not tracked once they are gone,
+    # so a new array reusing their address is not taken for a pool buffer
+    assert a_id not in pool._store().issued
+    b = np.zeros((8, 8), dtype='float32')
+    assert not pool.owns(b)
+    pool.release(b)
+    assert pool.bytes_held == 0
+
+
+def test_buffer_pool_threads():
+    pool = BufferPool()
+    a = pool.get((4, 4), 'float32')
+    pool.release(a)
+
+    result = {}
+
+    def worker():
+        b = pool.get((4, 4), 'float32')
+        result['b'] = b
+        pool.release(b)
+        # can not release buffers of other threads
+        pool.release(a)
+
+    th = threading.Thread(target=worker)
+    th.start()
+    th.join()
+
+    assert result['b'] is not a
+    assert pool.misses == 2
+    assert pool.get((4, 4), 'float32') is a
+
+
+def test_default_buffer_pool():
+    prev = set_default_buffer_pool(None)
+    try:
+        with scratch_buffer((3, 2), 'int16', fill=-1) as a:
+            assert a.shape == (3, 2)
+            assert (a == -1).all()
+
+        pool = BufferPool()
+        assert set_default_buffer_pool(pool) is None
+        assert get_default_buffer_pool() is pool
+
+        with scratch_buffer((3, 2), 'int16') as a:
+            pass
+        with scratch_buffer((3, 2), 'int16', fill=1) as b:
+            assert b is a
+            assert (b == 1).all()
+        assert (pool.hits, pool.misses) == (1, 1)
+    finally:
+        set_default_buffer_pool(prev)
@@ -10,6 +10,10 @@ from datacube.utils.rio import (
     set_default_rio_config,
     activate_from_config,
     configure_s3_access,
+    RioFileCache,
+    RioFileHandle,
+    set_default_file_cache,
+    get_default_file_cache,
 )
 
 
@@ -180,3 +184,90 @@ def test_rio_configure_aws_access(monkeypatch, without_aws_env, dask_client):
 
     ee = client.submit(get_rio_env, sanitize=False).result()
     assert ee == ee_local
+
+
+def test_rio_file_cache(data_folder, monkeypatch):
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    fname = str(data_folder) + '/test.tif'
+    fname2 = str(data_folder) + '/sample_tile_151_-29.tif'
+
+    h = RioFileHandle(fname)
+    assert h.uri == fname
+    assert h.is_open is False
+    with h.use() as src:
+        assert src.shape == (2000, 4000)
+        with h.use() as src2:  # re-entrant
+            assert src2 is src
+
+        def use_from_other_thread():
+            with h.use() as src3:
+                return src3
+
+        # concurrent users get their own file handles
+        with ThreadPoolExecutor(1) as pool:
+            src3 = pool.submit(use_from_other_thread).result()
+        assert src3 is not src
+    assert h.is_open is True
+    assert fname in str(h)
+    h.close()
+    assert h.is_open is False
+    assert src.closed and src3.closed
+    with h.use() as src:
+        assert src.closed is False
+    # closed handle doesn't keep files open
+    assert src.closed
+    assert h.is_open is False
+
+    with pytest.raises(ValueError):
+        RioFileCache(max_size=0)
+
+    cache = RioFileCache(max_size=1, max_idle=None)
+    assert cache.max_size == 1
+    assert cache.max_idle is None
+
+    h1 = cache.get(fname)
+    assert cache.get(fname) is h1
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert fname in cache
+    with h1.use():
+        pass
+    assert h1.is_open
+
+    # exceeding max_size evicts least recently used
+    h2 = cache.get(fname2)
+    assert h2.uri == fname2
+    assert len(cache) == 1
+    assert fname not in cache
+    assert h1.is_open is False
+    assert 'size=1/1' in str(cache)
+
+    # evicted handles can still be used, but don't keep files open
+    with h1.use() as src:
+        assert src.shape == (2000, 4000)
+    assert src.closed
+
+    cache = RioFileCache(max_size=10, max_idle=100)
+    h1, h2 = cache.get(fname), cache.get(fname2)
+    with h1.use():
+        pass
+    assert cache.purge() == 0
+    assert len(cache) == 2
+
+    t0 = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: t0 + 1000)
+    assert cache.purge(max_idle=2000) == 0
+    assert cache.purge() == 2
+    assert len(cache) == 0
+    assert h1.is_open is False
+    assert h2.is_open is False
+
+    cache.get(fname)
+    cache.clear()
+    assert len(cache) == 0
+
+    assert get_default_file_cache() is None
+    assert set_default_file_cache(cache) is None
+    assert get_default_file_cache() is cache
+    assert set_default_file_cache(None) is cache
+    assert get_default_file_cache() is None